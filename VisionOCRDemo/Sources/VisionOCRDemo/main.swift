@@ -2,9 +2,118 @@ import Foundation
 import Vision
 import ImageIO
 
-let args = CommandLine.arguments
+// `--fast` switches Vision to its fast recognition level (the Python two-pass
+// backend runs one process of each); the default is the accurate level
+let fastRecognition = CommandLine.arguments.contains("--fast")
+let recognitionLevel: VNRequestTextRecognitionLevel = fastRecognition ? .fast : .accurate
+
+// Streaming mode (`VisionOCRDemo --stdin`): read "<byte count> <file name>\n"
+// headers each followed by the image bytes on stdin, and write one
+// "--- name ---" result block per image to stdout, ending with a blank line
+func readHeaderLine() -> String? {
+    var bytes = [UInt8]()
+    while true {
+        let data = FileHandle.standardInput.readData(ofLength: 1)
+        guard let byte = data.first else {
+            return bytes.isEmpty ? nil : String(decoding: bytes, as: UTF8.self)
+        }
+        if byte == 10 {
+            return String(decoding: bytes, as: UTF8.self)
+        }
+        bytes.append(byte)
+    }
+}
+
+func readExactly(_ count: Int) -> Data? {
+    var data = Data()
+    while data.count < count {
+        let chunk = FileHandle.standardInput.readData(ofLength: count - data.count)
+        if chunk.isEmpty {
+            return nil
+        }
+        data.append(chunk)
+    }
+    return data
+}
+
+func recognizeBlock(name: String, imageData: Data) -> String {
+    let output = "--- \(name) ---\n"
+    guard let imageSource = CGImageSourceCreateWithData(imageData as CFData, nil),
+          let cgImage = CGImageSourceCreateImageAtIndex(imageSource, 0, nil) else {
+        return output + "OCR Error: failed to load image\n\n"
+    }
+
+    let request = VNRecognizeTextRequest()
+    request.recognitionLevel = recognitionLevel
+    let requestHandler = VNImageRequestHandler(cgImage: cgImage, options: [:])
+    do {
+        try requestHandler.perform([request])
+    } catch {
+        return output + "OCR Error: \(error)\n\n"
+    }
+
+    let lines = (request.results ?? []).compactMap { observation -> String? in
+        if let top = observation.topCandidates(1).first {
+            return String(format: "[%.2f] %@", top.confidence, top.string)
+        }
+        return nil
+    }
+    return output + (lines.isEmpty ? "No text found\n\n" : lines.joined(separator: "\n") + "\n\n")
+}
+
+// One ocr_results.jsonl line per image: each observation's text, confidence,
+// normalized bounding box and top candidates (read by ocr_structured.py)
+func jsonRecord(name: String, observations: [VNRecognizedTextObservation]) -> String? {
+    let records: [[String: Any]] = observations.compactMap { observation in
+        let candidates = observation.topCandidates(3)
+        guard let top = candidates.first else {
+            return nil
+        }
+        let box = observation.boundingBox
+        return [
+            "text": top.string,
+            "confidence": Double(top.confidence),
+            "bbox": [Double(box.origin.x), Double(box.origin.y), Double(box.size.width), Double(box.size.height)],
+            "candidates": candidates.map { ["text": $0.string, "confidence": Double($0.confidence)] },
+        ]
+    }
+    let record: [String: Any] = ["image": name, "engine": "vision", "error": NSNull(), "observations": records]
+    guard let data = try? JSONSerialization.data(withJSONObject: record),
+          let line = String(data: data, encoding: .utf8) else {
+        return nil
+    }
+    return line + "\n"
+}
+
+func append(_ text: String, to fileURL: URL) throws {
+    if FileManager.default.fileExists(atPath: fileURL.path) {
+        let handle = try FileHandle(forWritingTo: fileURL)
+        handle.seekToEndOfFile()
+        if let data = text.data(using: .utf8) {
+            handle.write(data)
+        }
+        handle.closeFile()
+    } else {
+        try text.write(to: fileURL, atomically: true, encoding: .utf8)
+    }
+}
+
+if CommandLine.arguments.count > 1 && CommandLine.arguments[1] == "--stdin" {
+    while let header = readHeaderLine() {
+        let parts = header.split(separator: " ", maxSplits: 1)
+        guard parts.count == 2, let size = Int(parts[0]), let imageData = readExactly(size) else {
+            FileHandle.standardError.write("❌ Malformed input header: \(header)\n".data(using: .utf8)!)
+            exit(1)
+        }
+        // FileHandle writes are unbuffered, so each block reaches the reader immediately
+        FileHandle.standardOutput.write(recognizeBlock(name: String(parts[1]), imageData: imageData).data(using: .utf8)!)
+    }
+    exit(0)
+}
+
+let args = CommandLine.arguments.filter { $0 != "--fast" }
 guard args.count > 2 else {
-    print("Usage: swift ocr_folder.swift /path/to/input_folder /path/to/output_folder")
+    print("Usage: swift ocr_folder.swift /path/to/input_folder /path/to/output_folder [--fast]")
     exit(1)
 }
 
@@ -17,6 +126,7 @@ let outputFolderURL = URL(fileURLWithPath: outputFolderPath, isDirectory: true)
 // dateFormatter.dateFormat = "yyyy-M-d_HH-mm"
 // let date = dateFormatter.string(from: Date())
 let outputFileURL = outputFolderURL.appendingPathComponent("ocr_results.txt")
+let jsonOutputFileURL = outputFolderURL.appendingPathComponent("ocr_results.jsonl")
 
 let fileManager = FileManager.default
 
@@ -30,9 +140,9 @@ if !fileManager.fileExists(atPath: outputFolderURL.path) {
     }
 }
 
-// Remove old output file if it exists
-if fileManager.fileExists(atPath: outputFileURL.path) {
-    try? fileManager.removeItem(at: outputFileURL)
+// Remove old output files if they exist
+for url in [outputFileURL, jsonOutputFileURL] where fileManager.fileExists(atPath: url.path) {
+    try? fileManager.removeItem(at: url)
 }
 
 // Get .png files in input folder
@@ -57,6 +167,7 @@ for imageURL in pngFiles {
     }
 
     let request = VNRecognizeTextRequest()
+    request.recognitionLevel = recognitionLevel
     let requestHandler = VNImageRequestHandler(cgImage: cgImage, options: [:])
 
     do {
@@ -67,6 +178,7 @@ for imageURL in pngFiles {
     }
 
     var output = "--- \(imageURL.lastPathComponent) ---\n"
+    var jsonLine: String? = nil
 
     // if let observations = request.results as? [VNRecognizedTextObservation] {
     //     let lines = observations.compactMap { $0.topCandidates(1).first?.string }
@@ -77,6 +189,7 @@ for imageURL in pngFiles {
     if let error = error {
         output += "OCR Error: \(error)\n\n"
     } else if let observations = request.results as? [VNRecognizedTextObservation] {
+        jsonLine = jsonRecord(name: imageURL.lastPathComponent, observations: observations)
         let lines = observations.compactMap { observation -> String? in
             if let top = observation.topCandidates(1).first {
                 return String(format: "[%.2f] %@", top.confidence, top.string)
@@ -102,6 +215,9 @@ for imageURL in pngFiles {
         } else {
             try output.write(to: outputFileURL, atomically: true, encoding: .utf8)
         }
+        if let jsonLine = jsonLine {
+            try append(jsonLine, to: jsonOutputFileURL)
+        }
         print("✅ Wrote OCR result for \(imageURL.lastPathComponent)")
     } catch {
         print("❌ Failed to write output: \(error)")
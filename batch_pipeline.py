@@ -0,0 +1,204 @@
+import os
+import sys
+import time
+import queue
+import argparse
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from instrumentation import Instrumentation
+from label_preprocess import TEXT_HEIGHT, label_preprocessor
+from postprocess_with_confidence_final import THUMB_FORMATS
+from name_extraction import DEFAULT_RULES_PATH, load_extractor
+from ocr_backends import ReplayBackend, VisionSubprocessBackend
+from ocr_cache import DEFAULT_CACHE_PATH, CachedBackend, OCRCache
+from pipeline import QUEUE_SIZE, default_output_folder, run_pipeline
+from run_log import RunLog
+from study_index import DEFAULT_INDEX_PATH, StudyIndex
+from two_pass_ocr import MIN_LINE_CONFIDENCE, vision_two_pass
+
+# Runs the streaming pipeline on many slide folders at once. Each folder
+# writes into its own output folder; the OCR engines, the label-read slots,
+# the OCR cache and the study ID index are shared, so however many folders
+# are selected, at most `ocr_workers` Vision processes and `disk_slots`
+# slide reads are active at a time.
+
+DEFAULT_JOBS = 4
+DEFAULT_DISK_SLOTS = 4
+PROGRESS_SECONDS = 2.0
+
+class BackendPool:
+    # OCR engines shared by every folder; a folder holds one for its whole
+    # run (a Vision process answers one request stream at a time)
+    def __init__(self, backends):
+        self.backends = backends
+        self._free = queue.Queue()
+        for backend in backends:
+            self._free.put(backend)
+
+    @contextlib.contextmanager
+    def borrow(self):
+        backend = self._free.get()
+        try:
+            yield backend
+        finally:
+            self._free.put(backend)
+
+class Progress:
+    # slide counts across every folder, printed at most every PROGRESS_SECONDS
+    def __init__(self, totals, out=print):
+        self.totals = totals
+        self.done = dict.fromkeys(totals, 0)
+        self.finished = set()
+        self.out = out
+        self.started = time.perf_counter()
+        self._printed = 0.0
+        self._lock = threading.Lock()
+
+    def line(self):
+        done, total = sum(self.done.values()), sum(self.totals.values())
+        elapsed = time.perf_counter() - self.started
+        rate = done / elapsed if elapsed > 0 else 0.0
+        return (f"📦 [{len(self.finished)}/{len(self.totals)} folder(s)] {done}/{total} slide(s) "
+                f"({rate:.1f} slides/s)")
+
+    def slide(self, folder):
+        with self._lock:
+            self.done[folder] += 1
+            if time.perf_counter() - self._printed >= PROGRESS_SECONDS:
+                self._printed = time.perf_counter()
+                self.out(self.line())
+
+    def finish(self, folder, message):
+        with self._lock:
+            self.finished.add(folder)
+            self.out(message)
+            self.out(self.line())
+
+class _ProgressLog:
+    # a folder's RunLog that also counts its slides towards the batch progress
+    def __init__(self, run_log, progress, folder):
+        self.run_log = run_log
+        self.progress = progress
+        self.folder = folder
+
+    def event(self, event, **fields):
+        if event in ("slide", "skipped"):
+            self.progress.slide(self.folder)
+        return self.run_log.event(event, **fields)
+
+    def __call__(self, message):
+        return self.event("message", message=message)
+
+def _count_slides(folder):
+    # an unreadable folder counts as empty here and fails on its own later
+    try:
+        return sum(1 for name in os.listdir(folder) if name.lower().endswith(".mrxs"))
+    except OSError:
+        return 0
+
+def run_batch(folders, backends, jobs=DEFAULT_JOBS, disk_slots=DEFAULT_DISK_SLOTS, extractor=None, study_index=None,
+              thumb_format="png", profile=False, queue_size=QUEUE_SIZE, preprocess=None, out=print):
+    # folders: slide folders; backends: BackendPool. Returns {folder: slides
+    # named, or the exception that stopped it}; one folder failing doesn't
+    # stop the others
+    extractor = extractor or load_extractor()
+    label_slots = threading.BoundedSemaphore(disk_slots)
+    progress = Progress({folder: _count_slides(folder) for folder in folders}, out)
+    out(f"🚀 {len(folders)} folder(s), {sum(progress.totals.values())} slide(s); "
+        f"{jobs} at a time, {len(backends.backends)} OCR worker(s), {disk_slots} disk slot(s)")
+
+    def run_folder(folder):
+        if not os.path.isdir(folder):
+            raise FileNotFoundError(f"Folder not found: {folder}")
+        output_folder = default_output_folder(folder)
+        with RunLog(output_folder, echo=False) as run_log, backends.borrow() as backend:
+            named = run_pipeline(folder, output_folder, backend, queue_size=queue_size, extractor=extractor,
+                                 thumb_format=thumb_format, run_log=_ProgressLog(run_log, progress, folder),
+                                 instrumentation=Instrumentation(enabled=profile),
+                                 study_index=study_index, label_slots=label_slots, preprocess=preprocess,
+                                 cache_stats=False)
+        progress.finish(folder, f"✔ {os.path.basename(folder)}: {named} slide(s) named → {output_folder}")
+        return named
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(run_folder, folder): folder for folder in folders}
+        for future in as_completed(futures):
+            folder = futures[future]
+            try:
+                results[folder] = future.result()
+            except Exception as e:
+                results[folder] = e
+                progress.finish(folder, f"❌ {os.path.basename(folder)}: {e}")
+
+    elapsed = time.perf_counter() - progress.started
+    named = sum(n for n in results.values() if not isinstance(n, Exception))
+    failed = sum(isinstance(n, Exception) for n in results.values())
+    out(f"\n✔ {len(folders) - failed} folder(s), {named} slide(s) named in {elapsed:.1f}s "
+        f"({named / elapsed if elapsed > 0 else 0:.1f} slides/s)" + (f"; {failed} folder(s) failed" if failed else ""))
+    # every folder's backend wraps the same cache, so it is reported once
+    cache = getattr(backends.backends[0], "cache", None) if backends.backends else None
+    if cache:
+        out(f"OCR cache: {cache.hits} hit(s), {cache.misses} miss(es)")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Name the slides of many folders at once, sharing OCR workers and disk bandwidth.")
+    parser.add_argument("folders", nargs="+", help="Folders containing .mrxs files")
+    ocr_source = parser.add_mutually_exclusive_group(required=True)
+    ocr_source.add_argument("--ocr-binary", help="Path to the compiled VisionOCRDemo binary")
+    ocr_source.add_argument("--replay", help="Path to recorded OCR results (ocr_results.txt, .jsonl or .ocrb) to replay instead of running OCR")
+    parser.add_argument("--jobs", type=int, default=DEFAULT_JOBS, help=f"Folders processed at the same time (default: {DEFAULT_JOBS})")
+    parser.add_argument("--ocr-workers", type=int, help="Vision OCR processes shared by all folders (default: --jobs)")
+    parser.add_argument("--disk-slots", type=int, default=DEFAULT_DISK_SLOTS, help=f"Slide label reads in flight across all folders (default: {DEFAULT_DISK_SLOTS})")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE, help="Maximum slides buffered between stages, per folder")
+    parser.add_argument("--ocr-cache", default=DEFAULT_CACHE_PATH, help=f"Persistent OCR result cache (default: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--no-ocr-cache", action="store_true", help="Run OCR on every label without consulting the cache")
+    parser.add_argument("--rules", default=DEFAULT_RULES_PATH, help=f"Name extraction rules file (default: {DEFAULT_RULES_PATH})")
+    parser.add_argument("--thumb-format", choices=THUMB_FORMATS, default="png", help="Encoding of the Excel label thumbnails (default: png)")
+    parser.add_argument("--profile", action="store_true", help="Write run_summary.json to each output folder")
+    parser.add_argument("--study-index", default=DEFAULT_INDEX_PATH, help=f"Persistent study ID index (default: {DEFAULT_INDEX_PATH})")
+    parser.add_argument("--no-study-index", action="store_true", help="Don't index study IDs or flag outliers")
+    parser.add_argument("--two-pass", action="store_true", help="Read every label with Vision's fast level and re-read only doubtful ones accurately (needs --ocr-binary)")
+    parser.add_argument("--two-pass-confidence", type=float, default=MIN_LINE_CONFIDENCE, help=f"Line confidence under which --two-pass re-reads a label (default: {MIN_LINE_CONFIDENCE})")
+    parser.add_argument("--preprocess", action="store_true", help="Deskew, crop, downscale and binarize each label before OCR")
+    parser.add_argument("--text-height", type=int, default=TEXT_HEIGHT, help=f"Text line height labels are downscaled to with --preprocess (default: {TEXT_HEIGHT})")
+    args = parser.parse_args()
+    if args.two_pass and not args.ocr_binary:
+        parser.error("--two-pass needs --ocr-binary")
+
+    extractor = load_extractor(args.rules)
+    folders = list(dict.fromkeys(os.path.abspath(folder) for folder in args.folders))
+    jobs = max(1, min(args.jobs, len(folders)))
+    ocr_workers = max(1, args.ocr_workers or jobs)
+    cache = None
+    if args.replay:
+        # a replay is read-only, so one serves every folder
+        engines = [ReplayBackend(args.replay)]
+        backends = engines * ocr_workers
+    else:
+        cache = None if args.no_ocr_cache else OCRCache(args.ocr_cache)
+        if args.two_pass:
+            # each OCR worker is a fast and an accurate Vision process
+            backends = [vision_two_pass(args.ocr_binary, cache, args.queue_size, extractor, args.two_pass_confidence)
+                        for _ in range(ocr_workers)]
+            engines = [engine.backend if cache else engine for backend in backends for engine in (backend.fast, backend.accurate)]
+        else:
+            engines = [VisionSubprocessBackend(args.ocr_binary, max_inflight=args.queue_size) for _ in range(ocr_workers)]
+            backends = [CachedBackend(engine, cache) for engine in engines] if cache else engines
+    study_index = None if args.no_study_index else StudyIndex(args.study_index)
+    try:
+        results = run_batch(folders, BackendPool(backends), jobs=jobs, disk_slots=args.disk_slots,
+                            extractor=extractor, study_index=study_index,
+                            thumb_format=args.thumb_format, profile=args.profile, queue_size=args.queue_size,
+                            preprocess=label_preprocessor(args.text_height) if args.preprocess else None)
+    finally:
+        # engines and the cache are shared, so close each once
+        for engine in engines:
+            engine.close()
+        if cache:
+            cache.close()
+        if study_index:
+            study_index.close()
+    sys.exit(1 if any(isinstance(result, Exception) for result in results.values()) else 0)
@@ -0,0 +1,144 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import resource
+import argparse
+import tempfile
+import subprocess
+import contextlib
+import multiprocessing
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic_slides import text_label, write_mirax_slide
+
+# Runs the whole workflow on synthetic slides: label extraction, the
+# streaming pipeline (label read, OCR replayed from a recording of the
+# labels' own text, naming, Excel export) and renaming from the exported
+# sheet. Each phase runs in a fresh process so its peak RSS is its own.
+# Every run is appended to a JSON file and compared with the previous run
+# at the same slide count.
+
+DEFAULT_RESULTS = "bench_end_to_end.json"
+
+def label_lines(index, rng):
+    # study ID, tissue and a unique serial (so every new name differs),
+    # then a date and the lab name, which naming drops
+    return [
+        f"{20 + index % 8}-{index % 1000:03d} H(20)",
+        f"{rng.choice(['Lung', 'Liver', 'Diaph', 'Kidney'])} S{index:05d}",
+        f"{rng.randint(1, 12)}/{rng.randint(1, 28)}/2025 {rng.randint(1, 12)}:{rng.randint(0, 59):02d} PM",
+        "GlintLab",
+    ]
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1e6 if sys.platform == "darwin" else 1e3)
+
+def _phase(name, count, work_dir):
+    # runs in a fresh process; returns seconds, peak RSS and phase details
+    from ocr_results import format_block
+    from open_label_images import extract_labels, label_filename
+    slides = os.path.join(work_dir, "slides")
+    details = {}
+    start = time.perf_counter()
+    if name == "generate":
+        os.makedirs(slides)
+        rng = random.Random(0)
+        with open(os.path.join(work_dir, "ocr_results.txt"), "w", encoding="utf-8") as recording:
+            for i in range(count):
+                lines = label_lines(i, rng)
+                filename = os.path.basename(write_mirax_slide(slides, f"slide_{i:05d}", text_label(i, lines),
+                                                              tiles_x=8, tiles_y=8, levels=3))
+                recording.write(format_block(label_filename(filename), [(line, round(rng.uniform(0.3, 1.0), 2)) for line in lines]))
+    elif name == "extract":
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            extract_labels(slides, os.path.join(work_dir, "labels"), cache_dir=None)
+    elif name == "pipeline":
+        from instrumentation import Instrumentation
+        from ocr_backends import ReplayBackend
+        from pipeline import run_pipeline
+        from run_log import RunLog
+        output = os.path.join(work_dir, "outputs")
+        instrumentation = Instrumentation()
+        with ReplayBackend(os.path.join(work_dir, "ocr_results.txt")) as backend, RunLog(output, echo=False) as run_log:
+            run_pipeline(slides, output, backend, run_log=run_log, instrumentation=instrumentation)
+        summary = instrumentation.summary()
+        details["stages"] = summary["stages"]
+    elif name == "rename":
+        from rename_executor import RenameExecutor
+        from rename_plan import plan_from_excel
+        plan = plan_from_excel(os.path.join(work_dir, "outputs", "file_renaming_excel.xlsx"), slides)
+        executor = RenameExecutor()
+        plan.execute(os.path.join(work_dir, "rename_journal.jsonl"), executor=executor)
+        details["plan"] = dict(plan.counts())
+        details["renames"] = executor.stats()
+    seconds = time.perf_counter() - start
+    return {"seconds": round(seconds, 3), "slides_per_sec": round(count / seconds, 2),
+            "peak_rss_mb": round(_peak_rss_mb(), 1), **details}
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def run(count, keep=None):
+    work_dir = keep or tempfile.mkdtemp(prefix="bench_e2e_")
+    os.makedirs(work_dir, exist_ok=True)
+    context = multiprocessing.get_context("spawn")
+    phases = {}
+    try:
+        for name in ("generate", "extract", "pipeline", "rename"):
+            with context.Pool(1) as pool:
+                phases[name] = pool.apply(_phase, (name, count, work_dir))
+            print(f"{count:>6} slides  {name:<9} {phases[name]['seconds']:8.2f} s  {phases[name]['slides_per_sec']:9.1f} slides/s  "
+                  f"peak RSS {phases[name]['peak_rss_mb']:7.1f} MB")
+        for stage, stats in phases["pipeline"]["stages"].items():
+            print(f"{'':>16}{stage:<14} p50 {stats['p50_ms']:8.2f} ms  p95 {stats['p95_ms']:8.2f} ms  CPU {stats['cpu_s']:7.2f} s")
+    finally:
+        if keep is None:
+            shutil.rmtree(work_dir)
+    return {"slides": count, "phases": phases}
+
+def compare(previous, current):
+    for name, phase in current["phases"].items():
+        before = previous["phases"].get(name)
+        if before:
+            change = phase["slides_per_sec"] / before["slides_per_sec"] - 1 if before["slides_per_sec"] else 0
+            print(f"{current['slides']:>6} slides  {name:<9} {change:+7.1%} slides/s, "
+                  f"{phase['peak_rss_mb'] - before['peak_rss_mb']:+7.1f} MB peak RSS vs {previous['created']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end benchmark on synthetic slides: extraction, OCR replay, naming, Excel export and renaming.")
+    parser.add_argument("--slides", type=int, nargs="+", default=[10, 100, 1000], help="Slide counts to run, 10 to 10000 (default: 10 100 1000)")
+    parser.add_argument("--json", default=DEFAULT_RESULTS, help=f"Results file; each run is appended (default: {DEFAULT_RESULTS})")
+    parser.add_argument("--keep", help="Keep the generated slides and outputs in this folder (single slide count only)")
+    args = parser.parse_args()
+    if args.keep and len(args.slides) > 1:
+        parser.error("--keep takes a single --slides count")
+
+    history = []
+    if os.path.exists(args.json):
+        with open(args.json, "r", encoding="utf-8") as f:
+            history = json.load(f)
+
+    created = datetime.now().isoformat(timespec="seconds")
+    for count in args.slides:
+        result = {"created": created, "commit": _commit(), "python": platform.python_version(),
+                  "platform": platform.platform(), "cpus": os.cpu_count(), **run(count, args.keep)}
+        previous = [entry for entry in history if entry["slides"] == count]
+        if previous:
+            compare(previous[-1], result)
+        history.append(result)
+
+    with open(args.json, "w", encoding="utf-8") as f:
+        json.dump(history, f, indent=2)
+    print(f"Results appended to {args.json}")
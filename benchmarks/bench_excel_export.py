@@ -0,0 +1,121 @@
+import io
+import os
+import sys
+import time
+import shutil
+import resource
+import argparse
+import tempfile
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openpyxl import Workbook
+from openpyxl.styles import Font
+from openpyxl.drawing.image import Image as XLImage
+from PIL import Image as PILImage
+import postprocess_with_confidence_final as postprocess
+from synthetic_slides import text_label
+
+# Times the Excel export for a batch of synthetic label images and reports
+# the resulting .xlsx size for each thumbnail encoding, next to the original
+# export that wrote a _thumb.png per label to disk and read it back. With
+# --memory, also measures peak RSS of each export at growing row counts.
+
+def legacy_export(records, label_folder, output_path, threshold=0.6, in_memory=False):
+    # export_excel_with_images as it was before in-memory thumbnails; with
+    # in_memory, thumbnails are BytesIO buffers held by a regular workbook
+    # until it is saved (as before the write-only export)
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "OCR Mapping"
+    headers = ["Label Image", "Avg Confidence", "Original File Name", "New File Name"]
+    ws.append(headers)
+    for col in range(1, len(headers) + 1):
+        ws.cell(row=1, column=col).font = Font(bold=True, size=12)
+    for i, record in enumerate(records, start=2):
+        label_img_path = os.path.join(label_folder, record["Label Image"])
+        thumb_path = io.BytesIO() if in_memory else f"{label_img_path}_thumb.png"
+        with PILImage.open(label_img_path) as img:
+            img.thumbnail((200, 200))
+            img.save(thumb_path, "PNG")
+        img_for_excel = XLImage(thumb_path)
+        img_for_excel.anchor = f"A{i}"
+        ws.add_image(img_for_excel)
+        conf_cell = ws.cell(row=i, column=2, value=record["Confidence"])
+        if record["Confidence"] < threshold:
+            conf_cell.font = Font(color="FF0000", bold=True)
+        ws.cell(row=i, column=3, value=record["Original File Name"])
+        ws.cell(row=i, column=4, value=record["New File Name"])
+        ws.row_dimensions[i].height = 120
+    for col in ["A", "B", "C", "D"]:
+        ws.column_dimensions[col].width = 35
+    wb.save(output_path)
+
+def iter_records(count, label_folder):
+    for i in range(count):
+        png = io.BytesIO()
+        text_label(i).save(png, "PNG")
+        name = f"slide_{i:05d}"
+        with open(os.path.join(label_folder, f"{name}_label.png"), "wb") as f:
+            f.write(png.getvalue())
+        yield {
+            "Original File Name": f"{name}.mrxs",
+            "Label Image": f"{name}_label.png",
+            "New File Name": f"{20 + i % 8}-{i % 1000:03d}_H(20)_Lung_Block_{i % 30}.mrxs",
+            "Confidence": (i % 10) / 10,
+            "Label Data": png.getvalue(),
+        }
+
+def _peak_rss_mb(mode, rows, work_dir):
+    # runs in a fresh process: export `rows` generated records, report peak RSS
+    label_folder = os.path.join(work_dir, f"labels_{mode}_{rows}")
+    os.makedirs(label_folder)
+    output = os.path.join(work_dir, f"memory_{mode}_{rows}.xlsx")
+    if mode == "workbook":
+        legacy_export(iter_records(rows, label_folder), label_folder, output, in_memory=True)
+    else:
+        postprocess.export_excel_with_images(iter_records(rows, label_folder), label_folder, work_dir, output)
+    shutil.rmtree(label_folder)
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1e6 if sys.platform == "darwin" else 1e3)
+
+def report(name, seconds, path, count):
+    size = os.path.getsize(path)
+    print(f"{name:<22} {seconds:7.2f} s   {count / seconds:7.1f} rows/s   {size / 1e6:7.2f} MB")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Excel export time and file size.")
+    parser.add_argument("--rows", type=int, default=500, help="Number of rows / label images (default: 500)")
+    parser.add_argument("--workers", type=int, default=None, help="Thumbnail worker threads (default: up to 8, one per CPU)")
+    parser.add_argument("--memory", type=int, nargs="*", metavar="ROWS",
+                        help="Also measure peak RSS of a regular in-memory workbook and the streaming export at these row counts (default: 250 1000 2000)")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_excel_")
+    try:
+        label_folder = os.path.join(work_dir, "labels")
+        os.makedirs(label_folder)
+        records = list(iter_records(args.rows, label_folder))
+        start = time.perf_counter()
+        legacy_export(records, label_folder, os.path.join(work_dir, "legacy.xlsx"))
+        report("original (disk thumbs)", time.perf_counter() - start, os.path.join(work_dir, "legacy.xlsx"), args.rows)
+
+        for thumb_format in postprocess.THUMB_FORMATS:
+            output = f"export_{thumb_format}.xlsx"
+            start = time.perf_counter()
+            postprocess.export_excel_with_images(records, label_folder, work_dir, output,
+                                                 thumb_format=thumb_format, workers=args.workers)
+            report(thumb_format, time.perf_counter() - start, os.path.join(work_dir, output), args.rows)
+
+        if args.memory is not None:
+            context = multiprocessing.get_context("spawn")
+            for rows in args.memory or [250, 1000, 2000]:
+                peaks = []
+                for mode in ("workbook", "streaming"):
+                    with context.Pool(1) as pool:
+                        peaks.append(pool.apply(_peak_rss_mb, (mode, rows, work_dir)))
+                print(f"peak RSS at {rows:>5} rows: in-memory workbook {peaks[0]:7.1f} MB   streaming {peaks[1]:7.1f} MB")
+    finally:
+        shutil.rmtree(work_dir)
@@ -0,0 +1,104 @@
+import io
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+from label_preprocess import TEXT_HEIGHT, preprocess_label, to_png
+from name_extraction import load_extractor
+from ocr_backends import OCRError, ReplayBackend, VisionSubprocessBackend
+from synthetic_slides import text_label
+
+# OCR input before and after label preprocessing: pixels and PNG bytes per
+# label, preprocessing time, and (with --ocr-binary, on macOS) Vision's time
+# on each form and whether the names it yields still match. Labels are
+# synthetic (slightly rotated, with a dark scanner edge) unless --labels
+# points at a folder of real label PNGs; with --replay, the recorded results
+# for those labels are the reference names.
+
+def synthetic_labels(count, seed=0):
+    rng = random.Random(seed)
+    for i in range(count):
+        label = text_label(i)
+        # scanner edge along the left and a few degrees of skew
+        label.paste((25, 25, 25), (0, 0, 14, label.height))
+        yield f"label_{i:05d}.png", label.rotate(rng.uniform(-3, 3), resample=Image.BILINEAR, expand=True,
+                                                 fillcolor=(200, 200, 200))
+
+def folder_labels(folder):
+    for name in sorted(os.listdir(folder)):
+        if name.lower().endswith(".png"):
+            with Image.open(os.path.join(folder, name)) as img:
+                img.load()
+                yield name, img
+
+def _png(img):
+    buf = io.BytesIO()
+    img.save(buf, "PNG")
+    return buf.getvalue()
+
+def ocr_names(backend, items, extractor):
+    # OCR seconds and {label: new name} for [(name, png bytes)]
+    names = {}
+    start = time.perf_counter()
+    for name, results in backend.recognize_batch(items):
+        if not isinstance(results, OCRError):
+            names[name] = extractor.extract([text for text, _ in results])[1]
+    return time.perf_counter() - start, names
+
+def agreement(names, reference):
+    shared = [name for name in reference if name in names]
+    return sum(names[name] == reference[name] for name in shared), len(shared)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark OCR input size and time with and without label preprocessing.")
+    parser.add_argument("--labels", help="Folder of label PNGs (default: synthetic labels)")
+    parser.add_argument("--count", type=int, default=200, help="Number of synthetic labels (default: 200)")
+    parser.add_argument("--replay", help="Recorded OCR results for --labels, used as the reference names")
+    parser.add_argument("--ocr-binary", help="Compiled VisionOCRDemo binary, to time OCR on both forms (macOS)")
+    parser.add_argument("--text-height", type=int, default=TEXT_HEIGHT, help=f"Target text line height (default: {TEXT_HEIGHT})")
+    args = parser.parse_args()
+
+    labels = folder_labels(args.labels) if args.labels else synthetic_labels(args.count)
+    raw, processed, timings = [], [], []
+    raw_pixels = processed_pixels = 0
+    for name, img in labels:
+        start = time.perf_counter()
+        small = preprocess_label(img, args.text_height)
+        png = to_png(small)
+        timings.append(time.perf_counter() - start)
+        raw.append((name, _png(img)))
+        processed.append((name, png))
+        raw_pixels += img.width * img.height
+        processed_pixels += small.width * small.height
+
+    raw_bytes = sum(len(png) for _, png in raw)
+    processed_bytes = sum(len(png) for _, png in processed)
+    timings.sort()
+    print(f"{len(raw)} label(s), target text height {args.text_height}px")
+    print(f"pixels      {raw_pixels:>12}  → {processed_pixels:>10}  ({processed_pixels / raw_pixels:.1%})")
+    print(f"PNG bytes   {raw_bytes:>12}  → {processed_bytes:>10}  ({processed_bytes / raw_bytes:.1%})")
+    print(f"preprocess  median {statistics.median(timings) * 1000:.2f} ms   p95 {timings[int(0.95 * (len(timings) - 1))] * 1000:.2f} ms per label")
+
+    extractor = load_extractor()
+    reference = None
+    if args.replay:
+        _, reference = ocr_names(ReplayBackend(args.replay), raw, extractor)
+    if args.ocr_binary:
+        with VisionSubprocessBackend(args.ocr_binary) as backend:
+            raw_seconds, raw_names = ocr_names(backend, raw, extractor)
+            processed_seconds, processed_names = ocr_names(backend, processed, extractor)
+        print(f"OCR         {raw_seconds:12.2f} s → {processed_seconds:8.2f} s  ({processed_seconds / raw_seconds:.1%})")
+        reference = reference or raw_names
+        for label, names in (("raw", raw_names), ("preprocessed", processed_names)):
+            same, total = agreement(names, reference)
+            print(f"names       {label:<12} {same}/{total} match the {'recorded' if args.replay else 'raw-label'} names")
+    elif reference:
+        print(f"{len(reference)} recorded name(s) loaded; pass --ocr-binary to check the preprocessed labels against them")
+    else:
+        print("OCR time and accuracy need --ocr-binary (macOS)")
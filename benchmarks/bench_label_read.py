@@ -0,0 +1,62 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openslide
+from mirax_label import read_label_image
+from synthetic_slides import plain_label, write_mirax_slide
+
+# Compares per-slide open+label latency of the openslide path used by
+# extract_labels against the direct MIRAX label reader.
+
+def openslide_label(mrxs_path):
+    slide = openslide.OpenSlide(mrxs_path)
+    label = slide.associated_images['label']
+    slide.close()
+    return label
+
+def time_per_slide(read, mrxs_paths, repeats):
+    timings = []
+    for _ in range(repeats):
+        for mrxs_path in mrxs_paths:
+            start = time.perf_counter()
+            read(mrxs_path)
+            timings.append(time.perf_counter() - start)
+    return timings
+
+def summarize(name, timings):
+    timings = sorted(timings)
+    p95 = timings[int(0.95 * (len(timings) - 1))]
+    print(f"{name:<12} mean {statistics.mean(timings) * 1000:8.3f} ms   "
+          f"median {statistics.median(timings) * 1000:8.3f} ms   p95 {p95 * 1000:8.3f} ms")
+    return statistics.mean(timings)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark openslide vs direct MIRAX label reads.")
+    parser.add_argument("--slides", type=int, default=20, help="Number of synthetic slides")
+    parser.add_argument("--tiles", type=int, default=128, help="Tiles per side at the base level")
+    parser.add_argument("--levels", type=int, default=8, help="Number of pyramid levels")
+    parser.add_argument("--repeats", type=int, default=3, help="Passes over the slide set per reader")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        mrxs_paths = [
+            write_mirax_slide(folder, f"slide_{i:05d}", plain_label(i),
+                              tiles_x=args.tiles, tiles_y=args.tiles, levels=args.levels)
+            for i in range(args.slides)
+        ]
+
+        # both paths must produce the same pixels
+        for mrxs_path in mrxs_paths:
+            if openslide_label(mrxs_path).tobytes() != read_label_image(mrxs_path).tobytes():
+                sys.exit(f"Label mismatch for {mrxs_path}")
+
+        print(f"{args.slides} slides, {args.tiles}x{args.tiles} tiles, {args.levels} levels, {args.repeats} pass(es)")
+        slow = summarize("openslide", time_per_slide(openslide_label, mrxs_paths, args.repeats))
+        fast = summarize("direct", time_per_slide(read_label_image, mrxs_paths, args.repeats))
+        print(f"speedup      {slow / fast:.1f}x")
@@ -0,0 +1,120 @@
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from name_extraction import NameExtractor, load_extractor
+
+# Checks the extractor compiled from name_rules.toml against the original
+# per-call implementation of extract_study_id_and_clean on a generated golden
+# corpus of label lines, then compares their per-slide cost, including with
+# a much larger rule set.
+
+def legacy_extract_study_id_and_clean(lines):
+    # extract_study_id_and_clean as it was before NameExtractor
+    study_id_pattern = re.compile(r"\b\d{2}-\d{3}\b")
+    date_pattern = re.compile(r"\d{1,2}/\d{1,2}/\d{2,4}")
+    time_pattern = re.compile(r"\d{1,2}:\d{2} ?(AM|PM)?", re.IGNORECASE)
+    noise_terms = {"glintlab"}
+
+    study_id = None
+    filename_tokens = []
+
+    for line in lines:
+        if date_pattern.search(line) or time_pattern.search(line):
+            continue
+
+        words = line.strip().split()
+        for word in words:
+            cleaned = word.strip(".,;:*+").replace("/", "-")
+            if not cleaned or cleaned.lower() in noise_terms:
+                continue
+
+            if study_id is None and study_id_pattern.match(cleaned):
+                study_id = cleaned
+
+            filename_tokens.append(cleaned)
+            if study_id_pattern.match(cleaned):
+                break
+
+    filename = "_".join(filename_tokens)
+    return study_id, filename
+
+WORDS = ["Lung", "Liver", "H&E", "IHC", "CD3", "Ki-67", "Block", "A1", "B2", "Mouse", "Rat", "L", "R",
+         "GlintLab", "glintlab.", "GLINTLAB", "Inc.", "x", "(2)", "#4", "Slide", "Ctrl", "Tx-1", "***", "..", "+"]
+PUNCTUATION = ["", "", "", ".", ",", ";", ":", "*", "+", "..", "*+", ":."]
+
+def random_token(rng):
+    roll = rng.random()
+    if roll < 0.15:
+        # study IDs, near misses and slash-separated variants
+        sep = rng.choice(["-", "-", "/"])
+        token = f"{rng.randint(0, 99):02d}{sep}{rng.randint(0, 999):03d}"
+        token += rng.choice(["", "", "", "4", "A", "-B", "/2", "_x"])
+        return rng.choice(["", "", "1", "A"]) + token
+    if roll < 0.2:
+        return f"{rng.randint(1, 12)}/{rng.randint(1, 31)}/{rng.choice(['24', '2024', '7'])}"
+    if roll < 0.24:
+        return f"{rng.randint(0, 23)}:{rng.randint(0, 59):02d}" + rng.choice(["", " PM", "am", ":5"])
+    if roll < 0.3:
+        return str(rng.randint(0, 99999))
+    return rng.choice(WORDS)
+
+def golden_corpus(count, seed=0):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        lines = []
+        for _ in range(rng.randint(0, 5)):
+            tokens = [rng.choice(PUNCTUATION) + random_token(rng) + rng.choice(PUNCTUATION)
+                      for _ in range(rng.randint(0, 6))]
+            space = rng.choice([" ", " ", " ", "  ", "\t", " "])
+            lines.append(rng.choice(["", " "]) + space.join(tokens) + rng.choice(["", " ", "\n"]))
+        corpus.append(lines)
+    return corpus
+
+def per_slide_us(run, corpus, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run(corpus)
+        best = min(best, time.perf_counter() - start)
+    return best / len(corpus) * 1e6
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark NameExtractor against the original name extraction.")
+    parser.add_argument("--slides", type=int, default=20000, help="Number of synthetic label texts (default: 20000)")
+    parser.add_argument("--repeats", type=int, default=5, help="Timing repeats, best is reported (default: 5)")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus random seed (default: 0)")
+    parser.add_argument("--extra-rules", type=int, default=500,
+                        help="Extra noise terms (and a fifth as many study ID formats) for the large rule set (default: 500)")
+    args = parser.parse_args()
+
+    corpus = golden_corpus(args.slides, args.seed)
+    extractor = load_extractor()
+
+    expected = [legacy_extract_study_id_and_clean(lines) for lines in corpus]
+    actual = extractor.extract_batch(corpus)
+    mismatches = [(lines, e, a) for lines, e, a in zip(corpus, expected, actual) if e != a]
+    for lines, e, a in mismatches[:5]:
+        print(f"❌ {lines!r}: expected {e!r}, got {a!r}")
+    if mismatches:
+        sys.exit(f"❌ {len(mismatches)} of {len(corpus)} slides differ from the original extraction")
+    print(f"✅ {len(corpus)} slides match the original extraction "
+          f"({sum(1 for study_id, _ in expected if study_id)} with a study ID)")
+
+    legacy = per_slide_us(lambda c: [legacy_extract_study_id_and_clean(lines) for lines in c], corpus, args.repeats)
+    single = per_slide_us(lambda c: [extractor.extract(lines) for lines in c], corpus, args.repeats)
+    batch = per_slide_us(extractor.extract_batch, corpus, args.repeats)
+    print(f"original       {legacy:7.2f} µs/slide")
+    print(f"extract        {single:7.2f} µs/slide")
+    print(f"extract_batch  {batch:7.2f} µs/slide   (speedup {legacy / batch:.2f}x)")
+
+    large = NameExtractor(noise_terms=["glintlab"] + [f"noise{i}" for i in range(args.extra_rules)],
+                          study_id_patterns=[r"\d{2}-\d{3}"] + [rf"S{i}-\d{{4}}" for i in range(args.extra_rules // 5)])
+    scaled = per_slide_us(large.extract_batch, corpus, args.repeats)
+    print(f"large rules    {scaled:7.2f} µs/slide   ({args.extra_rules + 1} noise terms, {args.extra_rules // 5 + 1} study ID formats)")
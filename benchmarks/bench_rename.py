@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from rename_executor import RenameExecutor
+from rename_journal import RenameJournal
+from rename_plan import NEW_COLUMN, ORIGINAL_COLUMN, plan_renames
+
+# Renames a folder of slide stubs (.mrxs plus data folder) with a simulated
+# per-rename round trip, as on an SMB/NFS mount, at several worker counts.
+# Each run is rolled back (also in parallel) so the next starts from the same
+# folder. The mapping mixes independent renames, chains and swaps.
+
+def make_slides(folder, count):
+    for i in range(count):
+        open(os.path.join(folder, f"slide_{i:05d}.mrxs"), "wb").close()
+        os.mkdir(os.path.join(folder, f"slide_{i:05d}"))
+
+def mapping(count):
+    rows = []
+    for i in range(count):
+        if i % 10 < 2:
+            # swap with the neighbour: a cycle of two
+            j = i + 1 if i % 2 == 0 else i - 1
+            new = f"slide_{j:05d}.mrxs"
+        elif i % 10 < 5 and i + 1 < count and (i + 1) % 10 < 5:
+            # chain into the next slide, which is renamed away first
+            new = f"slide_{i + 1:05d}.mrxs"
+        else:
+            new = f"{20 + i % 8}-{i:05d}_Lung_Block_{i % 30}.mrxs"
+        rows.append((f"slide_{i:05d}.mrxs", new))
+    return pd.DataFrame(rows, columns=[ORIGINAL_COLUMN, NEW_COLUMN])
+
+def slow_rename(latency):
+    def rename(src, dst):
+        time.sleep(latency)
+        os.rename(src, dst)
+    return rename
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark parallel journaled renames with simulated network latency.")
+    parser.add_argument("--slides", type=int, default=500, help="Number of slides, each a file and a folder (default: 500)")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Simulated round trip per rename (default: 20)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8, 16], help="Worker counts to compare (default: 1 4 8 16)")
+    parser.add_argument("--mount-limit", type=int, default=None, help="Per-mount concurrency limit (default: none)")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_rename_")
+    try:
+        folder = os.path.join(work_dir, "slides")
+        os.makedirs(folder)
+        make_slides(folder, args.slides)
+        before = sorted(os.listdir(folder))
+        plan = plan_renames(mapping(args.slides), folder)
+        print(f"{args.slides} slides, {len(plan.steps())} rename steps ({dict(plan.counts())}), "
+              f"{args.latency_ms:g} ms per rename")
+
+        baseline = None
+        for workers in args.workers:
+            journal_path = os.path.join(work_dir, f"journal_{workers}.jsonl")
+            executor = RenameExecutor(workers, args.mount_limit, rename=slow_rename(args.latency_ms / 1000))
+            plan.execute(journal_path, executor=executor)
+            stats = executor.stats()
+            baseline = baseline or stats["seconds"]
+            print(f"{workers:>3} worker(s)   {stats['seconds']:7.2f} s   {stats['ops_per_sec']:8.1f} ops/s   "
+                  f"p95 {stats['p95_ms']:6.1f} ms   speedup {baseline / stats['seconds']:5.2f}x")
+            RenameJournal.open(journal_path).rollback(executor=RenameExecutor(workers))
+            if sorted(os.listdir(folder)) != before:
+                sys.exit("❌ rollback did not restore the original names")
+        print("✅ every run rolled back to the original names")
+    finally:
+        shutil.rmtree(work_dir)
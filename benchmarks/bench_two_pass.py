@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from name_extraction import load_extractor
+from ocr_backends import OCRBackend, ReplayBackend
+from two_pass_ocr import MIN_LINE_CONFIDENCE, TwoPassBackend
+from bench_end_to_end import label_lines
+
+# Two-pass OCR against accurate-only OCR, with stub engines so it runs
+# anywhere: the accurate engine returns each label's true lines after
+# --accurate-ms, the fast one after --fast-ms, misreading a character of
+# a line (at a lower confidence) on --misread of the labels. Reports
+# wall and engine time of both runs and how many names differ from the
+# accurate-only ones.
+
+# characters Vision's fast level tends to confuse
+CONFUSIONS = {"0": "O", "1": "l", "5": "S", "8": "B", "2": "Z", "O": "0", "l": "1", "S": "5", "B": "8"}
+
+class StubEngine(OCRBackend):
+    def __init__(self, truth, seconds, misread=0.0, seed=0):
+        # truth: {label name: [(text, confidence)]}
+        self.truth = truth
+        self.seconds = seconds
+        self.misread = misread
+        self.rng = random.Random(seed)
+        self.engine_version = f"stub:{seconds}:{misread}"
+
+    def recognize(self, image_bytes, name):
+        time.sleep(self.seconds)
+        results = list(self.truth[name])
+        if results and self.rng.random() < self.misread:
+            line = self.rng.randrange(len(results))
+            text, _ = results[line]
+            positions = [i for i, char in enumerate(text) if char in CONFUSIONS]
+            if positions:
+                i = self.rng.choice(positions)
+                text = text[:i] + CONFUSIONS[text[i]] + text[i + 1:]
+            results[line] = (text, round(self.rng.uniform(0.3, 0.7), 2))
+        return results
+
+def synthetic_truth(count, seed=0):
+    rng = random.Random(seed)
+    return {f"slide_{i:05d}_label.png": [(line, round(rng.uniform(0.75, 1.0), 2)) for line in label_lines(i, rng)]
+            for i in range(count)}
+
+def run(backend, names, extractor):
+    start = time.perf_counter()
+    new_names = {name: extractor.extract([text for text, _ in results])[1]
+                 for name, results in backend.recognize_batch((name, b"") for name in names)}
+    return time.perf_counter() - start, new_names
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark two-pass OCR against accurate-only OCR with stub engines.")
+    parser.add_argument("--labels", type=int, default=300, help="Number of synthetic labels (default: 300)")
+    parser.add_argument("--replay", help="Recorded OCR results to use as the true label text instead")
+    parser.add_argument("--fast-ms", type=float, default=15, help="Fast engine time per label (default: 15)")
+    parser.add_argument("--accurate-ms", type=float, default=120, help="Accurate engine time per label (default: 120)")
+    parser.add_argument("--misread", type=float, default=0.1, help="Share of labels the fast engine misreads (default: 0.1)")
+    parser.add_argument("--min-confidence", type=float, default=MIN_LINE_CONFIDENCE, help=f"Two-pass re-read threshold (default: {MIN_LINE_CONFIDENCE})")
+    args = parser.parse_args()
+
+    if args.replay:
+        replay = ReplayBackend(args.replay)
+        truth = {name: replay.recognize(b"", name) for name in replay.names() if not isinstance(replay.results[name], Exception)}
+    else:
+        truth = synthetic_truth(args.labels)
+    names = sorted(truth)
+    extractor = load_extractor()
+
+    accurate = StubEngine(truth, args.accurate_ms / 1000)
+    accurate_seconds, accurate_names = run(accurate, names, extractor)
+
+    two_pass = TwoPassBackend(StubEngine(truth, args.fast_ms / 1000, args.misread), StubEngine(truth, args.accurate_ms / 1000),
+                              extractor, args.min_confidence)
+    two_pass_seconds, two_pass_names = run(two_pass, names, extractor)
+    stats = two_pass.stats()
+    differ = sum(two_pass_names[name] != accurate_names[name] for name in names)
+
+    print(f"{len(names)} label(s), fast {args.fast_ms:g} ms, accurate {args.accurate_ms:g} ms, {args.misread:.0%} misread by the fast pass")
+    print(f"accurate only  {accurate_seconds:8.2f} s wall")
+    print(f"two-pass       {two_pass_seconds:8.2f} s wall ({1 - two_pass_seconds / accurate_seconds:.0%} less)")
+    print(f"               {two_pass.summary()}")
+    print(f"names          {differ} of {len(names)} differ from accurate only")
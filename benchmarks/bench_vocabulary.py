@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+import random
+import string
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from name_extraction import DEFAULT_RULES_PATH
+from vocabulary import MAX_DISTANCE, allowed_distance, load_vocabulary, osa_distance
+
+# Vocabulary lookups with tens of thousands of terms: the shipped
+# lab_vocabulary.toml plus --terms synthetic project codes. Times index
+# build, uncached lookups of misread terms and of unrelated words, against
+# a linear scan of every term, and checks how many misreads come back as
+# the term they were made from, on lines read with low and with high
+# confidence (where only OCR-like edits are corrected).
+
+LAB_VOCABULARY = os.path.join(os.path.dirname(DEFAULT_RULES_PATH), "lab_vocabulary.toml")
+
+def synthetic_terms(count, seed=0):
+    rng = random.Random(seed)
+    terms = set()
+    while len(terms) < count:
+        length = rng.randint(5, 12)
+        terms.add(rng.choice(string.ascii_uppercase) + "".join(rng.choice(string.ascii_lowercase) for _ in range(length - 1)))
+    return sorted(terms)
+
+def misread(term, rng):
+    # one OCR-style edit: substitution, adjacent swap, dropped or extra character
+    i = rng.randrange(len(term) - 1)
+    kind = rng.choice(("substitute", "swap", "drop", "insert"))
+    if kind == "substitute":
+        return term[:i] + rng.choice(string.ascii_lowercase + string.digits) + term[i + 1:]
+    if kind == "swap":
+        return term[:i] + term[i + 1] + term[i] + term[i + 2:]
+    if kind == "drop":
+        return term[:i] + term[i + 1:]
+    return term[:i] + rng.choice(string.ascii_lowercase) + term[i:]
+
+def linear_lookup(terms, word):
+    word = word.lower()
+    best, best_term = MAX_DISTANCE + 1, None
+    for term in terms:
+        lowered = term.lower()
+        distance = osa_distance(word, lowered, allowed_distance(lowered))
+        if distance <= allowed_distance(lowered) and distance < best:
+            best, best_term = distance, term
+    return best_term
+
+def per_word_us(lookup, words):
+    start = time.perf_counter()
+    for word in words:
+        lookup(word)
+    return (time.perf_counter() - start) / len(words) * 1e6
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark indexed vocabulary lookups against a linear scan.")
+    parser.add_argument("--terms", type=int, default=50000, help="Synthetic terms added to the lab vocabulary (default: 50000)")
+    parser.add_argument("--words", type=int, default=5000, help="Words looked up (default: 5000)")
+    parser.add_argument("--linear-words", type=int, default=20, help="Words looked up by linear scan (default: 20)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    vocabulary = load_vocabulary(LAB_VOCABULARY)
+    vocabulary.add(synthetic_terms(args.terms, args.seed), "projects")
+    build_seconds = time.perf_counter() - start
+
+    targets = [rng.choice(vocabulary.terms) for _ in range(args.words)]
+    targets = [term for term in targets if allowed_distance(term.lower())]
+    misreads = [misread(term, rng) for term in targets]
+    unrelated = ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 12))) for _ in range(args.words)]
+
+    def uncached(word):
+        vocabulary._cache.clear()
+        return vocabulary.lookup(word)
+
+    misread_us = per_word_us(uncached, misreads)
+    unrelated_us = per_word_us(uncached, unrelated)
+    linear_us = per_word_us(lambda word: linear_lookup(vocabulary.terms, word), misreads[:args.linear_words])
+    vocabulary._cache.clear()
+    fixed = sum((vocabulary.correct(word, doubtful=True) or (None,))[0] == term for word, term in zip(misreads, targets))
+    fixed_confident = sum((vocabulary.correct(word) or (None,))[0] == term for word, term in zip(misreads, targets))
+    ambiguous = sum(vocabulary.lookup(word) is None for word in misreads)
+
+    print(f"{len(vocabulary)} term(s), index built in {build_seconds:.2f} s ({len(vocabulary._index)} keys)")
+    print(f"misread lookup   {misread_us:8.1f} µs/word")
+    print(f"unrelated lookup {unrelated_us:8.1f} µs/word")
+    print(f"linear scan      {linear_us:8.1f} µs/word   (speedup {linear_us / misread_us:.0f}x)")
+    print(f"corrected        {fixed} of {len(misreads)} misreads to their term on doubtful lines, {fixed_confident} on confident ones; "
+          f"{ambiguous} left alone (ambiguous, too far or a digit change)")
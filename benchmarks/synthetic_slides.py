@@ -0,0 +1,136 @@
+import io
+import os
+import struct
+import uuid
+import argparse
+from PIL import Image, ImageDraw
+
+# Writes MIRAX-like slides (a .mrxs stub plus Slidedat.ini, Index.dat and a
+# Data0000.dat) that openslide can open. Every tile of the pyramid points at
+# the same small JPEG so a realistic index costs almost no disk space.
+
+def _int32(value):
+    return struct.pack("<i", value)
+
+def _encode(img, fmt):
+    buf = io.BytesIO()
+    img.convert("RGB").save(buf, fmt)
+    return buf.getvalue()
+
+def write_mirax_slide(folder, name, label_img, tiles_x=32, tiles_y=32, levels=6, tile_size=256, label_format="JPEG"):
+    slide_dir = os.path.join(folder, name)
+    os.makedirs(slide_dir, exist_ok=True)
+    mrxs_path = os.path.join(folder, name + ".mrxs")
+    open(mrxs_path, "wb").close()
+    slide_id = uuid.uuid4().hex
+
+    tile = _encode(Image.new("RGB", (tile_size, tile_size), (236, 200, 222)), "JPEG")
+    label = _encode(label_img, label_format)
+    with open(os.path.join(slide_dir, "Data0000.dat"), "wb") as f:
+        f.write(tile)
+        f.write(label)
+    tile_entry = (0, len(tile), 0)
+    label_entry = (len(tile), len(label), 0)
+
+    index = bytearray(b"01.02" + slide_id.encode("ascii"))
+    roots = len(index)
+    index += bytes(8)
+
+    def add_record(entries):
+        # record: 0, pointer to data page; page: count, next page (0), entries
+        record = len(index)
+        index.extend(_int32(0) + _int32(record + 8))
+        index.extend(_int32(len(entries)) + _int32(0))
+        for values in entries:
+            index.extend(b"".join(_int32(v) for v in values))
+        return record
+
+    level_records = []
+    for level in range(levels):
+        step = 2 ** level
+        entries = [(y * tiles_x + x,) + tile_entry
+                   for y in range(0, tiles_y, step) for x in range(0, tiles_x, step)]
+        level_records.append(add_record(entries))
+    label_record = add_record([(0, 0) + label_entry])
+
+    hier_table = len(index)
+    index += b"".join(_int32(r) for r in level_records)
+    nonhier_table = len(index)
+    index += _int32(label_record)
+    struct.pack_into("<ii", index, roots, hier_table, nonhier_table)
+    with open(os.path.join(slide_dir, "Index.dat"), "wb") as f:
+        f.write(index)
+
+    lines = [
+        "[GENERAL]",
+        f"SLIDE_ID = {slide_id}",
+        "SLIDE_VERSION = 01.02",
+        f"IMAGENUMBER_X = {tiles_x}",
+        f"IMAGENUMBER_Y = {tiles_y}",
+        "OBJECTIVE_MAGNIFICATION = 20",
+        "CAMERA_IMAGE_DIVISIONS_PER_SIDE = 1",
+        "[HIERARCHICAL]",
+        "INDEXFILE = Index.dat",
+        "HIER_COUNT = 1",
+        "HIER_0_NAME = Slide zoom level",
+        f"HIER_0_COUNT = {levels}",
+    ]
+    for level in range(levels):
+        lines += [f"HIER_0_VAL_{level} = ZoomLevel_{level}",
+                  f"HIER_0_VAL_{level}_SECTION = LAYER_0_LEVEL_{level}_SECTION"]
+    lines += [
+        "NONHIER_COUNT = 1",
+        "NONHIER_0_NAME = Scan data layer",
+        "NONHIER_0_COUNT = 1",
+        "NONHIER_0_VAL_0 = ScanDataLayer_SlideBarcode",
+        "NONHIER_0_VAL_0_SECTION = NONHIER_0_VAL_0_SECTION",
+        "[DATAFILE]",
+        "FILE_COUNT = 1",
+        "FILE_0 = Data0000.dat",
+    ]
+    for level in range(levels):
+        lines += [
+            f"[LAYER_0_LEVEL_{level}_SECTION]",
+            "OVERLAP_X = 0",
+            "OVERLAP_Y = 0",
+            f"MICROMETER_PER_PIXEL_X = {0.25 * 2 ** level}",
+            f"MICROMETER_PER_PIXEL_Y = {0.25 * 2 ** level}",
+            "IMAGE_FORMAT = JPEG",
+            f"IMAGE_CONCAT_FACTOR = {min(level, 1)}",
+            "IMAGE_FILL_COLOR_BGR = 16777215",
+            f"DIGITIZER_WIDTH = {tile_size}",
+            f"DIGITIZER_HEIGHT = {tile_size}",
+        ]
+    lines += ["[NONHIER_0_VAL_0_SECTION]", f"BARCODE_IMAGE_TYPE = {label_format}"]
+    with open(os.path.join(slide_dir, "Slidedat.ini"), "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return mrxs_path
+
+def plain_label(index, size=(600, 240)):
+    # flat-colored stand-in label; distinct per slide so cache keys differ
+    return Image.new("RGB", size, (255, 255 - index % 200, 220))
+
+def text_label(index, lines=None, size=(600, 240)):
+    # label with printed text and a noisy paper background, closer to what
+    # a scanned slide label compresses like
+    lines = lines or [f"{20 + index % 8}-{index % 1000:03d} H(20)", f"Lung Block {index % 30}", "GlintLab"]
+    noise = Image.effect_noise(size, 24).point(lambda v: 190 + v // 4)
+    img = Image.merge("RGB", (noise, noise, noise.point(lambda v: v - 10)))
+    draw = ImageDraw.Draw(img)
+    for row, line in enumerate(lines):
+        draw.text((24, 24 + row * 64), line, fill=(20, 20, 30), font_size=40)
+    return img
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic MIRAX slides for benchmarking.")
+    parser.add_argument("output_dir", help="Folder to write the synthetic .mrxs slides into")
+    parser.add_argument("--count", type=int, default=10, help="Number of slides to generate")
+    parser.add_argument("--tiles", type=int, default=32, help="Tiles per side at the base level")
+    parser.add_argument("--levels", type=int, default=6, help="Number of pyramid levels")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for i in range(args.count):
+        write_mirax_slide(args.output_dir, f"slide_{i:05d}", plain_label(i),
+                          tiles_x=args.tiles, tiles_y=args.tiles, levels=args.levels)
+    print(f"Wrote {args.count} synthetic slide(s) to {args.output_dir}")
@@ -16,15 +16,11 @@ conda activate ocrenv
 
 # EDIT PATHS HERE
 # ---------------
-EXTRACT_IMAGES="/Users/minimac/Downloads/Slide_Renaming/open_label_images.py"
+RUN_BATCH="/Users/minimac/Downloads/Slide_Renaming/batch_pipeline.py"
 RUN_OCR="/Users/minimac/Downloads/VisionOCRDemo/.build/release/VisionOCRDemo"
-RENAME_FILES="/Users/minimac/Downloads/Slide_Renaming/file_renaming_outliers_excel.py"
-TEMP_PATH="/Users/minimac/tmp/"
 
 # Main script starts here
 # -----------------------
-mkdir -p $TEMP_PATH
-
 # Temp list of folders to run script on
 folders_to_process=()
 
@@ -54,27 +50,11 @@ if [ "${#ungrouped_files[@]}" -gt 0 ]; then
     folders_to_process+=("$new_folder")
 fi
 
-for folder in "${folders_to_process[@]}"; do
-	# Store label pngs in tmp folder
-    echo "Extracting label images from: [$folder]..."
-    python "$EXTRACT_IMAGES" "$folder" -o "$TEMP_PATH$(basename "$folder")"
-
-	# create folder for output files
-	timestamp=$(date +"%m.%d.%Y_%H-%M")
-    output_name="outputs_$timestamp"
-	output_folder="$folder/$output_name"
-    mkdir -p "$output_folder"
-
-	# Extract label text fields from pngs in tmp folder
-	echo "Reading text from label images..."
-	"$RUN_OCR" "$TEMP_PATH$(basename "$folder")" "$output_folder" 
-
-	# Rename files using extracted label text
-	echo "Renaming mrxs files based on label text"
-	python "$RENAME_FILES" --ocr "${output_folder}/ocr_results.txt" --folder "$folder" --labels "$TEMP_PATH$(basename "$folder")" -o "$output_folder"
-
-	rm -r "$TEMP_PATH" 
-done
+# Extract labels, read them with OCR and name the slides of every folder in
+# one batch; folders run concurrently and share the OCR workers, and each gets
+# its own timestamped outputs_ subfolder
+echo "Naming mrxs files in ${#folders_to_process[@]} folder(s) from their label text..."
+python "$RUN_BATCH" "${folders_to_process[@]}" --ocr-binary "$RUN_OCR"
 
 # Print path to image folder after processing
 for folder in "${folders_to_process[@]}"; do
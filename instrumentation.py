@@ -0,0 +1,108 @@
+import os
+import json
+import time
+
+# Per-stage, per-slide timing. Each measured call records wall time, CPU time
+# of the calling thread (stages run on their own threads) and the bytes it
+# handled; summary() reduces them to p50/p95 per stage and slides/sec.
+# A disabled Instrumentation hands out one shared no-op stage, so leaving the
+# calls in place costs about a method call each.
+
+SUMMARY_NAME = "run_summary.json"
+
+class _Stage:
+    __slots__ = ("samples", "name", "slide", "bytes", "_wall", "_cpu")
+
+    def __init__(self, samples, name, slide, nbytes):
+        self.samples = samples
+        self.name = name
+        self.slide = slide
+        self.bytes = nbytes
+
+    def __enter__(self):
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *exc):
+        # list.append is atomic, so worker threads record without a lock
+        self.samples.append((self.name, self.slide, time.perf_counter() - self._wall,
+                             time.thread_time() - self._cpu, self.bytes))
+
+class _NullStage:
+    # `with instrumentation.stage(...) as stage: stage.bytes = n` still works
+    __slots__ = ("bytes",)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+_NULL_STAGE = _NullStage()
+
+def _percentile(values, fraction):
+    return values[int(fraction * (len(values) - 1))]
+
+class Instrumentation:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.samples = []
+        self.started = time.perf_counter()
+
+    def stage(self, name, slide=None, nbytes=0):
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self.samples, name, slide, nbytes)
+
+    def add(self, name, wall, cpu=0.0, nbytes=0, slide=None):
+        # for time measured elsewhere (e.g. OCR in the Swift process, where
+        # only the round trip is visible)
+        if self.enabled:
+            self.samples.append((name, slide, wall, cpu, nbytes))
+
+    def summary(self, slides=None, seconds=None):
+        # slides defaults to the number of distinct slides seen
+        seconds = time.perf_counter() - self.started if seconds is None else seconds
+        stages, per_slide = {}, {}
+        for name, slide, wall, cpu, nbytes in self.samples:
+            stage = stages.setdefault(name, {"walls": [], "cpu_s": 0.0, "bytes": 0})
+            stage["walls"].append(wall)
+            stage["cpu_s"] += cpu
+            stage["bytes"] += nbytes
+            if slide is not None:
+                timings = per_slide.setdefault(slide, {})
+                timings[name] = round(timings.get(name, 0) + wall * 1000, 3)
+        for stage in stages.values():
+            walls = sorted(stage.pop("walls"))
+            stage.update({
+                "count": len(walls),
+                "wall_s": round(sum(walls), 4),
+                "cpu_s": round(stage["cpu_s"], 4),
+                "p50_ms": round(_percentile(walls, 0.5) * 1000, 3),
+                "p95_ms": round(_percentile(walls, 0.95) * 1000, 3),
+            })
+        slides = len(per_slide) if slides is None else slides
+        return {
+            "slides": slides,
+            "seconds": round(seconds, 4),
+            "slides_per_sec": round(slides / seconds, 3) if seconds else 0.0,
+            "stages": stages,
+            "per_slide": per_slide,
+        }
+
+    def write_summary(self, folder, run_log=None, slides=None, name=SUMMARY_NAME):
+        # writes run_summary.json and logs one line per stage; no-op when disabled
+        if not self.enabled:
+            return None
+        summary = self.summary(slides)
+        with open(os.path.join(folder, name), "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        if run_log is not None:
+            run_log.event("throughput", slides=summary["slides"], seconds=summary["seconds"],
+                          slides_per_sec=summary["slides_per_sec"])
+            for stage, stats in summary["stages"].items():
+                run_log.event("stage_timing", stage=stage, **stats)
+        return summary
+
+DISABLED = Instrumentation(enabled=False)
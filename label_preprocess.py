@@ -0,0 +1,155 @@
+import io
+import os
+import argparse
+import numpy as np
+from PIL import Image
+
+# Optional clean-up of a label image before OCR, on NumPy arrays: deskew,
+# crop to the printed text, downscale so text lines are about
+# `text_height` pixels tall, then binarize. OCR gets far fewer pixels and a
+# 1-bit PNG; the original label is still what goes into the Excel sheet.
+
+TEXT_HEIGHT = 40
+MAX_SKEW = 5.0
+SKEW_STEP = 0.25
+# ink fraction under which a row/column is background noise, and average
+# ink fraction over which an outer band is a scanner edge or frame, not text
+NOISE_INK = 0.005
+SOLID_INK = 0.5
+PADDING = 8
+_SKEW_SAMPLES = 20000
+
+def grayscale(img):
+    # RGBA labels are composited on white so transparent areas read as paper
+    if img.mode in ("RGBA", "LA", "P"):
+        img = img.convert("RGBA")
+        background = Image.new("RGBA", img.size, "white")
+        img = Image.alpha_composite(background, img)
+    return np.asarray(img.convert("L"), dtype=np.uint8)
+
+def otsu_threshold(gray):
+    # threshold maximizing the between-class variance of the histogram, or
+    # None for a uniform image (e.g. a blank label), which has no two classes
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    if np.count_nonzero(hist) < 2:
+        return None
+    levels = np.arange(256)
+    weight = np.cumsum(hist)
+    total = weight[-1]
+    mean = np.cumsum(hist * levels)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variance = (mean[-1] * weight - mean * total) ** 2 / (weight * (total - weight))
+    return int(np.nanargmax(variance[:-1]))
+
+def estimate_skew(ink, max_skew=MAX_SKEW, step=SKEW_STEP):
+    # angle (degrees) whose row projection of the ink is sharpest: text lines
+    # line up with rows when the label is straight
+    ys, xs = np.nonzero(ink)
+    if len(ys) < 2:
+        return 0.0
+    if len(ys) > _SKEW_SAMPLES:
+        keep = np.random.default_rng(0).choice(len(ys), _SKEW_SAMPLES, replace=False)
+        ys, xs = ys[keep], xs[keep]
+    best, best_score = 0.0, -1.0
+    for angle in np.arange(-max_skew, max_skew + step / 2, step):
+        rows = np.round(ys + xs * np.tan(np.radians(angle))).astype(np.int64)
+        profile = np.bincount(rows - rows.min())
+        score = float(np.dot(profile, profile))
+        if score > best_score:
+            best, best_score = float(angle), score
+    return best
+
+def _runs(inked):
+    # (start, end) of each run of True values
+    edges = np.diff(np.concatenate(([0], inked.astype(np.int8), [0])))
+    return list(zip(np.nonzero(edges == 1)[0], np.nonzero(edges == -1)[0]))
+
+def _text_span(ink_fraction):
+    # first and last index holding text: inked, but not part of a solid band
+    # (scanner edge, frame) along the outside of the label
+    runs = _runs(ink_fraction > NOISE_INK)
+    while runs and ink_fraction[slice(*runs[0])].mean() > SOLID_INK:
+        runs = runs[1:]
+    while runs and ink_fraction[slice(*runs[-1])].mean() > SOLID_INK:
+        runs = runs[:-1]
+    return (runs[0][0], runs[-1][1]) if runs else None
+
+def text_box(ink):
+    # (top, bottom, left, right) around the text, or None for a blank label.
+    # Columns first: a dark scanner edge down one side puts ink on every row
+    cols = _text_span(ink.mean(axis=0))
+    if cols is None:
+        return None
+    rows = _text_span(ink[:, cols[0]:cols[1]].mean(axis=1))
+    if rows is None:
+        return None
+    cols = _text_span(ink[rows[0]:rows[1]].mean(axis=0)) or cols
+    return rows + cols
+
+def _crop(gray, ink):
+    box = text_box(ink)
+    if box is None:
+        return gray, ink
+    top, bottom, left, right = box
+    top, left = max(0, top - PADDING), max(0, left - PADDING)
+    return gray[top:bottom + PADDING, left:right + PADDING], ink[top:bottom + PADDING, left:right + PADDING]
+
+def line_height(ink):
+    # median height of the runs of inked rows, i.e. of the text lines
+    heights = [end - start for start, end in _runs(ink.mean(axis=1) > NOISE_INK)]
+    return int(np.median(heights)) if heights else 0
+
+def preprocess_label(img, text_height=TEXT_HEIGHT, deskew=True):
+    # PIL label image -> 1-bit PIL image ready for OCR; a blank label is
+    # returned unchanged
+    gray = grayscale(img)
+    threshold = otsu_threshold(gray)
+    if threshold is None:
+        return img
+    # the skew is measured on the text alone, then the crop is tightened
+    gray, ink = _crop(gray, gray < threshold)
+    if deskew:
+        angle = estimate_skew(ink)
+        if angle:
+            # the projection tilts rows by `angle` to follow the lines, so
+            # turning the label back by it (PIL rotates counter-clockwise)
+            # straightens them
+            gray = np.asarray(Image.fromarray(gray).rotate(-angle, resample=Image.BILINEAR, expand=True, fillcolor=255))
+            gray, ink = _crop(gray, gray < threshold)
+    height = line_height(ink)
+    label = Image.fromarray(gray)
+    if height > text_height:
+        # only ever shrink; upscaling adds pixels without adding detail
+        scale = text_height / height
+        label = label.resize((max(1, round(label.width * scale)), max(1, round(label.height * scale))), Image.LANCZOS)
+    binary = np.asarray(label) >= threshold
+    return Image.fromarray(binary)
+
+def to_png(img):
+    png = io.BytesIO()
+    img.save(png, "PNG", optimize=img.mode == "1")
+    return png.getvalue()
+
+def label_preprocessor(text_height=TEXT_HEIGHT, deskew=True):
+    # the `preprocess` hook of the pipeline: label image -> OCR input image
+    return lambda img: preprocess_label(img, text_height, deskew)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Preprocess label PNGs for OCR (deskew, crop, downscale, binarize).")
+    parser.add_argument("labels", nargs="+", help="Label PNGs")
+    parser.add_argument("-o", required=True, help="Folder for the preprocessed PNGs")
+    parser.add_argument("--text-height", type=int, default=TEXT_HEIGHT, help=f"Target text line height in pixels (default: {TEXT_HEIGHT})")
+    parser.add_argument("--no-deskew", action="store_true", help="Skip the skew estimate")
+    args = parser.parse_args()
+
+    os.makedirs(args.o, exist_ok=True)
+    before = after = 0
+    for path in args.labels:
+        with Image.open(path) as img:
+            png = to_png(preprocess_label(img, args.text_height, not args.no_deskew))
+        with open(os.path.join(args.o, os.path.basename(path)), "wb") as f:
+            f.write(png)
+        before += os.path.getsize(path)
+        after += len(png)
+    print(f"✔ {len(args.labels)} label(s): {before} → {after} bytes ({after / before if before else 0:.1%})")
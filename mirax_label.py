@@ -0,0 +1,140 @@
+import io
+import os
+import struct
+import configparser
+from PIL import Image
+
+# MIRAX slides are a .mrxs stub plus a same-named folder holding Slidedat.ini,
+# Index.dat and Data*.dat files. The label is a non-hierarchical record in
+# Index.dat that points at a byte range inside one of the data files.
+INDEX_VERSION = "01.02"
+LABEL_LAYER = "Scan data layer"
+LABEL_VALUE = "ScanDataLayer_SlideBarcode"
+
+class MiraxError(Exception):
+    pass
+
+def slide_data_dir(mrxs_path):
+    return os.path.splitext(mrxs_path)[0]
+
+def read_slidedat(mrxs_path):
+    ini_path = os.path.join(slide_data_dir(mrxs_path), "Slidedat.ini")
+    parser = configparser.ConfigParser(interpolation=None, strict=False)
+    parser.optionxform = str  # keys are upper-case in Slidedat.ini
+    try:
+        with open(ini_path, "r", encoding="utf-8-sig") as f:
+            parser.read_file(f)
+    except (OSError, configparser.Error) as e:
+        raise MiraxError(f"Can't load Slidedat.ini: {e}")
+    return parser
+
+def slide_files(mrxs_path):
+    # every file of the slide's data folder that Slidedat.ini refers to (the
+    # ini itself, the index and each data file), whether or not it exists yet
+    slidedat = read_slidedat(mrxs_path)
+    try:
+        datafiles = slidedat["DATAFILE"]
+        names = [slidedat["HIERARCHICAL"]["INDEXFILE"]]
+        names += [datafiles[f"FILE_{i}"] for i in range(int(datafiles["FILE_COUNT"]))]
+    except (KeyError, ValueError) as e:
+        raise MiraxError(f"Malformed Slidedat.ini: {e}")
+    data_dir = slide_data_dir(mrxs_path)
+    return [os.path.join(data_dir, "Slidedat.ini")] + [os.path.join(data_dir, name) for name in names]
+
+def _label_record_number(slidedat):
+    # nonhier records are numbered sequentially across every layer's values
+    hier = slidedat["HIERARCHICAL"]
+    record = 0
+    for layer in range(int(hier.get("NONHIER_COUNT", 0))):
+        count = int(hier.get(f"NONHIER_{layer}_COUNT", 0))
+        if hier.get(f"NONHIER_{layer}_NAME") == LABEL_LAYER:
+            for val in range(count):
+                if hier.get(f"NONHIER_{layer}_VAL_{val}") == LABEL_VALUE:
+                    return record + val
+        record += count
+    return None
+
+def _read_int32(f):
+    data = f.read(4)
+    if len(data) != 4:
+        raise MiraxError("Unexpected end of Index.dat")
+    return struct.unpack("<i", data)[0]
+
+def locate_label_record(mrxs_path):
+    # returns (datafile_path, offset, length) of the label, or None if the
+    # slide has no label record
+    try:
+        slidedat = read_slidedat(mrxs_path)
+        record = _label_record_number(slidedat)
+        if record is None:
+            return None
+
+        slide_id = slidedat["GENERAL"]["SLIDE_ID"]
+        index_name = slidedat["HIERARCHICAL"]["INDEXFILE"]
+        datafiles = slidedat["DATAFILE"]
+    except (KeyError, ValueError) as e:
+        raise MiraxError(f"Malformed Slidedat.ini: {e}")
+
+    data_dir = slide_data_dir(mrxs_path)
+    try:
+        with open(os.path.join(data_dir, index_name), "rb") as f:
+            if f.read(len(INDEX_VERSION)).decode("ascii", "replace") != INDEX_VERSION:
+                raise MiraxError("Index.dat doesn't have expected version")
+            if f.read(len(slide_id)).decode("ascii", "replace") != slide_id:
+                raise MiraxError("Index.dat doesn't have a matching slide identifier")
+            # header is followed by the hier root pointer, then the nonhier one
+            f.seek(4, os.SEEK_CUR)
+            table = _read_int32(f)
+            f.seek(table + 4 * record)
+            f.seek(_read_int32(f))
+            if _read_int32(f) != 0:
+                raise MiraxError("Expected 0 value at beginning of data page")
+            f.seek(_read_int32(f))
+            if _read_int32(f) < 1:
+                raise MiraxError("Expected at least one data item")
+            # the first of the three padding values is not always zero
+            _read_int32(f)
+            if _read_int32(f) != 0 or _read_int32(f) != 0:
+                raise MiraxError("Expected 0 values in nonhier data item")
+            offset, length, fileno = struct.unpack("<iii", f.read(12))
+    except OSError as e:
+        raise MiraxError(f"Can't read {index_name}: {e}")
+    except struct.error:
+        raise MiraxError("Unexpected end of Index.dat")
+
+    datafile = datafiles.get(f"FILE_{fileno}")
+    if datafile is None:
+        raise MiraxError(f"Label points at unknown data file {fileno}")
+    return os.path.join(data_dir, datafile), offset, length
+
+def read_label_record(mrxs_path):
+    # raw (still encoded) label bytes, or None if the slide has no label
+    location = locate_label_record(mrxs_path)
+    if location is None:
+        return None
+    datafile_path, offset, length = location
+    try:
+        with open(datafile_path, "rb") as f:
+            f.seek(offset)
+            data = f.read(length)
+    except OSError as e:
+        raise MiraxError(f"Can't read label data: {e}")
+    if len(data) != length:
+        raise MiraxError("Label data is truncated")
+    return data
+
+def decode_label(data):
+    # openslide hands back associated images as RGBA; match it so both paths
+    # write identical PNGs
+    try:
+        img = Image.open(io.BytesIO(data))
+        img.load()
+    except OSError as e:
+        raise MiraxError(f"Can't decode label image: {e}")
+    return img.convert("RGBA")
+
+def read_label_image(mrxs_path):
+    # fast path: read just the label record instead of opening the whole slide
+    # (which parses every level of the tile index)
+    data = read_label_record(mrxs_path)
+    return decode_label(data) if data is not None else None
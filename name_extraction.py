@@ -0,0 +1,240 @@
+import os
+import re
+import string
+import tomllib
+from functools import lru_cache
+from vocabulary import DOUBTFUL_CONFIDENCE, MIN_CONFIDENCE, VocabularyError, load_vocabulary
+
+# Builds new slide names from OCR'd label lines. All rules are compiled once
+# per NameExtractor, so a single extractor is reused for every slide of a run.
+# The rules themselves live in name_rules.toml next to this file (see
+# load_extractor); the defaults below match the shipped rules file.
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "name_rules.toml")
+
+DEFAULT_NOISE_TERMS = ("glintlab",)
+DEFAULT_STUDY_ID_PATTERNS = (r"\d{2}-\d{3}",)
+# lines holding a date or time are dropped entirely
+DEFAULT_SKIP_LINE_PATTERNS = (r"\d{1,2}/\d{1,2}/\d{2,4}", r"\d{1,2}:\d{2} ?(AM|PM)?")
+# punctuation stripped from both ends of every word
+DEFAULT_STRIP_CHARS = ".,;:*+"
+DEFAULT_REPLACEMENTS = {"/": "-"}
+TEMPLATE_FIELDS = {"name", "study_id"}
+
+class RulesError(ValueError):
+    pass
+
+class NameExtractor:
+    def __init__(self, noise_terms=DEFAULT_NOISE_TERMS, study_id_patterns=DEFAULT_STUDY_ID_PATTERNS,
+                 skip_line_patterns=DEFAULT_SKIP_LINE_PATTERNS, strip_chars=DEFAULT_STRIP_CHARS,
+                 replacements=DEFAULT_REPLACEMENTS, stop_after_study_id=True, stop_terms=(),
+                 separator="_", template="{name}", vocabulary=None):
+        # vocabulary: optional Vocabulary that misread words are corrected
+        # against (see vocabulary.py)
+
+        # word sets are hashed, and every pattern list is merged into a single
+        # alternation, so each token costs the same however many noise terms
+        # or study ID formats the rules list
+        self.noise_terms = frozenset(term.lower() for term in noise_terms)
+        self.stop_terms = frozenset(term.lower() for term in stop_terms)
+        self.stop_after_study_id = stop_after_study_id
+        self.separator = separator
+        self.template = template
+        self.vocabulary = vocabulary
+        self._study_id = _alternation(study_id_patterns, r"\b(?:{})\b")
+        self._skip_line = _alternation(skip_line_patterns, "{}", re.IGNORECASE)
+        self._replacements = tuple((replacements or {}).items())
+        # one pattern both splits a line into words and strips their
+        # punctuation: a word runs from its first to its last character that
+        # is neither whitespace nor strippable punctuation
+        edge = f"[^\\s{re.escape(strip_chars)}]" if strip_chars else r"\S"
+        self._words = re.compile(f"{edge}(?:\\S*{edge})?")
+
+    def extract(self, lines, confidences=None):
+        # returns (study ID or None, file name without extension).
+        # confidences: OCR confidence of each line, if known; words on
+        # doubtful lines are corrected more readily
+        return self._extract(lines, confidences, None)
+
+    def extract_corrected(self, lines, confidences=None):
+        # like extract, plus the vocabulary corrections made:
+        # [(word, term, category, distance, confidence)]
+        corrections = []
+        study_id, name = self._extract(lines, confidences, corrections)
+        return study_id, name, corrections
+
+    def _extract(self, lines, confidences, corrections):
+        study_id = None
+        tokens = []
+        noise_terms = self.noise_terms
+        stop_terms = self.stop_terms
+        stop_after_study_id = self.stop_after_study_id
+        replacements = self._replacements
+        study_id_match = self._study_id.match if self._study_id else None
+        words = self._words.findall
+        skip_line = self._skip_line.search if self._skip_line else None
+        correct = self.vocabulary.correct if self.vocabulary else None
+
+        for i, line in enumerate(lines):
+            if skip_line and skip_line(line):
+                continue
+            confidence = confidences[i] if confidences else None
+            doubtful = confidence is not None and confidence < DOUBTFUL_CONFIDENCE
+            for word in words(line):
+                for old, new in replacements:
+                    if old in word:
+                        word = word.replace(old, new)
+                lowered = word.lower()
+                if lowered in noise_terms:
+                    continue
+                # words that already look like a study ID are left alone: a
+                # new ID one edit from a known one is the study ID index's
+                # business, not a misread to fix
+                if correct and not (study_id_match and study_id_match(word)):
+                    correction = correct(word, doubtful)
+                    if correction:
+                        if corrections is not None:
+                            corrections.append((word,) + correction)
+                        word = correction[0]
+                        lowered = word.lower()
+                tokens.append(word)
+                # study ID is almost always before a company name
+                # this part ensures the next term after a study ID is not taken
+                if study_id_match and study_id_match(word):
+                    if study_id is None:
+                        study_id = word
+                    if stop_after_study_id:
+                        break  # stop further tokens from this line
+                if stop_terms and lowered in stop_terms:
+                    break
+
+        name = self.separator.join(tokens)
+        if self.template != "{name}":
+            name = self.template.format(name=name, study_id=study_id or "")
+        return study_id, name
+
+    def extract_batch(self, slides):
+        # slides: iterable of per-slide OCR line lists
+        return list(map(self.extract, slides))
+
+def _alternation(patterns, wrapper, flags=0):
+    if not patterns:
+        return None
+    return re.compile(wrapper.format("|".join(f"(?:{p})" for p in patterns)), flags)
+
+# --- rules file -------------------------------------------------------------
+
+def _check(condition, source, message):
+    if not condition:
+        raise RulesError(f"{source}: {message}")
+
+def _string_list(section, key, source):
+    value = section.get(key, [])
+    _check(isinstance(value, list) and all(isinstance(v, str) for v in value), source, f"{key} must be a list of strings")
+    return value
+
+def _patterns(section, key, source):
+    patterns = _string_list(section, key, source)
+    for pattern in patterns:
+        try:
+            re.compile(pattern)
+        except re.error as e:
+            raise RulesError(f"{source}: invalid pattern in {key}: {pattern!r} ({e})")
+    return patterns
+
+def _known_keys(section, allowed, source, where):
+    unknown = set(section) - set(allowed)
+    _check(not unknown, source, f"unknown key(s) in {where}: {', '.join(sorted(unknown))}")
+
+def parse_rules(data, source="rules"):
+    # validates a parsed rules file and returns NameExtractor arguments
+    _known_keys(data, {"filters", "study_id", "stop", "output", "correction"}, source, "rules file")
+    sections = {}
+    for name in ("filters", "study_id", "stop", "output", "correction"):
+        sections[name] = data.get(name, {})
+        _check(isinstance(sections[name], dict), source, f"[{name}] must be a table")
+    filters, study_id, stop, output = sections["filters"], sections["study_id"], sections["stop"], sections["output"]
+    correction = sections["correction"]
+    _known_keys(filters, {"noise_terms", "skip_lines", "strip_chars", "replace"}, source, "[filters]")
+    _known_keys(study_id, {"patterns"}, source, "[study_id]")
+    _known_keys(stop, {"after_study_id", "after_terms"}, source, "[stop]")
+    _known_keys(output, {"separator", "template"}, source, "[output]")
+    _known_keys(correction, {"vocabulary", "min_confidence"}, source, "[correction]")
+
+    noise_terms = _string_list(filters, "noise_terms", source)
+    stop_terms = _string_list(stop, "after_terms", source)
+    for term in noise_terms + stop_terms:
+        _check(term and not any(c.isspace() for c in term), source, f"terms must be single words, got {term!r}")
+
+    strip_chars = filters.get("strip_chars", DEFAULT_STRIP_CHARS)
+    _check(isinstance(strip_chars, str), source, "strip_chars must be a string")
+    replacements = filters.get("replace", DEFAULT_REPLACEMENTS)
+    _check(isinstance(replacements, dict) and all(k and isinstance(v, str) for k, v in replacements.items()),
+           source, "replace must map non-empty strings to strings")
+
+    stop_after_study_id = stop.get("after_study_id", True)
+    _check(isinstance(stop_after_study_id, bool), source, "after_study_id must be true or false")
+
+    separator = output.get("separator", "_")
+    template = output.get("template", "{name}")
+    _check(isinstance(separator, str), source, "separator must be a string")
+    _check(isinstance(template, str), source, "template must be a string")
+    try:
+        fields = {field for _, field, _, _ in string.Formatter().parse(template) if field is not None}
+    except ValueError as e:
+        raise RulesError(f"{source}: invalid template {template!r} ({e})")
+    _check(fields <= TEMPLATE_FIELDS, source,
+           f"template may only use {{name}} and {{study_id}}, got {', '.join(sorted(fields - TEMPLATE_FIELDS))}")
+
+    vocabulary = correction.get("vocabulary", "")
+    min_confidence = correction.get("min_confidence", MIN_CONFIDENCE)
+    _check(isinstance(vocabulary, str), source, "vocabulary must be a path")
+    _check(isinstance(min_confidence, (int, float)) and 0 <= min_confidence <= 1, source,
+           "min_confidence must be between 0 and 1")
+    if vocabulary:
+        # relative to the rules file
+        base = os.path.dirname(os.path.abspath(source)) if os.path.exists(source) else os.getcwd()
+        try:
+            vocabulary = load_vocabulary(os.path.join(base, vocabulary), min_confidence)
+        except VocabularyError as e:
+            raise RulesError(f"{source}: {e}")
+
+    return {
+        "noise_terms": noise_terms,
+        "study_id_patterns": _patterns(study_id, "patterns", source),
+        "skip_line_patterns": _patterns(filters, "skip_lines", source),
+        "strip_chars": strip_chars,
+        "replacements": replacements,
+        "stop_after_study_id": stop_after_study_id,
+        "stop_terms": stop_terms,
+        "separator": separator,
+        "template": template,
+        "vocabulary": vocabulary or None,
+    }
+
+def load_rules(path):
+    with open(path, "rb") as f:
+        try:
+            data = tomllib.load(f)
+        except tomllib.TOMLDecodeError as e:
+            raise RulesError(f"{path}: {e}")
+    return parse_rules(data, path)
+
+@lru_cache(maxsize=8)
+def _cached_extractor(path, mtime_ns):
+    return NameExtractor(**load_rules(path))
+
+def load_extractor(path=None):
+    # compiled extractor for a rules file, cached until the file changes;
+    # without a path the shipped name_rules.toml is used (or the built-in
+    # defaults if it has been removed)
+    if path is None:
+        if not os.path.exists(DEFAULT_RULES_PATH):
+            return _default_extractor()
+        path = DEFAULT_RULES_PATH
+    path = os.path.abspath(path)
+    return _cached_extractor(path, os.stat(path).st_mtime_ns)
+
+@lru_cache(maxsize=1)
+def _default_extractor():
+    return NameExtractor()
@@ -0,0 +1,193 @@
+import os
+import queue
+import platform
+import threading
+import subprocess
+from abc import ABC, abstractmethod
+from ocr_results import HEADER_PATTERN, parse_block, read_blocks
+from ocr_structured import is_structured, iter_structured_records, record_results
+
+# OCR engines behind one interface: image bytes in, a list of
+# (text, confidence) lines out. Downstream code only talks to OCRBackend, so
+# it runs the same against the macOS Vision binary or a recorded replay.
+
+_DONE = object()
+
+class OCRError(Exception):
+    pass
+
+def _parse_results(name, body_lines):
+    try:
+        return parse_block(body_lines)
+    except ValueError as e:
+        return OCRError(f"OCR failed for {name}: {e}")
+
+class OCRBackend(ABC):
+    # identifies the engine and its settings; results from different versions
+    # are never mixed (see the OCR cache)
+    engine_version = "unknown"
+
+    @abstractmethod
+    def recognize(self, image_bytes, name):
+        # returns [(text, confidence), ...]; confidence is None for unscored lines
+        raise NotImplementedError
+
+    def recognize_batch(self, items):
+        # items: iterable of (name, image_bytes); yields (name, results) in
+        # order, where results is an OCRError for images the engine failed on.
+        # Backends that can pipeline requests override this.
+        for name, image_bytes in items:
+            try:
+                yield name, self.recognize(image_bytes, name)
+            except OCRError as e:
+                yield name, e
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class VisionSubprocessBackend(OCRBackend):
+    # long-running `VisionOCRDemo --stdin` process: images go in on stdin as
+    # "<byte count> <name>\n<bytes>", "--- name ---" result blocks (ending with
+    # a blank line) come back on stdout
+    def __init__(self, binary, max_inflight=8, fast=False):
+        # fast: Vision's fast recognition level instead of the accurate one
+        self.binary = binary
+        self.max_inflight = max_inflight
+        self.fast = fast
+        # rebuilding the binary or upgrading macOS (and with it Vision) starts
+        # a fresh set of cached results
+        stat = os.stat(binary)
+        self.engine_version = f"vision:{platform.mac_ver()[0] or 'unknown'}:{stat.st_size}-{int(stat.st_mtime)}" + (":fast" if fast else "")
+        self.proc = None
+
+    def _start(self):
+        if self.proc is None or self.proc.poll() is not None:
+            self.proc = subprocess.Popen([self.binary, "--stdin"] + (["--fast"] if self.fast else []),
+                                         stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        return self.proc
+
+    def _send(self, name, image_bytes):
+        self._write(self._start(), name, image_bytes)
+
+    def _write(self, proc, name, image_bytes):
+        proc.stdin.write(f"{len(image_bytes)} {name}\n".encode("utf-8") + image_bytes)
+        proc.stdin.flush()
+
+    def _receive(self, proc=None):
+        block = []
+        for raw in (proc or self.proc).stdout:
+            line = raw.decode("utf-8").rstrip("\n")
+            if not line and block:
+                break
+            if line:
+                block.append(line)
+        else:
+            raise OCRError("OCR process exited before returning all results")
+        header = HEADER_PATTERN.match(block[0])
+        if not header:
+            raise OCRError(f"Unexpected OCR output: {block[0]}")
+        return _parse_results(header.group(1), block[1:])
+
+    def recognize(self, image_bytes, name):
+        self._send(name, image_bytes)
+        results = self._receive()
+        if isinstance(results, OCRError):
+            raise results
+        return results
+
+    def recognize_batch(self, items):
+        # a feeder thread keeps up to max_inflight images queued in the Swift
+        # process while results are read back here, in the same order. The
+        # whole batch uses the process it started with: if that one dies the
+        # batch fails, rather than the feeder starting another mid-batch
+        proc = self._start()
+        pending = queue.Queue(maxsize=self.max_inflight)
+        stop = threading.Event()
+
+        def put(item):
+            # gives up once the reader has stopped instead of blocking on a
+            # queue nobody drains
+            while not stop.is_set():
+                try:
+                    pending.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def feed():
+            try:
+                for name, image_bytes in items:
+                    if not put(name):
+                        return
+                    self._write(proc, name, image_bytes)
+                put(_DONE)
+            except Exception as e:
+                put(e)
+
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+        try:
+            while True:
+                name = pending.get()
+                if name is _DONE:
+                    break
+                if isinstance(name, Exception):
+                    raise name
+                yield name, self._receive(proc)
+        except BaseException:
+            # kill the Swift process so a feeder blocked writing to it fails fast
+            stop.set()
+            proc.kill()
+            self.close()
+            feeder.join(timeout=1)
+            raise
+        finally:
+            stop.set()
+
+    def close(self):
+        if self.proc is not None:
+            if self.proc.stdin and not self.proc.stdin.closed:
+                try:
+                    self.proc.stdin.close()
+                except OSError:
+                    pass
+            try:
+                self.proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+            self.proc = None
+
+class ReplayBackend(OCRBackend):
+    # serves results recorded in an ocr_results.txt (or its structured .jsonl /
+    # .ocrb form), so everything downstream of OCR runs (and can be
+    # benchmarked) without macOS Vision
+    def __init__(self, ocr_results_path):
+        self.path = ocr_results_path
+        self.engine_version = "replay"
+        if is_structured(ocr_results_path):
+            self.results = {
+                record["image"]: OCRError(f"OCR failed for {record['image']}: {record['error']}")
+                if record.get("error") else record_results(record)
+                for record in iter_structured_records(ocr_results_path)
+            }
+        else:
+            self.results = {name: _parse_results(name, body) for name, body in read_blocks(ocr_results_path).items()}
+
+    def names(self):
+        return list(self.results)
+
+    def recognize(self, image_bytes, name):
+        if name not in self.results:
+            raise OCRError(f"No recorded OCR result for {name}")
+        results = self.results[name]
+        if isinstance(results, OCRError):
+            raise results
+        return results
@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+from collections import deque
+from ocr_backends import OCRBackend, OCRError
+
+# On-disk OCR result cache keyed by the label image's bytes and the OCR engine
+# version, so re-runs and duplicate labels skip recognition entirely. Entries
+# are evicted least-recently-used once the cache grows past max_entries.
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "slide_ocr.sqlite3")
+DEFAULT_MAX_ENTRIES = 100_000
+
+def image_hash(image_bytes):
+    return hashlib.sha256(image_bytes).hexdigest()
+
+class OCRCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # the cache is shared with the OCR feeder thread, so guard the connection
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS ocr_results (
+                image_hash TEXT NOT NULL,
+                engine_version TEXT NOT NULL,
+                results TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (image_hash, engine_version)
+            );
+            CREATE INDEX IF NOT EXISTS ocr_results_last_used ON ocr_results (last_used);
+            CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        """)
+        self._count = self._db.execute("SELECT COUNT(*) FROM ocr_results").fetchone()[0]
+
+    def get(self, key, engine_version):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT results FROM ocr_results WHERE image_hash = ? AND engine_version = ?",
+                (key, engine_version)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute(
+                "UPDATE ocr_results SET last_used = ?, hits = hits + 1 WHERE image_hash = ? AND engine_version = ?",
+                (time.time(), key, engine_version))
+        return [tuple(line) for line in json.loads(row[0])]
+
+    def put(self, key, engine_version, results):
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO ocr_results (image_hash, engine_version, results, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, engine_version, json.dumps(results), now, now))
+            self._count += cursor.rowcount
+            if self._count > self.max_entries:
+                self._evict(self.max_entries)
+            self._db.commit()
+
+    def _evict(self, keep):
+        # drop the least recently used entries beyond `keep`
+        cursor = self._db.execute(
+            "DELETE FROM ocr_results WHERE rowid IN "
+            "(SELECT rowid FROM ocr_results ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (keep,))
+        self._count -= cursor.rowcount
+        return cursor.rowcount
+
+    def prune(self, max_entries=None, older_than_days=None, engine_version=None):
+        removed = 0
+        with self._lock:
+            if engine_version is not None:
+                cursor = self._db.execute("DELETE FROM ocr_results WHERE engine_version = ?", (engine_version,))
+                removed += cursor.rowcount
+                self._count -= cursor.rowcount
+            if older_than_days is not None:
+                cutoff = time.time() - older_than_days * 86400
+                cursor = self._db.execute("DELETE FROM ocr_results WHERE last_used < ?", (cutoff,))
+                removed += cursor.rowcount
+                self._count -= cursor.rowcount
+            if max_entries is not None:
+                removed += self._evict(max_entries)
+            self._db.commit()
+        return removed
+
+    def stats(self):
+        with self._lock:
+            totals = dict(self._db.execute("SELECT name, value FROM counters").fetchall())
+            engines = self._db.execute(
+                "SELECT engine_version, COUNT(*), SUM(hits), MIN(created), MAX(last_used) "
+                "FROM ocr_results GROUP BY engine_version ORDER BY engine_version").fetchall()
+        return {
+            "path": self.path,
+            "entries": self._count,
+            "max_entries": self.max_entries,
+            "size_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+            "session_hits": self.hits,
+            "session_misses": self.misses,
+            "total_hits": totals.get("hits", 0) + self.hits,
+            "total_misses": totals.get("misses", 0) + self.misses,
+            "engines": engines,
+        }
+
+    def close(self):
+        # fold this session's counters into the persistent totals
+        with self._lock:
+            for name, value in (("hits", self.hits), ("misses", self.misses)):
+                self._db.execute(
+                    "INSERT INTO counters (name, value) VALUES (?, ?) "
+                    "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value", (name, value))
+            self._db.commit()
+            self._db.close()
+        self.hits = self.misses = 0
+
+class CachedBackend(OCRBackend):
+    # wraps another backend; only images whose hash is not cached for that
+    # backend's engine version are sent to it
+    def __init__(self, backend, cache):
+        self.backend = backend
+        self.cache = cache
+        self.engine_version = backend.engine_version
+
+    def recognize(self, image_bytes, name):
+        key = image_hash(image_bytes)
+        results = self.cache.get(key, self.engine_version)
+        if results is None:
+            results = self.backend.recognize(image_bytes, name)
+            self.cache.put(key, self.engine_version, results)
+        return results
+
+    def recognize_batch(self, items):
+        # hits are answered from the cache, misses (and the first copy of any
+        # duplicate label) go to the wrapped backend; output keeps input order
+        order = deque()
+        inflight = set()
+
+        def misses():
+            for name, image_bytes in items:
+                key = image_hash(image_bytes)
+                if key in inflight:
+                    # duplicate of a label already on its way to the engine
+                    order.append((name, key, False))
+                    continue
+                results = self.cache.get(key, self.engine_version)
+                if results is not None:
+                    order.append((name, results, None))
+                    continue
+                inflight.add(key)
+                order.append((name, key, True))
+                yield name, image_bytes
+
+        def drain():
+            # yield everything queued ahead of the next result from the engine
+            while order and order[0][2] is not True:
+                name, value, _ = order.popleft()
+                if isinstance(value, str):
+                    value = self.cache.get(value, self.engine_version) or OCRError(f"OCR failed for {name}")
+                yield name, value
+
+        for name, results in self.backend.recognize_batch(misses()):
+            yield from drain()
+            _, key, _ = order.popleft()
+            if not isinstance(results, OCRError):
+                self.cache.put(key, self.engine_version, results)
+            inflight.discard(key)
+            yield name, results
+        yield from drain()
+
+    def close(self):
+        self.backend.close()
+        self.cache.close()
+
+def _print_stats(stats):
+    print(f"OCR cache: {stats['path']}")
+    print(f"Entries: {stats['entries']} / {stats['max_entries']} ({stats['size_bytes'] / 1e6:.1f} MB on disk)")
+    print(f"Hits: {stats['total_hits']}  Misses: {stats['total_misses']}")
+    for engine, count, hits, created, last_used in stats["engines"]:
+        print(f" - {engine}: {count} entries, {hits} hits, last used {time.strftime('%Y-%m-%d %H:%M', time.localtime(last_used))}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect and prune the persistent OCR result cache.")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help=f"Path to the cache database (default: {DEFAULT_CACHE_PATH})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="Show entry counts and hit/miss totals")
+    prune = commands.add_parser("prune", help="Remove cache entries")
+    prune.add_argument("--max-entries", type=int, help="Keep only the N most recently used entries")
+    prune.add_argument("--older-than", type=float, metavar="DAYS", help="Remove entries not used for this many days")
+    prune.add_argument("--engine", help="Remove entries recorded by this OCR engine version")
+    commands.add_parser("clear", help="Remove every entry")
+    args = parser.parse_args()
+
+    cache = OCRCache(args.cache)
+    if args.command == "stats":
+        _print_stats(cache.stats())
+    elif args.command == "prune":
+        removed = cache.prune(max_entries=args.max_entries, older_than_days=args.older_than, engine_version=args.engine)
+        print(f"Removed {removed} cache entries")
+    elif args.command == "clear":
+        print(f"Removed {cache.prune(max_entries=0)} cache entries")
+    cache.close()
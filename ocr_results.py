@@ -0,0 +1,124 @@
+import os
+import re
+import time
+from contextlib import contextmanager
+
+# Helpers for the ocr_results.txt format written by VisionOCRDemo:
+#
+#   --- slide_label.png ---
+#   [0.93] first line of text
+#   [0.41] second line
+#   <blank line>
+
+HEADER_PATTERN = re.compile(r"--- (.+?) ---")
+CONFIDENCE_LINE_PATTERN = re.compile(r"^\[\s*([0-9.]+)\s*\]\s*(.*)")
+NO_TEXT_LINES = {"No text found", "No text results found"}
+ERROR_PREFIX = "OCR Error:"
+
+def parse_ocr_line(stripped_line):
+    # split "[0.93] text" into its text and confidence (None if unscored);
+    # plain string ops, equivalent to CONFIDENCE_LINE_PATTERN but cheaper
+    if stripped_line.startswith("["):
+        end = stripped_line.find("]")
+        score = stripped_line[1:end].strip() if end > 0 else ""
+        if score and not score.strip("0123456789."):
+            try:
+                conf = float(score)
+            except ValueError:
+                conf = None
+            # Keep only the OCR result text (without confidence)
+            return stripped_line[end + 1:].lstrip(), conf
+    # Line without confidence score
+    return stripped_line, None
+
+def parse_block(body_lines):
+    # body of one result block -> list of (text, confidence) pairs; raises
+    # ValueError for blocks the OCR engine reported as failed
+    results = []
+    for line in body_lines:
+        stripped_line = line.strip()
+        if not stripped_line or stripped_line in NO_TEXT_LINES:
+            continue
+        if stripped_line.startswith(ERROR_PREFIX):
+            raise ValueError(stripped_line[len(ERROR_PREFIX):].strip())
+        results.append(parse_ocr_line(stripped_line))
+    return results
+
+def format_block(name, results):
+    # inverse of parse_block, in the same layout VisionOCRDemo writes
+    if not results:
+        return f"--- {name} ---\nNo text found\n\n"
+    lines = [f"[{conf:.2f}] {text}" if conf is not None else text for text, conf in results]
+    return f"--- {name} ---\n" + "\n".join(lines) + "\n\n"
+
+def _tail_lines(f, poll_interval, idle_timeout):
+    # like iterating over f, but keeps waiting for lines appended by a writer
+    # that is still running; stops once nothing new arrives for idle_timeout
+    partial = ""
+    last_data = time.monotonic()
+    while True:
+        line = f.readline()
+        if line:
+            last_data = time.monotonic()
+            partial += line
+            if partial.endswith("\n"):
+                yield partial
+                partial = ""
+            continue
+        if idle_timeout is not None and time.monotonic() - last_data >= idle_timeout:
+            if partial:
+                yield partial
+            return
+        time.sleep(poll_interval)
+
+def iter_blocks(f, follow=False, poll_interval=0.2, idle_timeout=None):
+    # yields (image name, [raw body lines]) one block at a time from an open
+    # text file or pipe. With follow=True the file is tailed while the OCR
+    # stage writes it, and each block is yielded at its terminating blank line.
+    lines = _tail_lines(f, poll_interval, idle_timeout) if follow else f
+    name, body = None, []
+    for line in lines:
+        stripped_line = line.strip()
+        if stripped_line.startswith("--- "):
+            match = HEADER_PATTERN.match(stripped_line)
+            if match:
+                if name is not None:
+                    yield name, body
+                name, body = match.group(1), []
+                continue
+        if not stripped_line:
+            if follow and name is not None:
+                yield name, body
+                name, body = None, []
+            continue
+        if name is not None:
+            body.append(stripped_line)
+    if name is not None:
+        yield name, body
+
+@contextmanager
+def _opened(source):
+    if isinstance(source, (str, bytes, os.PathLike)):
+        with open(source, "r", encoding="utf-8") as f:
+            yield f
+    else:
+        yield source
+
+def iter_ocr_records(source, follow=False, poll_interval=0.2, idle_timeout=None):
+    # streaming parser: yields one (file, lines, confidences) record per
+    # "--- name ---" block of an ocr_results.txt path, file handle or pipe,
+    # holding only the current block in memory
+    with _opened(source) as f:
+        for name, body in iter_blocks(f, follow, poll_interval, idle_timeout):
+            lines, confidences = [], []
+            for stripped_line in body:
+                text, conf = parse_ocr_line(stripped_line)
+                if conf is not None:
+                    confidences.append(conf)
+                lines.append(text)
+            yield name, lines, confidences
+
+def read_blocks(filepath):
+    # {image name: [raw body lines]} for every block in an ocr_results.txt
+    with _opened(filepath) as f:
+        return dict(iter_blocks(f))
@@ -0,0 +1,172 @@
+import json
+import math
+import struct
+import argparse
+from ocr_results import iter_blocks, parse_block
+
+# Structured OCR results, one record per label image:
+#
+#   {"image": "slide_label.png", "engine": "vision:...", "error": null,
+#    "observations": [{"text": "24-134 Lung", "confidence": 0.93,
+#                      "bbox": [x, y, w, h],
+#                      "candidates": [{"text": "24-134 Lung", "confidence": 0.93}, ...]}]}
+#
+# stored either as JSON Lines (.jsonl) or in a compact binary form (.ocrb).
+# bbox is Vision's normalized bounding box (origin bottom-left), or null when
+# the source didn't record one; confidence is null for unscored lines.
+
+BINARY_MAGIC = b"OCRB\x01"
+
+def observation(text, confidence, bbox=None, candidates=None):
+    return {"text": text, "confidence": confidence, "bbox": bbox,
+            "candidates": candidates if candidates is not None else [{"text": text, "confidence": confidence}]}
+
+def make_record(image, observations, engine=None, error=None):
+    return {"image": image, "engine": engine, "error": error, "observations": observations}
+
+def record_results(record):
+    # the (text, confidence) lines the rest of the pipeline works with
+    return [(obs["text"], obs["confidence"]) for obs in record["observations"]]
+
+def record_from_results(image, results, engine=None):
+    return make_record(image, [observation(text, conf) for text, conf in results], engine=engine)
+
+# --- JSON Lines -------------------------------------------------------------
+
+def write_jsonl_record(f, record):
+    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+def iter_jsonl_records(f):
+    for line in f:
+        if line.strip():
+            yield json.loads(line)
+
+# --- binary -----------------------------------------------------------------
+# magic, then per record:
+#   u32 name length, name | u16 engine length, engine | u16 error length, error
+#   u16 observation count
+#   per observation: u16 text length, text | f32 confidence (NaN = none)
+#                    u8 has bbox, [4 x f32 bbox] | u8 candidate count
+#                    per candidate: u16 text length, text | f32 confidence
+# all integers little-endian, strings UTF-8
+
+def _pack_str(value, size_fmt):
+    data = (value or "").encode("utf-8")
+    return struct.pack(size_fmt, len(data)) + data
+
+def _pack_conf(conf):
+    return struct.pack("<f", math.nan if conf is None else conf)
+
+def write_binary_record(f, record):
+    out = [_pack_str(record["image"], "<I"), _pack_str(record.get("engine"), "<H"),
+           _pack_str(record.get("error"), "<H"),
+           struct.pack("<H", len(record["observations"]))]
+    for obs in record["observations"]:
+        out += [_pack_str(obs["text"], "<H"), _pack_conf(obs["confidence"])]
+        if obs.get("bbox"):
+            out.append(struct.pack("<B4f", 1, *obs["bbox"]))
+        else:
+            out.append(b"\x00")
+        candidates = obs.get("candidates") or []
+        out.append(struct.pack("<B", len(candidates)))
+        for cand in candidates:
+            out += [_pack_str(cand["text"], "<H"), _pack_conf(cand["confidence"])]
+    f.write(b"".join(out))
+
+class _Reader:
+    def __init__(self, f):
+        self.f = f
+
+    def read(self, fmt):
+        size = struct.calcsize(fmt)
+        data = self.f.read(size)
+        if len(data) != size:
+            raise EOFError
+        return struct.unpack(fmt, data)
+
+    def string(self, size_fmt):
+        (length,) = self.read(size_fmt)
+        data = self.f.read(length)
+        if len(data) != length:
+            raise EOFError
+        return data.decode("utf-8")
+
+    def conf(self):
+        (value,) = self.read("<f")
+        return None if math.isnan(value) else round(value, 4)
+
+def iter_binary_records(f):
+    if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+        raise ValueError("Not a binary OCR results file")
+    reader = _Reader(f)
+    while True:
+        try:
+            image = reader.string("<I")
+        except EOFError:
+            return
+        try:
+            engine = reader.string("<H") or None
+            error = reader.string("<H") or None
+            observations = []
+            for _ in range(reader.read("<H")[0]):
+                text, conf = reader.string("<H"), reader.conf()
+                bbox = list(reader.read("<4f")) if reader.read("<B")[0] else None
+                candidates = [{"text": reader.string("<H"), "confidence": reader.conf()}
+                              for _ in range(reader.read("<B")[0])]
+                observations.append(observation(text, conf, bbox, candidates))
+        except EOFError:
+            raise ValueError(f"Truncated binary OCR record for {image}")
+        yield make_record(image, observations, engine=engine, error=error)
+
+# --- files ------------------------------------------------------------------
+
+def is_structured(path):
+    return path.endswith((".jsonl", ".ocrb"))
+
+def iter_structured_records(path):
+    if path.endswith(".ocrb"):
+        with open(path, "rb") as f:
+            yield from iter_binary_records(f)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            yield from iter_jsonl_records(f)
+
+def write_structured_records(path, records):
+    if path.endswith(".ocrb"):
+        with open(path, "wb") as f:
+            f.write(BINARY_MAGIC)
+            for record in records:
+                write_binary_record(f, record)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            for record in records:
+                write_jsonl_record(f, record)
+
+def legacy_records(txt_path):
+    # ocr_results.txt blocks as structured records (no boxes or alternatives)
+    with open(txt_path, "r", encoding="utf-8") as f:
+        for name, body in iter_blocks(f):
+            try:
+                yield record_from_results(name, parse_block(body))
+            except ValueError as e:
+                yield make_record(name, [], error=str(e))
+
+def convert_legacy(txt_path, out_path):
+    count = 0
+    def counted():
+        nonlocal count
+        for record in legacy_records(txt_path):
+            count += 1
+            yield record
+    write_structured_records(out_path, counted())
+    return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a legacy ocr_results.txt into structured OCR results.")
+    parser.add_argument("ocr_txt", help="Path to the legacy ocr_results.txt")
+    parser.add_argument("output", help="Output path: .jsonl for JSON Lines, .ocrb for the compact binary format")
+    args = parser.parse_args()
+
+    if not is_structured(args.output):
+        parser.error("output must end in .jsonl or .ocrb")
+    print(f"Converted {convert_legacy(args.ocr_txt, args.output)} record(s) to {args.output}")
@@ -1,35 +1,180 @@
 import os
+import json
+import time
+import shutil
+import hashlib
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 import openslide
+from mirax_label import MiraxError, decode_label, read_label_image, read_label_record, slide_data_dir
 
-def extract_labels(input_dir, output_dir):
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "slide_labels")
+MANIFEST_NAME = "label_manifest.json"
+
+def label_filename(mrxs_filename):
+    return os.path.splitext(mrxs_filename)[0] + '_label.png'
+
+def slide_cache_key(mrxs_path, label_bytes=None):
+    # key on the slide's path, size and mtime plus a hash of the label bytes
+    # stored in its data files, so a rewritten label invalidates the entry
+    stat = os.stat(mrxs_path)
+    try:
+        if label_bytes is None:
+            label_bytes = read_label_record(mrxs_path)
+        label_digest = hashlib.sha256(label_bytes).hexdigest() if label_bytes else None
+    except MiraxError:
+        # fall back to the slide's small index files if the label can't be located
+        digest = hashlib.sha256()
+        for name in ("Slidedat.ini", "Index.dat"):
+            try:
+                with open(os.path.join(slide_data_dir(mrxs_path), name), "rb") as f:
+                    digest.update(f.read())
+            except OSError:
+                pass
+        label_digest = digest.hexdigest()
+    key = json.dumps([os.path.abspath(mrxs_path), stat.st_size, stat.st_mtime_ns, label_digest])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+def _cache_paths(cache_dir, key):
+    folder = os.path.join(cache_dir, key[:2])
+    return os.path.join(folder, key + ".png"), os.path.join(folder, key + ".missing")
+
+def _store_in_cache(cache_dir, key, out_path):
+    cached_png, _ = _cache_paths(cache_dir, key)
+    os.makedirs(os.path.dirname(cached_png), exist_ok=True)
+    tmp_path = cached_png + f".{os.getpid()}.tmp"
+    shutil.copyfile(out_path, tmp_path)
+    os.replace(tmp_path, cached_png)
+
+def load_label(mrxs_path, fast=True):
+    # label as a PIL image (None if the slide has none), without writing it out
+    if fast:
+        try:
+            return read_label_image(mrxs_path)
+        except MiraxError:
+            pass
+    slide = openslide.OpenSlide(mrxs_path)
+    return slide.associated_images['label'] if 'label' in slide.associated_images else None
+
+def extract_label(mrxs_path, output_dir, cache_dir=None, previous=None, fast=True):
+    # extract a single slide's label; returns a status message plus a manifest
+    # entry so workers in the process pool can report back to the parent
+    filename = os.path.basename(mrxs_path)
+    out_name = label_filename(filename)
+    out_path = os.path.join(output_dir, out_name)
+    entry = {"label": None, "key": None}
+    try:
+        # read the label record straight from the data files when possible;
+        # anything the direct reader doesn't understand goes through openslide
+        located, label_bytes = False, None
+        if fast or cache_dir:
+            try:
+                label_bytes = read_label_record(mrxs_path)
+                located = True
+            except MiraxError:
+                pass
+
+        if cache_dir:
+            key = entry["key"] = slide_cache_key(mrxs_path, label_bytes)
+            cached_png, missing_marker = _cache_paths(cache_dir, key)
+            if previous and previous.get("key") == key and os.path.exists(out_path):
+                entry.update(label=out_name, status="unchanged")
+                return f"Skipped unchanged slide {filename}", entry
+            if os.path.exists(cached_png):
+                shutil.copyfile(cached_png, out_path)
+                entry.update(label=out_name, status="cached")
+                return f"Restored cached label image for {filename} to {out_path}", entry
+            if os.path.exists(missing_marker):
+                entry["status"] = "missing"
+                return f"No label image found in {filename}", entry
+
+        label_img = None
+        if fast and located and label_bytes is not None:
+            try:
+                label_img = decode_label(label_bytes)
+            except MiraxError:
+                located = False
+        if not (fast and located):
+            slide = openslide.OpenSlide(mrxs_path)
+            label_img = slide.associated_images['label'] if 'label' in slide.associated_images else None
+
+        if label_img is not None:
+            label_img.save(out_path)
+            if cache_dir:
+                _store_in_cache(cache_dir, entry["key"], out_path)
+            entry.update(label=out_name, status="extracted")
+            return f"Saved label image for {filename} to {out_path}", entry
+        else:
+            if cache_dir:
+                missing_marker = _cache_paths(cache_dir, entry["key"])[1]
+                os.makedirs(os.path.dirname(missing_marker), exist_ok=True)
+                open(missing_marker, "w").close()
+            entry["status"] = "missing"
+            return f"No label image found in {filename}", entry
+    except Exception as e:
+        entry.update(status="failed", error=str(e))
+        return f"Failed to process {filename}: {e}", entry
+
+def load_manifest(output_dir):
+    # manifest written by extract_labels; maps .mrxs file name -> entry with
+    # "label" (png name or None), "status" and "key"
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)["slides"]
+    except (OSError, ValueError, KeyError):
+        return {}
+
+def write_manifest(output_dir, input_dir, slides):
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"input_dir": os.path.abspath(input_dir), "slides": slides}, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+def extract_labels(input_dir, output_dir, workers=1, cache_dir=DEFAULT_CACHE_DIR, fast=True):
     os.makedirs(output_dir, exist_ok=True)
     mrxs_files = [f for f in os.listdir(input_dir) if f.lower().endswith('.mrxs')]
 
     if not mrxs_files:
         print("No .mrxs files found in the folder.")
-        return
+        return {}
 
-    for filename in mrxs_files:
-        mrxs_path = os.path.join(input_dir, filename)
-        try:
-            slide = openslide.OpenSlide(mrxs_path)
-            if 'label' in slide.associated_images:
-                label_img = slide.associated_images['label']
-                out_path = os.path.join(
-                    output_dir, os.path.splitext(filename)[0] + '_label.png'
-                )
-                label_img.save(out_path)
-                print(f"Saved label image for {filename} to {out_path}")
-            else:
-                print(f"No label image found in {filename}")
-        except Exception as e:
-            print(f"Failed to process {filename}: {e}")
+    mrxs_paths = [os.path.join(input_dir, f) for f in mrxs_files]
+    previous = load_manifest(output_dir) if cache_dir else {}
+    jobs = (mrxs_paths, [output_dir] * len(mrxs_paths), [cache_dir] * len(mrxs_paths),
+            [previous.get(f) for f in mrxs_files], [fast] * len(mrxs_paths))
+    slides = {}
+    start = time.perf_counter()
+
+    if workers > 1:
+        # spread slides across a process pool; results come back in input order
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(extract_label, *jobs)
+            for filename, (message, entry) in zip(mrxs_files, results):
+                print(message)
+                slides[filename] = entry
+    else:
+        for filename, *args in zip(mrxs_files, *jobs):
+            message, entry = extract_label(*args)
+            print(message)
+            slides[filename] = entry
+
+    write_manifest(output_dir, input_dir, slides)
+    elapsed = time.perf_counter() - start
+    rate = len(mrxs_paths) / elapsed if elapsed > 0 else float("inf")
+    reused = sum(entry["status"] in ("cached", "unchanged") for entry in slides.values())
+    print(f"Processed {len(mrxs_paths)} slide(s) in {elapsed:.2f}s ({rate:.1f} slides/sec, {reused} reused from cache)")
+    return slides
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Extract label images from MRXS files in a folder.")
     parser.add_argument("input_dir", help="Path to folder containing .mrxs files")
     parser.add_argument("output_dir", help="Path to folder where PNG label images will be saved")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes used to extract labels (default: 1)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help=f"Persistent label cache folder (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--no-cache", action="store_true", help="Re-extract every label and do not touch the cache")
+    parser.add_argument("--openslide", action="store_true", help="Always open slides with openslide instead of reading the label record directly")
     args = parser.parse_args()
 
-    extract_labels(args.input_dir, args.output_dir)
+    extract_labels(args.input_dir, args.output_dir, workers=args.workers,
+                   cache_dir=None if args.no_cache else args.cache_dir, fast=not args.openslide)
@@ -0,0 +1,259 @@
+import io
+import os
+import queue
+import argparse
+import contextlib
+import time
+import threading
+from collections import deque
+from datetime import datetime
+import postprocess_with_confidence_final as postprocess
+from instrumentation import DISABLED, Instrumentation
+from label_preprocess import TEXT_HEIGHT, label_preprocessor, to_png
+from name_extraction import DEFAULT_RULES_PATH, load_extractor
+from ocr_backends import OCRError, ReplayBackend, VisionSubprocessBackend
+from ocr_cache import DEFAULT_CACHE_PATH, CachedBackend, OCRCache
+from ocr_results import format_block
+from ocr_structured import record_from_results, write_jsonl_record
+from open_label_images import label_filename, load_label
+from run_log import RunLog
+from study_index import DEFAULT_INDEX_PATH, StudyIndex
+from two_pass_ocr import MIN_LINE_CONFIDENCE, TwoPassBackend, vision_two_pass
+
+# Streams every slide through extract -> OCR -> parse -> name in one process.
+# Each stage runs in its own thread and hands work to the next through a
+# bounded queue, so the first names come out while later slides are still
+# being read, and label images never touch the disk.
+
+QUEUE_SIZE = 8
+_DONE = object()
+_NO_LIMIT = contextlib.nullcontext()
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    return _DONE
+
+def _put(q, item, stop):
+    # blocking put that gives up once the consumer has gone away
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            pass
+
+def _extract_stage(mrxs_folder, filenames, out_q, stop, instrumentation=DISABLED, label_slots=None, preprocess=None):
+    try:
+        for filename in filenames:
+            if stop.is_set():
+                return
+            with label_slots or _NO_LIMIT, instrumentation.stage("label_read", filename) as stage:
+                start = time.perf_counter()
+                try:
+                    label_img = load_label(os.path.join(mrxs_folder, filename))
+                except Exception as e:
+                    label_img, message = None, f"Failed to process {filename}: {e}"
+                else:
+                    message = f"No label image found in {filename}"
+                if label_img is not None:
+                    png = io.BytesIO()
+                    label_img.save(png, "PNG")
+                    stage.bytes = png.tell()
+            if label_img is None:
+                _put(out_q, (filename, None, None, message, 0, 0), stop)
+                continue
+            label_seconds = time.perf_counter() - start
+            # OCR gets the preprocessed label; the original goes to the sheet
+            ocr_png = png = png.getvalue()
+            message = None
+            if preprocess:
+                with instrumentation.stage("preprocess", filename) as stage:
+                    try:
+                        ocr_png = to_png(preprocess(label_img))
+                    except Exception as e:
+                        # one odd label shouldn't stop the folder; OCR reads it as scanned
+                        message = f"Failed to preprocess the label of {filename}, using the original: {e}"
+                    stage.bytes = len(ocr_png)
+            _put(out_q, (filename, png, ocr_png, message, label_seconds, time.perf_counter() - start - label_seconds), stop)
+    except Exception as e:
+        _put(out_q, _Failure(e), stop)
+    finally:
+        _put(out_q, _DONE, stop)
+
+def name_slide(filename, png, results, extractor):
+    # turn one slide's OCR results into a naming record
+    texts = [text for text, _ in results]
+    study_id, cleaned_name, corrections = extractor.extract_corrected(texts, [conf for _, conf in results])
+    return {
+        "Original File Name": filename,
+        "Label Image": label_filename(filename),
+        "New File Name": cleaned_name + ".mrxs",
+        "Confidence": postprocess.average_confidence([conf for _, conf in results if conf is not None]),
+        "Study ID": study_id,
+        "Corrections": corrections,
+        "OCR Results": results,
+        "Label Data": png,
+    }
+
+def stream_slides(mrxs_folder, ocr_backend, queue_size=QUEUE_SIZE, on_skip=print, extractor=None,
+                  instrumentation=DISABLED, label_slots=None, preprocess=None, on_warning=print):
+    # generator of naming records, one per labelled slide, in folder order;
+    # each carries its per-stage "Timings" in milliseconds (label read, time
+    # from handing the label to OCR until its results arrived, naming).
+    # label_slots: semaphore shared by concurrent runs to cap slide reads;
+    # preprocess: label image -> image sent to OCR (see label_preprocess);
+    # on_warning gets the labels it failed on, which go to OCR unprocessed
+    extractor = extractor or load_extractor()
+    filenames = sorted(f for f in os.listdir(mrxs_folder) if f.lower().endswith('.mrxs'))
+    labels_q = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    label_thread = threading.Thread(target=_extract_stage,
+                                    args=(mrxs_folder, filenames, labels_q, stop, instrumentation, label_slots, preprocess),
+                                    daemon=True)
+    label_thread.start()
+
+    # slides handed to the OCR backend, waiting for their results (in order)
+    sent = deque()
+
+    def labelled():
+        while True:
+            item = _get(labels_q, stop)
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            filename, png, ocr_png, message, label_seconds, preprocess_seconds = item
+            if png is None:
+                on_skip(message)
+                continue
+            if message:
+                on_warning(message)
+            sent.append((filename, png, len(ocr_png), label_seconds, preprocess_seconds, time.perf_counter()))
+            yield label_filename(filename), ocr_png
+
+    try:
+        for _, results in ocr_backend.recognize_batch(labelled()):
+            filename, png, ocr_bytes, label_seconds, preprocess_seconds, sent_at = sent.popleft()
+            received = time.perf_counter()
+            # OCR runs in the Swift process; only its round trip is visible here
+            instrumentation.add("ocr", received - sent_at, nbytes=ocr_bytes, slide=filename)
+            if isinstance(results, OCRError):
+                on_skip(f"Failed to read label of {filename}: {results}")
+                continue
+            with instrumentation.stage("name", filename):
+                record = name_slide(filename, png, results, extractor)
+            record["Timings"] = {
+                "label_ms": round(label_seconds * 1000, 2),
+                "ocr_ms": round((received - sent_at) * 1000, 2),
+                "name_ms": round((time.perf_counter() - received) * 1000, 2),
+            }
+            if preprocess:
+                record["Timings"]["preprocess_ms"] = round(preprocess_seconds * 1000, 2)
+            yield record
+    finally:
+        stop.set()
+        label_thread.join(timeout=1)
+
+def run_pipeline(mrxs_folder, output_folder, ocr_backend, queue_size=QUEUE_SIZE, extractor=None, thumb_format="png",
+                 run_log=None, instrumentation=DISABLED, study_index=None, label_slots=None, preprocess=None,
+                 cache_stats=True):
+    # cache_stats=False leaves the OCR cache's hits and misses out of the log
+    # (batch_pipeline shares one cache between concurrent folders, so its
+    # counts aren't this run's)
+    os.makedirs(output_folder, exist_ok=True)
+    if run_log is None:
+        with RunLog(output_folder) as run_log:
+            return run_pipeline(mrxs_folder, output_folder, ocr_backend, queue_size, extractor, thumb_format, run_log,
+                                instrumentation, study_index, label_slots, preprocess, cache_stats)
+    run_log.event("pipeline_start", mrxs_folder=mrxs_folder, backend=ocr_backend.engine_version, output_folder=output_folder)
+    extractor = extractor or load_extractor()
+
+    named = 0
+    # (slide key, slide, study ID, new name) per slide for the study ID index
+    slides = []
+    with open(os.path.join(output_folder, "ocr_results.txt"), "w", encoding="utf-8") as ocr_txt, \
+         open(os.path.join(output_folder, "ocr_results.jsonl"), "w", encoding="utf-8") as ocr_jsonl:
+        def logged_records():
+            nonlocal named
+            for record in stream_slides(mrxs_folder, ocr_backend, queue_size=queue_size,
+                                        on_skip=lambda message: run_log.event("skipped", message=message),
+                                        extractor=extractor, instrumentation=instrumentation, label_slots=label_slots,
+                                        preprocess=preprocess,
+                                        on_warning=lambda message: run_log.event("preprocess_error", message=message)):
+                with instrumentation.stage("write_results", record["Original File Name"]):
+                    # keep writing the legacy text dump next to the structured one so
+                    # the results can be replayed later
+                    ocr_txt.write(format_block(record["Label Image"], record["OCR Results"]))
+                    write_jsonl_record(ocr_jsonl, record_from_results(record["Label Image"], record["OCR Results"], ocr_backend.engine_version))
+                    ocr_txt.flush()
+                    ocr_jsonl.flush()
+                    postprocess.log_slide(run_log, record, [conf for _, conf in record["OCR Results"]], record["Timings"])
+                slides.append((postprocess.slide_key(mrxs_folder, record["Original File Name"], record["Label Data"]),
+                               record["Original File Name"], record["Study ID"], record["New File Name"]))
+                named += 1
+                yield record
+
+        # rows go into the workbook as slides are named; only the few fields
+        # the study ID index needs are kept per slide
+        flags = postprocess.study_id_flags(study_index, mrxs_folder, slides, run_log) if study_index else None
+        postprocess.export_excel_with_images(logged_records(), None, output_folder, thumb_format=thumb_format, run_log=run_log,
+                                             instrumentation=instrumentation, flags=flags,
+                                             corrections=extractor.vocabulary is not None)
+
+    if isinstance(ocr_backend, TwoPassBackend):
+        run_log.event("two_pass", summary=ocr_backend.summary(), **ocr_backend.stats())
+    if cache_stats and getattr(ocr_backend, "cache", None):
+        run_log.event("ocr_cache", hits=ocr_backend.cache.hits, misses=ocr_backend.cache.misses)
+    instrumentation.write_summary(output_folder, run_log, slides=named)
+    return named
+
+def default_output_folder(mrxs_folder):
+    return os.path.join(mrxs_folder, f"outputs_{datetime.now():%m.%d.%Y_%H-%M}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract, OCR and name every slide in a folder in a single streaming pass.")
+    parser.add_argument("folder", help="Path to folder containing .mrxs files")
+    ocr_source = parser.add_mutually_exclusive_group(required=True)
+    ocr_source.add_argument("--ocr-binary", help="Path to the compiled VisionOCRDemo binary")
+    ocr_source.add_argument("--replay", help="Path to recorded OCR results (ocr_results.txt, .jsonl or .ocrb) to replay instead of running OCR")
+    parser.add_argument("-o", help="Path to store output files (default: timestamped outputs_ subfolder)")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE, help="Maximum slides buffered between stages")
+    parser.add_argument("--ocr-cache", default=DEFAULT_CACHE_PATH, help=f"Persistent OCR result cache (default: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--no-ocr-cache", action="store_true", help="Run OCR on every label without consulting the cache")
+    parser.add_argument("--rules", default=DEFAULT_RULES_PATH, help=f"Name extraction rules file (default: {DEFAULT_RULES_PATH})")
+    parser.add_argument("--thumb-format", choices=postprocess.THUMB_FORMATS, default="png", help="Encoding of the Excel label thumbnails (default: png)")
+    parser.add_argument("--profile", action="store_true", help="Record per-stage, per-slide timings and write run_summary.json to the output folder")
+    parser.add_argument("--study-index", default=DEFAULT_INDEX_PATH, help=f"Persistent study ID index for outlier and near-duplicate flags (default: {DEFAULT_INDEX_PATH})")
+    parser.add_argument("--no-study-index", action="store_true", help="Don't index study IDs or flag outliers")
+    parser.add_argument("--two-pass", action="store_true", help="Read every label with Vision's fast level and re-read only doubtful ones accurately (needs --ocr-binary)")
+    parser.add_argument("--two-pass-confidence", type=float, default=MIN_LINE_CONFIDENCE, help=f"Line confidence under which --two-pass re-reads a label (default: {MIN_LINE_CONFIDENCE})")
+    parser.add_argument("--preprocess", action="store_true", help="Deskew, crop, downscale and binarize each label before OCR")
+    parser.add_argument("--text-height", type=int, default=TEXT_HEIGHT, help=f"Text line height labels are downscaled to with --preprocess (default: {TEXT_HEIGHT})")
+    args = parser.parse_args()
+
+    extractor = load_extractor(args.rules)
+    output_folder = args.o or default_output_folder(args.folder)
+    if args.two_pass and not args.ocr_binary:
+        parser.error("--two-pass needs --ocr-binary")
+    if args.replay:
+        ocr_backend = ReplayBackend(args.replay)
+    elif args.two_pass:
+        ocr_backend = vision_two_pass(args.ocr_binary, None if args.no_ocr_cache else OCRCache(args.ocr_cache),
+                                      args.queue_size, extractor, args.two_pass_confidence)
+    else:
+        ocr_backend = VisionSubprocessBackend(args.ocr_binary, max_inflight=args.queue_size)
+        if not args.no_ocr_cache:
+            ocr_backend = CachedBackend(ocr_backend, OCRCache(args.ocr_cache))
+    with ocr_backend:
+        run_pipeline(args.folder, output_folder, ocr_backend, queue_size=args.queue_size, extractor=extractor,
+                     thumb_format=args.thumb_format, instrumentation=Instrumentation(enabled=args.profile),
+                     study_index=None if args.no_study_index else StudyIndex(args.study_index),
+                     preprocess=label_preprocessor(args.text_height) if args.preprocess else None)
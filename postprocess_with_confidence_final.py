@@ -1,160 +1,347 @@
 
+import io
 import os
-import re
+import time
 import argparse
-from collections import defaultdict
+import tempfile
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font
 from openpyxl.drawing.image import Image as XLImage
 from PIL import Image as PILImage
+from instrumentation import DISABLED, Instrumentation
+from name_extraction import DEFAULT_RULES_PATH, load_extractor
+from ocr_backends import OCRError, ReplayBackend, VisionSubprocessBackend
+from ocr_cache import DEFAULT_CACHE_PATH, CachedBackend, OCRCache, image_hash
+from ocr_results import iter_ocr_records
+from ocr_structured import is_structured, iter_structured_records
+from run_log import RunLog
+from study_index import DEFAULT_INDEX_PATH, StudyIndex
 
-def log(message):
-    print(message)
-    with open(LOG_PATH, "a", encoding="utf-8") as f:
-        f.write(message + "\n")
+THUMB_SIZE = (200, 200)
+# png: lossless, jpeg: smallest for photographic labels, png8: 64-color palette PNG
+THUMB_FORMATS = ("png", "jpeg", "png8")
+# average confidence under which a name is shown in red for review
+LOW_CONFIDENCE = 0.6
+FLAGS_SHEET = "Study ID Flags"
 
 def parse_ocr_file(filepath):
-    with open(filepath, "r", encoding="utf-8") as f:
-        lines = f.read().splitlines()
-
     grouped = defaultdict(list)
     confidences = defaultdict(list)
-    current_file = None
-    header_pattern = re.compile(r"--- (.+?) ---")
-    confidence_line_pattern = re.compile(r"^\[\s*([0-9.]+)\s*\]\s*(.*)")
-
-    for line in lines:
-        stripped_line = line.strip()
-        match = header_pattern.match(stripped_line)
-        if match:
-            current_file = match.group(1).replace(".png", "")
-            grouped[current_file] = []
-        elif current_file and stripped_line:
-            conf_match = confidence_line_pattern.match(stripped_line)
-            if conf_match:
-                # Extract and store confidence
-                try:
-                    conf = float(conf_match.group(1))
-                    confidences[current_file].append(conf)
-                except ValueError:
-                    pass
-                # Add only the OCR result text (without confidence) to grouped
-                grouped[current_file].append(conf_match.group(2))
-            else:
-                # Line without confidence score
-                grouped[current_file].append(stripped_line)
-   
+
+    # structured results (.jsonl / .ocrb) need no per-line text parsing
+    if is_structured(filepath):
+        records = ((record["image"], [obs["text"] for obs in record["observations"]],
+                    [obs["confidence"] for obs in record["observations"] if obs["confidence"] is not None])
+                   for record in iter_structured_records(filepath))
+    else:
+        records = iter_ocr_records(filepath)
+
+    for name, lines, confs in records:
+        current_file = name.replace(".png", "")
+        grouped[current_file] = lines
+        confidences[current_file] = confs
+
     return grouped, confidences
 
-def extract_study_id_and_clean(lines):
-    # identify study ID & noise terms like date/time/company to delete
-    study_id_pattern = re.compile(r"\b\d{2}-\d{3}\b")
-    date_pattern = re.compile(r"\d{1,2}/\d{1,2}/\d{2,4}")
-    time_pattern = re.compile(r"\d{1,2}:\d{2} ?(AM|PM)?", re.IGNORECASE)
-    noise_terms = {"glintlab"}
-
-    study_id = None
-    filename_tokens = []
-    
-    # create filename with desired tokens
-    for line in lines:
-        if date_pattern.search(line) or time_pattern.search(line):
-            continue
+def average_confidence(confidences):
+    return round(sum(confidences) / len(confidences), 3) if confidences else 0
 
-        words = line.strip().split()
-        # filter punctuation
-        for word in words:
-            cleaned = word.strip(".,;:*+").replace("/", "-")
-            if not cleaned or cleaned.lower() in noise_terms:
-                continue
+def extract_study_id_and_clean(lines, extractor=None):
+    # identify study ID & noise terms like date/time/company to delete.
+    # Callers naming many slides resolve the extractor once and pass it in;
+    # without one, load_extractor's cache (kept until name_rules.toml
+    # changes) is asked on every call
+    return (extractor or load_extractor()).extract(lines)
 
-            if study_id is None and study_id_pattern.match(cleaned):
-                study_id = cleaned
+def make_thumbnail(label, thumb_format="png", jpeg_quality=80):
+    # label PNG (bytes or path) -> encoded thumbnail bytes, or None if missing
+    if isinstance(label, str):
+        if not os.path.exists(label):
+            return None
+        with open(label, "rb") as f:
+            label = f.read()
+    thumb = io.BytesIO()
+    with PILImage.open(io.BytesIO(label)) as img:
+        img.thumbnail(THUMB_SIZE)
+        if thumb_format == "jpeg":
+            if img.mode in ("RGBA", "LA", "P"):
+                img = img.convert("RGBA")
+                background = PILImage.new("RGB", img.size, "white")
+                background.paste(img, mask=img.getchannel("A"))
+                img = background
+            img.convert("RGB").save(thumb, "JPEG", quality=jpeg_quality, optimize=True)
+        elif thumb_format == "png8":
+            img.convert("RGB").quantize(colors=64).save(thumb, "PNG", optimize=True)
+        else:
+            img.save(thumb, "PNG")
+    return thumb.getvalue()
 
-            filename_tokens.append(cleaned)
-            # study ID is almost always before a company name
-            # this part ensures the next term after a study ID is not taken
-            if study_id_pattern.match(cleaned):
-                break  # stop further tokens from this line
+def _measured_thumbnail(instrumentation, slide, label, thumb_format):
+    with instrumentation.stage("thumbnail", slide) as stage:
+        thumb = make_thumbnail(label, thumb_format)
+        stage.bytes = len(thumb) if thumb else 0
+    return thumb
 
-    filename = "_".join(filename_tokens)
-    return study_id, filename
+def iter_thumbnails(records, label_folder, thumb_format="png", workers=None, instrumentation=DISABLED):
+    # yields (record, thumbnail bytes or None) in record order, encoding
+    # thumbnails on a thread pool (PIL releases the GIL while decoding,
+    # resizing and encoding) with a bounded number in flight
+    workers = workers or min(8, os.cpu_count() or 1)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for record in records:
+            # records from the streaming pipeline carry the label PNG in memory
+            label = record.get("Label Data") or os.path.join(label_folder or "", record["Label Image"])
+            pending.append((record, pool.submit(_measured_thumbnail, instrumentation, record["Original File Name"],
+                                                label, thumb_format)))
+            if len(pending) > 2 * workers:
+                record, future = pending.popleft()
+                yield record, future.result()
+        while pending:
+            record, future = pending.popleft()
+            yield record, future.result()
 
-def export_excel_with_images(records, label_folder, output_folder, output_path="file_renaming_excel.xlsx", threshold=0.6):
-    from openpyxl import Workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "OCR Mapping"
+class _SpoolSlice:
+    # read-only file view of one thumbnail inside the shared spool file, so
+    # openpyxl only pulls image bytes back into memory while saving
+    def __init__(self, spool, offset, length):
+        self.spool = spool
+        self.offset = offset
+        self.length = length
+        self.pos = 0
 
-    headers = ["Label Image", "Avg Confidence", "Original File Name", "New File Name"]
-    ws.append(headers)
-    for col in range(1, len(headers) + 1):
-        ws.cell(row=1, column=col).font = Font(bold=True, size=12)
-
-    for i, record in enumerate(records, start=2):
-        label_img_path = os.path.join(label_folder, record["Label Image"])
-        # create thumbnail image of size 200x200 to map into excel sheet
-        if os.path.exists(label_img_path):
-            thumb_path = f"{label_img_path}_thumb.png"
-            with PILImage.open(label_img_path) as img:
-                img.thumbnail((200, 200))
-                img .save(thumb_path)
-            img_for_excel = XLImage(thumb_path)
-            img_for_excel.anchor = f"A{i}"
-            ws.add_image(img_for_excel)
-        # else log that label image path was not found
-        else:
-            log(f"\n 🚨 Label Image Not Found For: {label_img_path}")
-        # add confidence scores, scores < threshold to be red & bolded
-        conf_cell = ws.cell(row=i, column=2, value=record["Confidence"])
-        if record["Confidence"] < threshold:
-            conf_cell.font = Font(color="FF0000", bold=True)
+    def read(self, size=-1):
+        remaining = self.length - self.pos
+        size = remaining if size is None or size < 0 else min(size, remaining)
+        self.spool.seek(self.offset + self.pos)
+        data = self.spool.read(size)
+        self.pos += len(data)
+        return data
+
+    def seek(self, pos, whence=0):
+        base = {0: 0, 1: self.pos, 2: self.length}[whence]
+        self.pos = max(0, base + pos)
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def close(self):
+        pass
+
+def log_slide(run_log, record, confidences=(), timings=None):
+    # one structured record per named slide; "review" names are the ones
+    # shown in red in the Excel sheet
+    run_log.event("slide", slide=record["Original File Name"], new_name=record["New File Name"],
+                  study_id=record.get("Study ID"), confidence=record["Confidence"], confidences=list(confidences),
+                  decision="review" if record["Confidence"] < LOW_CONFIDENCE else "named", timings=timings or {})
+    for word, term, category, distance, confidence in record.get("Corrections", ()):
+        run_log.event("correction", slide=record["Original File Name"], word=word, term=term, category=category,
+                      distance=distance, confidence=confidence)
 
-        ws.cell(row=i, column=3, value=record["Original File Name"])
-        ws.cell(row=i, column=4, value=record["New File Name"])
-        ws.row_dimensions[i].height = 120
+def describe_corrections(corrections):
+    # Excel cell text for a record's vocabulary corrections
+    return "; ".join(f"{word} → {term} (distance {distance}, confidence {confidence})"
+                     for word, term, _, distance, confidence in corrections)
 
-    for col in ["A", "B", "C", "D"]:
+def slide_key(folder, slide, label_data=None):
+    # identifies a physical slide in the study ID index; the label's hash
+    # survives renaming and moving the slide
+    return image_hash(label_data) if label_data else os.path.join(os.path.abspath(folder), slide)
+
+def study_id_flags(study_index, folder, slides, run_log, logged=None):
+    # the export's flags callback: once every row is written, adds this run's
+    # slides ([(slide_key, slide, study_id, new_name)]) to the index and
+    # checks their study IDs against every indexed run. logged: set of
+    # (slide, flag) already in the log, for exports that are rewritten
+    def flags():
+        folder_path = os.path.abspath(folder)
+        study_index.update([(key, folder_path, slide, study_id, new_name) for key, slide, study_id, new_name in slides])
+        rows = study_index.flags([(slide, study_id) for _, slide, study_id, _ in slides])
+        for slide, study_id, flag, details in rows:
+            if logged is not None:
+                if (slide, flag) in logged:
+                    continue
+                logged.add((slide, flag))
+            run_log.event("study_id_flag", slide=slide, study_id=study_id, flag=flag, details=details)
+        run_log.event("study_index", flagged=len(rows), **study_index.stats())
+        return rows
+    return flags
+
+def _styled(ws, value, font):
+    cell = WriteOnlyCell(ws, value=value)
+    cell.font = font
+    return cell
+
+def export_excel_with_images(records, label_folder, output_folder, output_path="file_renaming_excel.xlsx", threshold=LOW_CONFIDENCE,
+                             thumb_format="png", workers=None, run_log=None, instrumentation=DISABLED, flags=None,
+                             corrections=False):
+    # streams rows into a write-only workbook as records arrive (records may
+    # be a generator), so memory stays flat however many slides there are.
+    # flags() is called after the last row and returns (slide, study ID,
+    # flag, details) rows for a second sheet; each mapping row looks its
+    # flags up from there, since they are only known once every slide is in.
+    # corrections adds a column listing each record's vocabulary corrections
+    run_log = run_log or RunLog()
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("OCR Mapping")
+    # write-only sheets need column widths before the first row
+    for col in ["A", "B", "C", "D", "E", "F"]:
         ws.column_dimensions[col].width = 35
 
-    path = os.path.join(output_folder, output_path)
-    wb.save(path)
-    log(f"\n🧾 Saved Excel mapping with images and confidence to {output_path}")
+    headers = ["Label Image", "Avg Confidence", "Original File Name", "New File Name"]
+    if flags:
+        headers.append(FLAGS_SHEET)
+    if corrections:
+        headers.append("Corrections")
+    header_font = Font(bold=True, size=12)
+    ws.append([_styled(ws, header, header_font) for header in headers])
+    low_confidence_font = Font(color="FF0000", bold=True)
+
+    with tempfile.TemporaryFile() as spool:
+        for i, (record, thumb) in enumerate(iter_thumbnails(records, label_folder, thumb_format, workers, instrumentation), start=2):
+            # thumbnail image of size 200x200 mapped into the excel sheet
+            # (no _thumb.png files written next to the labels)
+            if thumb is not None:
+                offset = spool.seek(0, os.SEEK_END)
+                spool.write(thumb)
+                img_for_excel = XLImage(_SpoolSlice(spool, offset, len(thumb)))
+                img_for_excel.anchor = f"A{i}"
+                ws.add_image(img_for_excel)
+            # else log that label image path was not found
+            else:
+                run_log.event("missing_label", slide=record["Original File Name"],
+                              path=os.path.join(label_folder or "", record["Label Image"]))
+            # add confidence scores, scores < threshold to be red & bolded
+            confidence = record["Confidence"]
+            if confidence < threshold:
+                confidence = _styled(ws, confidence, low_confidence_font)
+
+            row = [None, confidence, record["Original File Name"], record["New File Name"]]
+            if flags:
+                row.append(f"=IFERROR(VLOOKUP(C{i},'{FLAGS_SHEET}'!A:C,3,FALSE),\"\")")
+            if corrections:
+                row.append(describe_corrections(record.get("Corrections", ())))
+            ws.row_dimensions[i].height = 120
+            ws.append(row)
+            # the row is written out; don't keep its dimensions around
+            del ws.row_dimensions[i]
+
+        if flags:
+            with instrumentation.stage("study_id_flags"):
+                flag_rows = flags()
+            fs = wb.create_sheet(FLAGS_SHEET)
+            fs.column_dimensions["A"].width = 35
+            fs.column_dimensions["D"].width = 60
+            fs.append([_styled(fs, header, header_font) for header in ["Original File Name", "Study ID", "Flag", "Details"]])
+            # a slide with both flags gets one row, so the lookup shows both
+            merged = {}
+            for slide, study_id, flag, details in flag_rows:
+                if slide in merged:
+                    merged[slide][2] += f"; {flag}"
+                    merged[slide][3] += f"; {details}"
+                else:
+                    merged[slide] = [slide, study_id, flag, details]
+            for slide, study_id, flag, details in merged.values():
+                fs.append([slide, study_id, _styled(fs, flag, low_confidence_font), details])
+
+        path = os.path.join(output_folder, output_path)
+        with instrumentation.stage("excel_save") as stage:
+            wb.save(path)
+            stage.bytes = os.path.getsize(path)
+    run_log.event("excel_saved", path=output_path)
 
-def postprocess_ocr(ocr_txt_path, mrxs_folder, output_folder, label_folder):
-    global LOG_PATH
-    LOG_PATH = os.path.join(output_folder, "rename_log.txt")
-    log(f"🚀 Initiated post-processing of Vision OCR results")
-    log(f"OCR input: {ocr_txt_path}")
-    log(f"Output folder: {output_folder} \n")
+def label_images(label_folder, ocr_backend):
+    # (name, png bytes) for every label image to OCR; a replay backend can
+    # stand in for a missing label folder with the names it recorded
+    if label_folder and os.path.isdir(label_folder):
+        for name in sorted(os.listdir(label_folder)):
+            if name.lower().endswith(".png") and not name.endswith("_thumb.png"):
+                with open(os.path.join(label_folder, name), "rb") as f:
+                    yield name, f.read()
+    elif isinstance(ocr_backend, ReplayBackend):
+        for name in ocr_backend.names():
+            yield name, b""
 
-    grouped, confidence_scores = parse_ocr_file(ocr_txt_path)
-    study_id_to_files = defaultdict(list)
+def postprocess_ocr(ocr_backend, mrxs_folder, output_folder, label_folder, extractor=None, thumb_format="png", run_log=None,
+                    instrumentation=DISABLED, study_index=None):
+    if run_log is None:
+        with RunLog(output_folder) as run_log:
+            return postprocess_ocr(ocr_backend, mrxs_folder, output_folder, label_folder, extractor, thumb_format, run_log,
+                                   instrumentation, study_index)
+    run_log.event("postprocess_start", backend=ocr_backend.engine_version, output_folder=output_folder)
+
+    extractor = extractor or load_extractor()
     records = []
+    slides = []
+    label_keys = {}
+
+    def keyed(labels):
+        for name, data in labels:
+            label_keys[name] = slide_key(mrxs_folder, name.replace(".png", "") + ".mrxs", data)
+            yield name, data
 
-    for fname, lines in grouped.items():
-        study_id, cleaned_name = extract_study_id_and_clean(lines)
-        avg_conf = round(sum(confidence_scores[fname]) / len(confidence_scores[fname]), 3) if confidence_scores[fname] else 0
-        if study_id:
-            study_id_to_files[study_id].append(fname)
+    waited = time.perf_counter()
+    for name, results in ocr_backend.recognize_batch(keyed(label_images(label_folder, ocr_backend))):
+        fname = name.replace(".png", "")
+        # time spent waiting on the backend for this slide (live OCR, or
+        # parsing the recorded results when replaying)
+        instrumentation.add("ocr", time.perf_counter() - waited, slide=fname + ".mrxs")
+        if isinstance(results, OCRError):
+            run_log.event("ocr_error", slide=fname + ".mrxs", message=str(results))
+            continue
+        with instrumentation.stage("name", fname + ".mrxs"):
+            lines = [text for text, _ in results]
+            study_id, cleaned_name, corrections = extractor.extract_corrected(lines, [conf for _, conf in results])
+            avg_conf = average_confidence([conf for _, conf in results if conf is not None])
+        waited = time.perf_counter()
+        slides.append((label_keys.pop(name), fname + ".mrxs", study_id, cleaned_name + ".mrxs"))
         label_img = f"{fname}.png"
         records.append({
             "Original File Name": fname + ".mrxs",
             "Label Image": label_img,
             "New File Name": cleaned_name + ".mrxs",
-            "Confidence": avg_conf 
+            "Confidence": avg_conf,
+            "Corrections": corrections,
         })
-        #log(f"Original File {fname} → Extracted Name {cleaned_name} [Confidence Score: {avg_conf}")
+        log_slide(run_log, dict(records[-1], **{"Study ID": study_id}), [conf for _, conf in results])
 
-    export_excel_with_images(records, label_folder, output_folder)
+    if isinstance(ocr_backend, CachedBackend):
+        run_log.event("ocr_cache", hits=ocr_backend.cache.hits, misses=ocr_backend.cache.misses)
+    flags = study_id_flags(study_index, mrxs_folder, slides, run_log) if study_index else None
+    export_excel_with_images(records, label_folder, output_folder, thumb_format=thumb_format, run_log=run_log,
+                             instrumentation=instrumentation, flags=flags, corrections=extractor.vocabulary is not None)
+    instrumentation.write_summary(output_folder, run_log, slides=len(records))
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="Post-process OCR results into Excel mapping without renaming.")
-    parser.add_argument("--ocr", required=True, help="Path to vision_ocr_results.txt")
+    ocr_source = parser.add_mutually_exclusive_group(required=True)
+    ocr_source.add_argument("--ocr", help="Path to recorded OCR results to replay (ocr_results.txt, .jsonl or .ocrb)")
+    ocr_source.add_argument("--ocr-binary", help="Path to the compiled VisionOCRDemo binary to run OCR live")
     parser.add_argument("--folder", required=True, help="Path to folder containing .mrxs files")
     parser.add_argument("--labels", required=True, help="Path to folder containing label .png images")
     parser.add_argument("-o", required=True, help="Path to store output files")
+    parser.add_argument("--ocr-cache", default=DEFAULT_CACHE_PATH, help=f"Persistent OCR result cache used with --ocr-binary (default: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--no-ocr-cache", action="store_true", help="Run OCR on every label without consulting the cache")
+    parser.add_argument("--rules", default=DEFAULT_RULES_PATH, help=f"Name extraction rules file (default: {DEFAULT_RULES_PATH})")
+    parser.add_argument("--thumb-format", choices=THUMB_FORMATS, default="png", help="Encoding of the Excel label thumbnails (default: png)")
+    parser.add_argument("--profile", action="store_true", help="Record per-stage, per-slide timings and write run_summary.json to the output folder")
+    parser.add_argument("--study-index", default=DEFAULT_INDEX_PATH, help=f"Persistent study ID index for outlier and near-duplicate flags (default: {DEFAULT_INDEX_PATH})")
+    parser.add_argument("--no-study-index", action="store_true", help="Don't index study IDs or flag outliers")
     args = parser.parse_args()
 
-    postprocess_ocr(args.ocr, args.folder, args.o, args.labels)
+    extractor = load_extractor(args.rules)
+    study_index = None if args.no_study_index else StudyIndex(args.study_index)
+    if args.ocr:
+        ocr_backend = ReplayBackend(args.ocr)
+    else:
+        ocr_backend = VisionSubprocessBackend(args.ocr_binary)
+        if not args.no_ocr_cache:
+            ocr_backend = CachedBackend(ocr_backend, OCRCache(args.ocr_cache))
+    with ocr_backend:
+        postprocess_ocr(ocr_backend, args.folder, args.o, args.labels, extractor=extractor, thumb_format=args.thumb_format,
+                        instrumentation=Instrumentation(enabled=args.profile), study_index=study_index)
@@ -0,0 +1,140 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from instrumentation import DISABLED
+
+# Runs journaled rename steps on a thread pool. On a network mount (SMB/NFS)
+# every os.rename is a round trip, so renames are latency bound and overlap
+# well; a per-mount limit keeps a batch from flooding one file server.
+# Steps that share a name (a chain, a cycle, a slide's folder and file) form
+# a lane that runs in order; separate lanes run in parallel.
+
+DEFAULT_WORKERS = 8
+
+def mount_point(path):
+    path = os.path.realpath(path)
+    while not os.path.ismount(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+def name_key(name):
+    # slide folders live on case-insensitive volumes (APFS/HFS+ on macOS),
+    # where "Lung.mrxs" and "lung.mrxs" are the same file; every check that
+    # asks whether two names clash compares these keys
+    return name.casefold()
+
+def lanes(steps, indices=None):
+    # groups step indices into independent lanes, each in journal order;
+    # two steps are dependent when they touch the same name, and a folder
+    # step always runs with the slide file step that follows it
+    indices = range(len(steps)) if indices is None else indices
+    parent = {}
+
+    def find(key):
+        root = key
+        while parent.setdefault(root, root) != root:
+            root = parent[root]
+        while parent[key] != root:
+            parent[key], key = root, parent[key]
+        return root
+
+    def union(a, b):
+        parent[find(a)] = find(b)
+
+    for index in indices:
+        entry = steps[index]
+        union(("name", name_key(entry["src"])), ("name", name_key(entry["dst"])))
+        union(("step", index), ("name", name_key(entry["src"])))
+        if entry.get("folder") and index + 1 < len(steps):
+            union(("step", index), ("name", name_key(steps[index + 1]["src"])))
+
+    grouped = {}
+    for index in indices:
+        grouped.setdefault(find(("step", index)), []).append(index)
+    return list(grouped.values())
+
+class RenameExecutor:
+    def __init__(self, workers=DEFAULT_WORKERS, mount_limit=None, rename=os.rename, instrumentation=DISABLED):
+        # workers: thread pool size; mount_limit: most renames in flight on
+        # any one mount (default: no limit beyond workers); rename: the
+        # rename function (the benchmark passes one that adds latency)
+        self.workers = max(1, workers)
+        self.instrumentation = instrumentation
+        self.mount_limit = mount_limit
+        self._rename = rename
+        self._slots = {}
+        self._slots_lock = threading.Lock()
+        self.latencies = []
+        self.seconds = 0.0
+
+    def _mount_slots(self, path):
+        if not self.mount_limit:
+            return None
+        mount = mount_point(os.path.dirname(path))
+        with self._slots_lock:
+            if mount not in self._slots:
+                self._slots[mount] = threading.BoundedSemaphore(self.mount_limit)
+            return self._slots[mount]
+
+    def rename(self, src, dst):
+        slots = self._mount_slots(src)
+        if slots:
+            slots.acquire()
+        try:
+            start = time.perf_counter()
+            with self.instrumentation.stage("rename", os.path.basename(dst)):
+                self._rename(src, dst)
+            # list.append is atomic, so workers record without a lock
+            self.latencies.append(time.perf_counter() - start)
+        finally:
+            if slots:
+                slots.release()
+
+    def run(self, lanes, do_step):
+        # calls do_step(index) for every index, each lane in order; after a
+        # failure no new steps start, and the first error is raised once the
+        # running ones have finished
+        start = time.perf_counter()
+        failed = threading.Event()
+
+        def run_lane(lane):
+            for index in lane:
+                if failed.is_set():
+                    return
+                try:
+                    do_step(index)
+                except BaseException:
+                    failed.set()
+                    raise
+
+        try:
+            if self.workers == 1 or len(lanes) <= 1:
+                for lane in lanes:
+                    run_lane(lane)
+            else:
+                with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                    futures = [pool.submit(run_lane, lane) for lane in lanes]
+                errors = [future.exception() for future in futures if future.exception()]
+                if errors:
+                    raise errors[0]
+        finally:
+            self.seconds += time.perf_counter() - start
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        return {
+            "renames": count,
+            "seconds": self.seconds,
+            "ops_per_sec": count / self.seconds if self.seconds else 0.0,
+            "p95_ms": latencies[int(0.95 * (count - 1))] * 1000 if count else 0.0,
+        }
+
+    def summary(self):
+        stats = self.stats()
+        return (f"{stats['renames']} rename(s) in {stats['seconds']:.2f} s "
+                f"({stats['ops_per_sec']:.1f} ops/s, p95 {stats['p95_ms']:.1f} ms)")
@@ -1,46 +1,117 @@
 
 import os
 import argparse
-import pandas as pd
+from instrumentation import Instrumentation
+from rename_executor import DEFAULT_WORKERS, RenameExecutor
+from rename_journal import JOURNAL_NAME, PENDING, JournalError, RenameJournal
+from rename_plan import RENAMED_STATUSES, plan_from_excel
 
-def rename_from_excel(excel_path, mrxs_folder, log_folder, log_path="rename_log_from_excel.txt"):
-    df = pd.read_excel(excel_path)
+RENAME_SUMMARY_NAME = "rename_summary.json"
 
-    log_entries = []
+def _open_log(log_folder, log_path, mode="w"):
+    # entries are written as they happen, so a crash still leaves a log
+    f = open(os.path.join(log_folder, log_path), mode, encoding="utf-8")
+    def log(entry):
+        f.write(entry + "\n")
+        f.flush()
+    return f, log
+
+def rename_from_excel(excel_path, mrxs_folder, log_folder, log_path="rename_log_from_excel.txt", dry_run=False,
+                      workers=DEFAULT_WORKERS, mount_limit=None, profile=False):
+    journal_path = os.path.join(log_folder, JOURNAL_NAME)
+    executor = RenameExecutor(workers, mount_limit, instrumentation=Instrumentation(enabled=profile))
     renamed_count = 0
 
-    if "Original File Name" not in df.columns or "New File Name" not in df.columns:
-        log_entries.append("Excel must contain 'Original File Name' and 'New File Name' columns.")
-    
-    for _, row in df.iterrows():
-        original = row["Original File Name"]
-        new = row["New File Name"]
+    try:
+        plan = plan_from_excel(excel_path, mrxs_folder)
+    except ValueError as e:
+        plan, error = None, str(e)
 
-        old_path = os.path.join(mrxs_folder, original)
-        new_path = os.path.join(mrxs_folder, new)
+    if plan is not None and dry_run:
+        print(plan.preview())
+        return 0
 
-        if os.path.exists(old_path):
-            if not os.path.exists(new_path):  # avoid overwriting
-                os.rename(old_path, new_path)
-                log_entries.append(f"Renamed: {original} → {new}")
-                renamed_count += 1
-            else:
-                log_entries.append(f"Skipped: {new} already exists.")
+    f, log = _open_log(log_folder, log_path)
+    with f:
+        if plan is None:
+            log(error)
+        elif os.path.exists(journal_path) and RenameJournal.open(journal_path).state == PENDING:
+            # never start a new batch on top of one that didn't finish
+            log(f"❌ A previous rename run did not finish ({journal_path}). Run again with --resume or --rollback.")
         else:
-            log_entries.append(f"File not found: {original}")
-    
-    log_entries.append(f"✔ Renaming complete. {renamed_count} file(s) renamed. Log saved to {log_path}")
-    with open(os.path.join(log_folder, log_path), "w", encoding="utf-8") as f:
-        for entry in log_entries:
-            f.write(entry + "\n")
+            # everything the plan won't touch is logged up front
+            for message, status in zip(plan.messages(), plan.table["status"]):
+                if status not in RENAMED_STATUSES:
+                    log(message)
+
+            def renamed(original, new, folder):
+                nonlocal renamed_count
+                if folder:
+                    log(f"Renamed folder: {original}/ → {new}/")
+                    return
+                renamed_count += 1
+                log(f"Renamed: {original} → {new}")
+
+            try:
+                plan.execute(journal_path, on_rename=renamed, executor=executor)
+            except (OSError, JournalError) as e:
+                log(f"❌ {e}")
+                if RenameJournal.open(journal_path).state == PENDING:
+                    log("Run again with --resume or --rollback.")
+            log(f"⏱ {executor.summary()}")
+            if executor.instrumentation.write_summary(log_folder, slides=renamed_count, name=RENAME_SUMMARY_NAME):
+                log(f"⏱ Timing summary saved to {RENAME_SUMMARY_NAME}")
+
+        log(f"✔ Renaming complete. {renamed_count} file(s) renamed. Log saved to {log_path}")
         f.write(f"\nTotal files renamed: {renamed_count}\n")
+    return renamed_count
+
+def recover(log_folder, rollback=False, log_path="rename_log_from_excel.txt", workers=DEFAULT_WORKERS, mount_limit=None):
+    # finishes (or undoes) the rename run recorded in log_folder's journal
+    journal = RenameJournal.open(os.path.join(log_folder, JOURNAL_NAME))
+    executor = RenameExecutor(workers, mount_limit)
+    f, log = _open_log(log_folder, log_path, mode="a")
+
+    def restored(original, new, folder):
+        log(f"Restored folder: {new}/ → {original}/" if folder else f"Restored: {new} → {original}")
+
+    def renamed(original, new, folder):
+        log(f"Renamed folder: {original}/ → {new}/" if folder else f"Renamed: {original} → {new}")
+
+    with f:
+        if rollback:
+            count = journal.rollback(on_step=restored, executor=executor)
+            log(f"↩️ Rollback complete. {count} rename step(s) undone.")
+        else:
+            count = journal.resume(on_step=renamed, executor=executor)
+            log(f"✔ Resumed renaming. {count} rename step(s) applied.")
+        log(f"⏱ {executor.summary()}")
+    return count
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Rename .mrxs files using Excel sheet mapping.")
-    parser.add_argument("--excel", required=True, help="Path to Excel file with Original/New filenames")
-    parser.add_argument("--folder", required=True, help="Path to folder containing .mrxs files")
+    parser.add_argument("--excel", help="Path to Excel file with Original/New filenames")
+    parser.add_argument("--folder", help="Path to folder containing .mrxs files")
     parser.add_argument("--log", required=True, help="Path to folder containing log files")
+    parser.add_argument("--dry-run", action="store_true", help="Print the rename plan (missing files, collisions, duplicates, cycles) without renaming")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Renames run in parallel, for network mounts (default: {DEFAULT_WORKERS})")
+    parser.add_argument("--profile", action="store_true", help=f"Record per-rename timings and write {RENAME_SUMMARY_NAME} to the log folder")
+    parser.add_argument("--mount-limit", type=int, default=None,
+                        help="Most renames in flight on one mount at a time (default: no limit beyond --workers)")
+    recovery = parser.add_mutually_exclusive_group()
+    recovery.add_argument("--resume", action="store_true", help=f"Finish an interrupted run from the {JOURNAL_NAME} in the log folder")
+    recovery.add_argument("--rollback", action="store_true", help=f"Undo the run recorded in the {JOURNAL_NAME} in the log folder")
     args = parser.parse_args()
 
-    rename_from_excel(args.excel, args.folder, args.log)
+    if args.resume or args.rollback:
+        try:
+            recover(args.log, rollback=args.rollback, workers=args.workers, mount_limit=args.mount_limit)
+        except (OSError, JournalError) as e:
+            parser.exit(1, f"❌ {e}\n")
+    else:
+        if not args.excel or not args.folder:
+            parser.error("--excel and --folder are required unless --resume or --rollback is given")
+        rename_from_excel(args.excel, args.folder, args.log, dry_run=args.dry_run,
+                          workers=args.workers, mount_limit=args.mount_limit, profile=args.profile)
@@ -0,0 +1,227 @@
+import os
+import json
+import time
+import threading
+from rename_executor import RenameExecutor, lanes, name_key
+
+# Write-ahead journal for batch renames. The full list of rename steps is
+# written (and fsynced) before the first rename, then each finished step is
+# appended. After a crash the journal says what was intended, and the files
+# themselves say how far it got, so a run can be resumed or rolled back.
+#
+#   {"event": "begin", "folder": ..., "created": ..., "steps": [{"src": ..., "dst": ..., "rename": [original, new], "folder": false}, ...]}
+#   {"event": "done", "step": 0}
+#   ...
+#   {"event": "complete"}          or, after a rollback, {"event": "rolled back"}
+#
+# A step's "rename" is the logical rename it completes ([original, new]), or
+# null for the intermediate move of a cycle member onto a temporary name.
+# "folder" marks the step moving a slide's data folder (one directory rename)
+# ahead of its .mrxs file.
+
+JOURNAL_NAME = "rename_journal.jsonl"
+
+PENDING = "pending"
+COMPLETE = "complete"
+ROLLED_BACK = "rolled back"
+
+class JournalError(Exception):
+    pass
+
+def step(src, dst, rename=None, folder=False):
+    return {"src": src, "dst": dst, "rename": list(rename) if rename else None, "folder": folder}
+
+def _case_only(entry):
+    # a step that only changes the case of a name: on a case-insensitive
+    # volume its source and destination are the same file
+    return entry["src"] != entry["dst"] and name_key(entry["src"]) == name_key(entry["dst"])
+
+def _fsync_dir(path):
+    # make the journal's directory entry durable too (not possible on Windows)
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+class RenameJournal:
+    def __init__(self, path, folder, steps, done=(), state=PENDING):
+        self.path = path
+        self.folder = folder
+        self.steps = steps
+        self.done = set(done)
+        self.state = state
+        self._f = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def start(cls, path, folder, steps):
+        # records the intent durably; nothing has been renamed yet
+        journal = cls(path, os.path.abspath(folder), steps)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"event": "begin", "folder": journal.folder, "created": time.time(), "steps": steps},
+                               ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        _fsync_dir(os.path.dirname(os.path.abspath(path)))
+        return journal
+
+    @classmethod
+    def open(cls, path):
+        journal = None
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # a torn last line from a crash mid-write
+                    break
+                if entry["event"] == "begin":
+                    journal = cls(path, entry["folder"], entry["steps"])
+                elif journal is None:
+                    break
+                elif entry["event"] == "done":
+                    journal.done.add(entry["step"])
+                elif entry["event"] == "undone":
+                    journal.done.discard(entry["step"])
+                elif entry["event"] in (COMPLETE, ROLLED_BACK):
+                    journal.state = entry["event"]
+        if journal is None:
+            raise JournalError(f"{path} is not a rename journal")
+        return journal
+
+    def _append(self, entry, sync=False):
+        if self._f is None:
+            self._f = open(self.path, "a", encoding="utf-8")
+        self._f.write(json.dumps(entry) + "\n")
+        # flushed to the OS after every step; only fsynced at the end, since
+        # a lost "done" line is recovered from the files themselves
+        self._f.flush()
+        if sync:
+            os.fsync(self._f.fileno())
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def _paths(self, entry):
+        return os.path.join(self.folder, entry["src"]), os.path.join(self.folder, entry["dst"])
+
+    def _is_done(self, index):
+        # trusts the journal, else looks at the files: a step is done when its
+        # source is gone and its destination exists (only meaningful once
+        # every earlier step of its lane has been applied)
+        if index in self.done:
+            return True
+        entry = self.steps[index]
+        src, dst = self._paths(entry)
+        if _case_only(entry):
+            # both paths exist either way, so the listing's spelling decides
+            return entry["dst"] in os.listdir(os.path.dirname(dst))
+        return not os.path.lexists(src) and os.path.lexists(dst)
+
+    def _record(self, event, index, on_step):
+        # workers finish steps concurrently; journal lines and log callbacks
+        # go through one lock so neither interleaves
+        entry = self.steps[index]
+        with self._lock:
+            if event == "done":
+                self.done.add(index)
+            else:
+                self.done.discard(index)
+            self._append({"event": event, "step": index})
+            if on_step and entry["rename"]:
+                on_step(*entry["rename"], entry.get("folder", False))
+
+    def check_targets(self):
+        # up-front collision check for a fresh run, from one listing: each
+        # step's destination must be free or vacated by an earlier step.
+        # Names are compared case-insensitively (see name_key); a step may
+        # still change the case of its own name
+        occupied = {name_key(name) for name in os.listdir(self.folder)}
+        for entry in self.steps:
+            src, dst = name_key(entry["src"]), name_key(entry["dst"])
+            if dst in occupied and dst != src:
+                raise JournalError(f"Can't rename {entry['src']}: {entry['dst']} already exists")
+            occupied.discard(src)
+            occupied.add(dst)
+
+    def apply(self, on_step=None, check=False, executor=None):
+        # applies every step not yet done (in parallel on executor, one lane
+        # of dependent steps at a time per worker); check=True (resume)
+        # looks for steps a crash finished without journaling them
+        if self.state != PENDING:
+            raise JournalError(f"Journal is already {self.state}")
+        executor = executor or RenameExecutor(workers=1)
+        if not check and not self.done:
+            try:
+                self.check_targets()
+            except JournalError:
+                # nothing was renamed, so there is nothing to resume
+                self._append({"event": ROLLED_BACK}, sync=True)
+                self.state = ROLLED_BACK
+                self.close()
+                raise
+        applied = 0
+
+        def do_step(index):
+            nonlocal applied
+            # runs after every earlier step of its lane, which is what deciding
+            # whether a crash already did it relies on
+            if check and self._is_done(index):
+                return
+            entry = self.steps[index]
+            src, dst = self._paths(entry)
+            if check and os.path.lexists(dst) and not _case_only(entry):
+                raise JournalError(f"Can't resume: {entry['dst']} already exists")
+            executor.rename(src, dst)
+            self._record("done", index, on_step)
+            with self._lock:
+                applied += 1
+
+        pending = [index for index in range(len(self.steps)) if index not in self.done]
+        try:
+            executor.run(lanes(self.steps, pending), do_step)
+            self._append({"event": COMPLETE}, sync=True)
+            self.state = COMPLETE
+        finally:
+            self.close()
+        return applied
+
+    def resume(self, on_step=None, executor=None):
+        return self.apply(on_step, check=True, executor=executor)
+
+    def rollback(self, on_step=None, executor=None):
+        # undoes every applied step, newest first within each lane; cycle
+        # members parked on a temporary name are moved back as part of this
+        if self.state == ROLLED_BACK:
+            raise JournalError("Journal is already rolled back")
+        executor = executor or RenameExecutor(workers=1)
+        undone = 0
+
+        def undo_step(index):
+            nonlocal undone
+            if not self._is_done(index):
+                return
+            entry = self.steps[index]
+            src, dst = self._paths(entry)
+            if os.path.lexists(src) and not _case_only(entry):
+                raise JournalError(f"Can't roll back: {entry['src']} already exists")
+            executor.rename(dst, src)
+            self._record("undone", index, on_step)
+            with self._lock:
+                undone += 1
+
+        try:
+            executor.run([lane[::-1] for lane in lanes(self.steps)], undo_step)
+            self._append({"event": ROLLED_BACK}, sync=True)
+            self.state = ROLLED_BACK
+        finally:
+            self.close()
+        return undone
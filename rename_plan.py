@@ -0,0 +1,280 @@
+import os
+import re
+import uuid
+from collections import Counter
+import pandas as pd
+from rename_executor import name_key
+from rename_journal import RenameJournal, step
+
+# Plans a batch of slide renames from an (original name, new name) table.
+# The folder is listed once and every check runs as a column operation over
+# the whole mapping, so nothing touches the filesystem until execute().
+# A MIRAX slide is a .mrxs file plus a same-named folder of .dat files; the
+# two are planned and renamed as one unit. Names clash when they match
+# ignoring case (see name_key): macOS volumes are case-insensitive.
+
+ORIGINAL_COLUMN = "Original File Name"
+NEW_COLUMN = "New File Name"
+
+# row statuses; READY and CYCLE rows are renamed
+READY = "ready"
+UNCHANGED = "unchanged"
+MISSING = "missing"
+INVALID = "invalid"
+DUPLICATE_SOURCE = "duplicate source"
+DUPLICATE_TARGET = "duplicate target"
+COLLISION = "collision"
+CYCLE = "cycle"
+RENAMED_STATUSES = (READY, CYCLE)
+
+SLIDE_EXTENSION = re.compile(r"\.mrxs$", re.IGNORECASE)
+
+class RenamePlan:
+    def __init__(self, folder, table, listing=()):
+        # table: one row per mapping with original, new, folder / new_folder
+        # (the slide's data folder, "" if there is none), status and order
+        # (execution rank of ready rows; renames into a name that is itself
+        # being renamed away run after it)
+        self.folder = folder
+        self.table = table
+        self.listing = set(listing)
+        self._listing_keys = {name_key(name) for name in self.listing}
+
+    @property
+    def renames(self):
+        # [(original, new)] for every ready row, in execution order
+        ready = self.table[self.table["status"] == READY].sort_values("order", kind="stable")
+        return list(zip(ready["original"], ready["new"]))
+
+    def counts(self):
+        return Counter(self.table["status"])
+
+    def cycles(self):
+        # each rename cycle as a list of original names, e.g. [a, b] for
+        # a→b, b→a (or a→B, b→A)
+        rows = self.table.loc[self.table["status"] == CYCLE, ["original", "new"]]
+        original_of = {name_key(original): original for original in rows["original"]}
+        mapping = {name_key(original): name_key(new) for original, new in zip(rows["original"], rows["new"])}
+        cycles, seen = [], set()
+        for start in mapping:
+            if start in seen:
+                continue
+            cycle, name = [], start
+            while name not in seen:
+                seen.add(name)
+                cycle.append(original_of[name])
+                name = mapping[name]
+            cycles.append(cycle)
+        return cycles
+
+    def _temp_name(self, name):
+        # keeps the .mrxs extension, so the slide's folder gets the same
+        # temporary stem
+        stem = _slide_stem(name)
+        while True:
+            temp = f".{stem}.renaming-{uuid.uuid4().hex[:8]}" + name[len(stem):]
+            if name_key(temp) not in self._listing_keys and name_key(_slide_stem(temp)) not in self._listing_keys:
+                return temp
+
+    def steps(self):
+        # journal steps for every rename: chains in order, then each cycle
+        # a→b→c→a as a→tmp, c→a, b→c, tmp→b
+        has_folder = dict(zip(self.table["original"], self.table["folder"] != ""))
+        new_of = dict(zip(self.table["original"], self.table["new"]))
+        steps = []
+        for original, new in self.renames:
+            steps += _slide_steps(original, new, (original, new), has_folder[original])
+        for cycle in self.cycles():
+            temp = self._temp_name(cycle[0])
+            steps += _slide_steps(cycle[0], temp, None, has_folder[cycle[0]])
+            for i in range(len(cycle) - 1, 0, -1):
+                target = new_of[cycle[i]]
+                steps += _slide_steps(cycle[i], target, (cycle[i], target), has_folder[cycle[i]])
+            steps += _slide_steps(temp, new_of[cycle[0]], (cycle[0], new_of[cycle[0]]), has_folder[cycle[0]])
+        return steps
+
+    def messages(self):
+        # one log line per row, in sheet order
+        lines = []
+        table = self.table
+        for original, new, folder, status in zip(table["original"], table["new"], table["folder"], table["status"]):
+            if folder and status in RENAMED_STATUSES:
+                new = f"{new} (with data folder {folder}/)"
+            if status == READY:
+                lines.append(f"Rename: {original} → {new}")
+            elif status == UNCHANGED:
+                lines.append(f"Unchanged: {original}")
+            elif status == MISSING:
+                lines.append(f"File not found: {original}")
+            elif status == INVALID:
+                lines.append(f"Skipped: invalid mapping {original!r} → {new!r}")
+            elif status == DUPLICATE_SOURCE:
+                lines.append(f"Skipped: {original} is listed more than once")
+            elif status == DUPLICATE_TARGET:
+                lines.append(f"Skipped: {new} is the new name of more than one file")
+            elif status == COLLISION:
+                if name_key(new) not in self._listing_keys and name_key(_slide_stem(new)) in self._listing_keys:
+                    lines.append(f"Skipped: data folder {_slide_stem(new)}/ already exists.")
+                else:
+                    lines.append(f"Skipped: {new} already exists.")
+            elif status == CYCLE:
+                lines.append(f"Rename: {original} → {new} (cycle, via a temporary name)")
+        return lines
+
+    def preview(self):
+        counts = self.counts()
+        lines = self.messages()
+        lines.append(", ".join(f"{count} {status}" for status, count in sorted(counts.items())))
+        return "\n".join(lines)
+
+    def execute(self, journal_path, on_rename=None, executor=None):
+        # writes every step to the journal before renaming anything, then
+        # applies them (on executor's thread pool, if given); returns the
+        # journal (see rename_journal for resume and rollback)
+        journal = RenameJournal.start(journal_path, self.folder, self.steps())
+        journal.apply(on_rename, executor=executor)
+        return journal
+
+def _slide_stem(name):
+    # "a.mrxs" → "a"; other names are returned unchanged
+    return SLIDE_EXTENSION.sub("", name)
+
+def _slide_steps(src, dst, rename, has_folder):
+    # a slide's data folder is moved first (a single directory rename), so
+    # the .mrxs appearing under its new name means the whole slide is there
+    steps = []
+    if has_folder:
+        folder_rename = (_slide_stem(rename[0]), _slide_stem(rename[1])) if rename else None
+        steps.append(step(_slide_stem(src), _slide_stem(dst), folder_rename, folder=True))
+    steps.append(step(src, dst, rename))
+    return steps
+
+def _list_folder(folder):
+    # one pass over the folder: every name, and which of them are directories
+    names, directories = [], set()
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            names.append(entry.name)
+            if entry.is_dir():
+                directories.add(entry.name)
+    return names, directories
+
+def _valid_names(names):
+    # non-empty plain file names (no directories, no "." / "..")
+    return (names.str.len() > 0) & ~names.str.contains(r"[/\\]|^\.\.?$", regex=True)
+
+def plan_renames(mapping, folder):
+    # mapping: DataFrame with ORIGINAL_COLUMN / NEW_COLUMN (e.g. the edited
+    # Excel sheet); folder: directory holding the files
+    names, directories = _list_folder(folder)
+    listing = pd.Index(names)
+    table = pd.DataFrame({
+        "original": mapping[ORIGINAL_COLUMN].fillna("").astype(str).str.strip(),
+        "new": mapping[NEW_COLUMN].fillna("").astype(str).str.strip(),
+    })
+    # a .mrxs whose stem is a directory in the listing has a data folder,
+    # which takes the new name's stem
+    stem = table["original"].str.replace(SLIDE_EXTENSION, "", regex=True)
+    new_stem = table["new"].str.replace(SLIDE_EXTENSION, "", regex=True)
+    has_folder = (stem != table["original"]) & stem.isin(directories)
+    table["folder"] = stem.where(has_folder, "")
+    table["new_folder"] = new_stem.where(has_folder, "")
+    table["status"] = READY
+    table["order"] = 0
+
+    def mark(mask, status):
+        table.loc[mask & (table["status"] == READY), "status"] = status
+
+    mark(~_valid_names(table["original"]) | ~_valid_names(table["new"]), INVALID)
+    # a slide with a data folder must keep the .mrxs extension
+    mark(has_folder & ((new_stem == table["new"]) | ~_valid_names(new_stem)), INVALID)
+    mark(table["original"] == table["new"], UNCHANGED)
+    mark(~table["original"].isin(listing), MISSING)
+    mark(table["original"].str.casefold().duplicated(keep=False), DUPLICATE_SOURCE)
+    # two targets differing only in case would overwrite each other
+    new_key, new_folder_key = table["new"].str.casefold(), table["new_folder"].str.casefold()
+    targets = pd.concat([new_key, new_folder_key[has_folder]])
+    duplicated = targets[targets.duplicated(keep=False)]
+    mark(new_key.isin(duplicated) | (has_folder & new_folder_key.isin(duplicated)), DUPLICATE_TARGET)
+
+    _mark_collisions(table, set(listing), directories)
+    _order_chains(table)
+    return RenamePlan(folder, table, listing)
+
+def _mark_collisions(table, existing, directories=()):
+    # a target may only exist if the file there is itself renamed away; a
+    # blocked rename leaves its own name occupied, which blocks the rename
+    # into that name in turn, so each chain is resolved from its far end.
+    # A .mrxs target is also taken while a folder of its stem exists (it
+    # would pick up another slide's data). Names are compared by name_key;
+    # a rename that only changes the case of its own name keeps that name
+    # occupied by itself, so it is only blocked where the new spelling is
+    # another file (a case-sensitive volume).
+    ready = table["status"] == READY
+    existing_keys = {name_key(name) for name in existing}
+    directory_keys = {name_key(name) for name in directories}
+    target_of, case_only = {}, {}
+    for original, new in zip(table.loc[ready, "original"], table.loc[ready, "new"]):
+        if name_key(original) == name_key(new):
+            case_only[original] = new in existing or (_slide_stem(new) != _slide_stem(original) and _slide_stem(new) in directories)
+        else:
+            target_of[name_key(original)] = name_key(new)
+    blocked = {}
+    for start in target_of:
+        path, name = [], start
+        while name in target_of and name not in blocked and name not in path:
+            path.append(name)
+            name = target_of[name]
+        if name in path:
+            result = False  # a cycle only moves into names it vacates itself
+        elif name in blocked:
+            result = blocked[name]
+        else:
+            result = name in existing_keys or (_slide_stem(name) != name and _slide_stem(name) in directory_keys)
+        for member in path:
+            blocked[member] = result
+
+    def is_blocked(original):
+        if original in case_only:
+            return case_only[original]
+        return blocked.get(name_key(original), False)
+
+    collides = ready & table["original"].map(is_blocked).astype(bool)
+    table.loc[collides, "status"] = COLLISION
+
+def _order_chains(table):
+    # ready rows form chains (a→b, b→c) and cycles (a→b, b→a); each rename
+    # must wait for the rename moving its target out of the way. Cycles have
+    # no such order and are marked so they go through a temporary name.
+    # A case-only rename moves nothing out of anyone's way and runs first.
+    ready = table["status"] == READY
+    target_of = {name_key(original): name_key(new)
+                 for original, new in zip(table.loc[ready, "original"], table.loc[ready, "new"])
+                 if name_key(original) != name_key(new)}
+    order = {}
+    for start in target_of:
+        path, name = [], start
+        while name in target_of and name not in order and name not in path:
+            path.append(name)
+            name = target_of[name]
+        if name in path or order.get(name, 0) is None:
+            # walked back into this path (or into a known cycle)
+            for member in path:
+                order[member] = None
+            continue
+        rank = order[name] + 1 if name in order else 0
+        for member in reversed(path):
+            order[member] = rank
+            rank += 1
+    keys = table["original"].map(name_key)
+    cycle = ready & keys.map(lambda name: order.get(name, 0) is None)
+    table.loc[cycle, "status"] = CYCLE
+    ordered = ready & ~cycle
+    if ordered.any():
+        table.loc[ordered, "order"] = keys[ordered].map(lambda name: order.get(name, 0)).astype(int)
+
+def plan_from_excel(excel_path, folder):
+    mapping = pd.read_excel(excel_path, dtype=str)
+    if ORIGINAL_COLUMN not in mapping.columns or NEW_COLUMN not in mapping.columns:
+        raise ValueError(f"Excel must contain '{ORIGINAL_COLUMN}' and '{NEW_COLUMN}' columns.")
+    return plan_renames(mapping, folder)
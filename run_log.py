@@ -0,0 +1,113 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+
+# Structured run log. Every event is one JSON record (run_log.jsonl) and the
+# human-readable rename_log.txt is rendered from the same records. Both files
+# stay open and are written through a buffer that is flushed every
+# FLUSH_EVERY records or FLUSH_SECONDS, and on close, instead of reopening
+# the log for every line.
+
+LOG_NAME = "rename_log.txt"
+RECORDS_NAME = "run_log.jsonl"
+FLUSH_EVERY = 256
+FLUSH_SECONDS = 2.0
+
+# human-readable form of each event; anything else is shown by its message
+TEMPLATES = {
+    "pipeline_start": "🚀 Initiated streaming OCR pipeline\nMRXS folder: {mrxs_folder}\nOCR backend: {backend}\nOutput folder: {output_folder} \n",
+    "postprocess_start": "🚀 Initiated post-processing of Vision OCR results\nOCR backend: {backend}\nOutput folder: {output_folder} \n",
+    "watch_start": "👀 Watching {folder} for new slides ({ignored} already there ignored)\nOCR backend: {backend}\nOutput folder: {output_folder} \n",
+    "slide": "{slide} → {new_name} [Confidence Score: {confidence}]",
+    "ocr_error": "\n 🚨 {message}",
+    "preprocess_error": "\n ⚠️ {message}",
+    "missing_label": "\n 🚨 Label Image Not Found For: {path}",
+    "two_pass": "🔁 Two-pass OCR: {summary}",
+    "ocr_cache": "OCR cache: {hits} hit(s), {misses} miss(es)",
+    "excel_saved": "\n🧾 Saved Excel mapping with images and confidence to {path}",
+    "correction": "✏️ {slide}: '{word}' corrected to '{term}' ({category}, distance {distance}, confidence {confidence})",
+    "study_id_flag": "⚠️ {slide}: study ID '{study_id}' is a possible {flag}. {details}",
+    "study_index": "🔍 Study ID index: {study_ids} ID(s) over {slides} slide(s), {flagged} flag(s) in this run",
+    "throughput": "\n⏱ {slides} slide(s) in {seconds:.2f} s ({slides_per_sec:.2f} slides/s)",
+    "stage_timing": "⏱ {stage}: {count} call(s), p50 {p50_ms:.1f} ms, p95 {p95_ms:.1f} ms, CPU {cpu_s:.2f} s, {bytes} bytes",
+}
+
+def render(record):
+    return TEMPLATES.get(record["event"], "{message}").format(**record)
+
+class RunLog:
+    def __init__(self, folder=None, log_name=LOG_NAME, records_name=RECORDS_NAME, echo=True):
+        # folder=None only echoes to stdout (e.g. when a function is called
+        # without a run log)
+        self.echo = echo
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._flushed = time.monotonic()
+        self._text = self._records = None
+        if folder is not None:
+            os.makedirs(folder, exist_ok=True)
+            self._text = open(os.path.join(folder, log_name), "a", encoding="utf-8", buffering=1 << 16)
+            self._records = open(os.path.join(folder, records_name), "a", encoding="utf-8", buffering=1 << 16)
+
+    def event(self, event, **fields):
+        record = {"time": round(time.time(), 3), "event": event, **fields}
+        line = render(record)
+        with self._lock:
+            if self.echo:
+                print(line)
+            if self._text is None:
+                return record
+            self._text.write(line + "\n")
+            self._records.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            self._pending += 1
+            if self._pending >= FLUSH_EVERY or time.monotonic() - self._flushed >= FLUSH_SECONDS:
+                self._flush()
+        return record
+
+    def __call__(self, message):
+        # plain message, so a RunLog can stand in for print / on_skip
+        return self.event("message", message=message)
+
+    def _flush(self):
+        self._text.flush()
+        self._records.flush()
+        self._pending = 0
+        self._flushed = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            if self._text is not None:
+                self._flush()
+
+    def close(self):
+        with self._lock:
+            if self._text is not None:
+                self._text.close()
+                self._records.close()
+                self._text = self._records = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def iter_records(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render the human-readable log from a run_log.jsonl.")
+    parser.add_argument("records", help=f"Path to a {RECORDS_NAME}")
+    parser.add_argument("--event", action="append", help="Only show these event types (repeatable), e.g. slide, ocr_error")
+    args = parser.parse_args()
+
+    for record in iter_records(args.records):
+        if not args.event or record["event"] in args.event:
+            sys.stdout.write(render(record) + "\n")
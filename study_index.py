@@ -0,0 +1,202 @@
+import os
+import time
+import sqlite3
+import argparse
+import threading
+
+# Persistent index of every slide's study ID across runs and folders. Each
+# run adds its slides incrementally; per-ID slide counts are kept up to date
+# in study_ids, and every ID's one-deletion variants in id_variants, so both
+# checks below are indexed lookups for just the IDs of the current run:
+#   outlier         the ID is on no other slide in the whole history
+#   near duplicate  the ID is on a slide or two, and an ID one OCR-plausible
+#                   edit away (a look-alike swap such as 3/8, a dropped or
+#                   extra character, or two adjacent characters swapped) is
+#                   on several times as many, so this one is likely a misread
+# Any other single edit is not counted: sequential IDs (21-001, 21-002, ...)
+# are one substitution apart and both genuine.
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.expanduser("~"), ".cache", "study_index.sqlite3")
+OUTLIER = "outlier"
+NEAR_DUPLICATE = "near duplicate"
+# an ID is only suspect while it is on at most this many slides, and only
+# next to an ID on at least MISREAD_RATIO times as many
+MAX_MISREAD_SLIDES = 2
+MISREAD_RATIO = 3
+_CHUNK = 500
+# characters OCR reads one for the other on labels
+LOOK_ALIKE = {("0", "8"), ("0", "6"), ("0", "9"), ("3", "8"), ("5", "6"), ("6", "8"), ("1", "7"), ("4", "9"),
+              ("0", "o"), ("1", "l"), ("1", "i"), ("5", "s"), ("8", "b"), ("2", "z")}
+
+def _variants(study_id):
+    # the ID and every string one deletion away; two IDs within one edit
+    # always share a variant (the reverse needs checking, see one_edit_apart)
+    return {study_id} | {study_id[:i] + study_id[i + 1:] for i in range(len(study_id))}
+
+def _look_alike(a, b):
+    a, b = a.lower(), b.lower()
+    return a == b or (a, b) in LOOK_ALIKE or (b, a) in LOOK_ALIKE
+
+def one_edit_apart(a, b):
+    # one edit OCR plausibly makes: a look-alike substitution, a dropped or
+    # extra character, or an adjacent swap
+    if a == b or abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) < len(b):
+        return a[i:] == b[i + 1:]
+    return (a[i + 1:] == b[i + 1:] and _look_alike(a[i], b[i])) or (i + 1 < len(a) and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:])
+
+def likely_misread(count, others):
+    # the (ID, slide count) pairs among others that an ID on count slides is
+    # more likely a misread of than a study of its own
+    if count > MAX_MISREAD_SLIDES:
+        return []
+    return [(other, n) for other, n in others if n >= MISREAD_RATIO * max(count, 1)]
+
+def _chunks(values):
+    values = list(values)
+    for start in range(0, len(values), _CHUNK):
+        yield values[start:start + _CHUNK]
+
+class StudyIndex:
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS slides (
+                slide_key TEXT PRIMARY KEY,
+                folder TEXT NOT NULL,
+                slide TEXT NOT NULL,
+                study_id TEXT,
+                new_name TEXT,
+                seen REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS study_ids (study_id TEXT PRIMARY KEY, slides INTEGER NOT NULL) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS id_variants (
+                variant TEXT NOT NULL,
+                study_id TEXT NOT NULL,
+                PRIMARY KEY (variant, study_id)
+            ) WITHOUT ROWID;
+        """)
+
+    def update(self, slides):
+        # slides: [(slide_key, folder, slide, study_id or None, new_name)];
+        # slide_key identifies the physical slide (e.g. its label hash), so
+        # re-running a folder, or running it again after renaming, replaces
+        # its entries instead of counting them twice
+        now = time.time()
+        with self._lock, self._db:
+            previous = {}
+            for chunk in _chunks({slide[0] for slide in slides}):
+                previous.update(self._db.execute(
+                    f"SELECT slide_key, study_id FROM slides WHERE slide_key IN ({','.join('?' * len(chunk))})", chunk))
+            delta = {}
+            for key, _, _, study_id, _ in slides:
+                if key in previous and previous[key] == study_id:
+                    continue
+                if previous.get(key):
+                    delta[previous[key]] = delta.get(previous[key], 0) - 1
+                if study_id:
+                    delta[study_id] = delta.get(study_id, 0) + 1
+                previous[key] = study_id
+            self._db.executemany(
+                "INSERT OR REPLACE INTO slides (slide_key, folder, slide, study_id, new_name, seen) VALUES (?, ?, ?, ?, ?, ?)",
+                [(key, folder, slide, study_id, new_name, now) for key, folder, slide, study_id, new_name in slides])
+            self._db.executemany(
+                "INSERT INTO study_ids (study_id, slides) VALUES (?, ?) "
+                "ON CONFLICT (study_id) DO UPDATE SET slides = slides + excluded.slides",
+                delta.items())
+            self._db.executemany(
+                "INSERT OR IGNORE INTO id_variants (variant, study_id) VALUES (?, ?)",
+                [(variant, study_id) for study_id, change in delta.items() if change > 0 for variant in _variants(study_id)])
+
+    def counts(self, study_ids):
+        counts = {}
+        with self._lock:
+            for chunk in _chunks(set(study_ids)):
+                counts.update(self._db.execute(
+                    f"SELECT study_id, slides FROM study_ids WHERE study_id IN ({','.join('?' * len(chunk))}) AND slides > 0",
+                    chunk))
+        return counts
+
+    def near_duplicates(self, study_ids):
+        # {study ID: [(other ID one OCR edit away, its slide count)]}
+        study_ids = set(study_ids)
+        by_variant = {}
+        for study_id in study_ids:
+            for variant in _variants(study_id):
+                by_variant.setdefault(variant, []).append(study_id)
+        near = {study_id: {} for study_id in study_ids}
+        with self._lock:
+            for chunk in _chunks(by_variant):
+                rows = self._db.execute(
+                    "SELECT v.variant, v.study_id, s.slides FROM id_variants v JOIN study_ids s ON s.study_id = v.study_id "
+                    f"WHERE v.variant IN ({','.join('?' * len(chunk))}) AND s.slides > 0", chunk)
+                for variant, other, slides in rows:
+                    for study_id in by_variant[variant]:
+                        if one_edit_apart(study_id, other):
+                            near[study_id][other] = slides
+        return {study_id: sorted(others.items()) for study_id, others in near.items() if others}
+
+    def flags(self, slides):
+        # [(slide, study_id, flag, details)] for the given (slide, study_id)
+        # pairs, checked against the full history
+        study_ids = {study_id for _, study_id in slides if study_id}
+        counts = self.counts(study_ids)
+        near = self.near_duplicates(study_ids)
+        rows = []
+        for slide, study_id in slides:
+            if not study_id:
+                continue
+            count = counts.get(study_id, 0)
+            likelier = likely_misread(count, near.get(study_id, ()))
+            if count <= 1:
+                rows.append((slide, study_id, OUTLIER, "Study ID not found on any other slide"))
+            if likelier:
+                rows.append((slide, study_id, NEAR_DUPLICATE,
+                             "Possible misread of " + ", ".join(f"{other} ({n} slide(s))" for other, n in likelier)))
+        return rows
+
+    def study_ids(self):
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT study_id FROM study_ids WHERE slides > 0")]
+
+    def stats(self):
+        with self._lock:
+            ids, slides = self._db.execute("SELECT COUNT(*), COALESCE(SUM(slides), 0) FROM study_ids WHERE slides > 0").fetchone()
+        return {"study_ids": ids, "slides": slides}
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report outlier and near-duplicate study IDs across every indexed run.")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help=f"Study ID index (default: {DEFAULT_INDEX_PATH})")
+    args = parser.parse_args()
+
+    with StudyIndex(args.index) as index:
+        start = time.perf_counter()
+        ids = index.study_ids()
+        counts = index.counts(ids)
+        near = index.near_duplicates(ids)
+        outliers = sorted(study_id for study_id, count in counts.items() if count == 1)
+        print(f"🔍 {len(ids)} study ID(s) over {sum(counts.values())} slide(s), checked in {time.perf_counter() - start:.2f}s")
+        print(f"⚠️ {len(outliers)} outlier(s): " + ", ".join(outliers[:50]) + (" ..." if len(outliers) > 50 else ""))
+        for study_id in sorted(near):
+            likelier = [f"{other} ({n})" for other, n in likely_misread(counts[study_id], near[study_id])]
+            if likelier:
+                print(f" - {study_id} ({counts[study_id]}) may be a misread of {', '.join(likelier)}")
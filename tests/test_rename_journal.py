@@ -0,0 +1,42 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rename_journal import JournalError, RenameJournal, step
+
+# The journal is what stands between a bad rename and an overwritten slide;
+# these cover names that differ only in case, which macOS volumes treat as
+# the same file.
+
+def make_slides(folder, *names):
+    for name in names:
+        (folder / name).write_text(name)
+
+def test_refuses_target_existing_in_another_case(tmp_path):
+    make_slides(tmp_path, "a.mrxs", "B.mrxs")
+    journal = RenameJournal.start(str(tmp_path / "journal.jsonl"), str(tmp_path), [step("a.mrxs", "b.mrxs", ("a.mrxs", "b.mrxs"))])
+    with pytest.raises(JournalError):
+        journal.apply()
+    assert (tmp_path / "B.mrxs").read_text() == "B.mrxs"
+
+def test_resumes_case_only_rename_on_case_insensitive_volume(tmp_path, monkeypatch):
+    # a case-insensitive volume: both spellings of a name exist
+    real_lexists = os.path.lexists
+
+    def lexists(path):
+        folder, name = os.path.split(path)
+        if not os.path.isdir(folder):
+            return real_lexists(path)
+        return any(entry.casefold() == name.casefold() for entry in os.listdir(folder))
+
+    monkeypatch.setattr(os.path, "lexists", lexists)
+    make_slides(tmp_path, "lung.mrxs")
+    journal = RenameJournal.start(str(tmp_path / "journal.jsonl"), str(tmp_path), [step("lung.mrxs", "Lung.mrxs", ("lung.mrxs", "Lung.mrxs"))])
+    journal.close()
+    assert RenameJournal.open(str(tmp_path / "journal.jsonl")).resume() == 1
+    assert "Lung.mrxs" in os.listdir(tmp_path)
+    # a second resume finds the step done from the listing
+    journal = RenameJournal.open(str(tmp_path / "journal.jsonl"))
+    assert journal._is_done(0)
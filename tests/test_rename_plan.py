@@ -0,0 +1,88 @@
+import os
+import sys
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rename_plan import (COLLISION, CYCLE, DUPLICATE_TARGET, NEW_COLUMN, ORIGINAL_COLUMN, READY,
+                         plan_renames)
+
+# Renames overwrite slides when a check misses a clash, so the planner is
+# checked here for the cases that lose data: names differing only in case
+# (macOS volumes are case-insensitive), chains and cycles.
+
+def make_slides(folder, *names, data_folder=()):
+    # each slide's .mrxs holds its own name, so a test can tell where it went
+    for name in names:
+        (folder / name).write_text(name)
+    for stem in data_folder:
+        (folder / stem).mkdir()
+        (folder / stem / "Data0000.dat").write_text(stem)
+
+def plan(folder, *pairs):
+    mapping = pd.DataFrame(pairs, columns=[ORIGINAL_COLUMN, NEW_COLUMN])
+    return plan_renames(mapping, str(folder))
+
+def statuses(rename_plan):
+    return dict(zip(rename_plan.table["original"], rename_plan.table["status"]))
+
+def contents(folder):
+    return {name: (folder / name).read_text() for name in os.listdir(folder) if (folder / name).is_file()}
+
+def test_target_existing_in_another_case_collides(tmp_path):
+    make_slides(tmp_path, "a.mrxs", "B.mrxs")
+    assert statuses(plan(tmp_path, ("a.mrxs", "b.mrxs")))["a.mrxs"] == COLLISION
+
+def test_targets_differing_in_case_are_duplicates(tmp_path):
+    make_slides(tmp_path, "x.mrxs", "y.mrxs")
+    rename_plan = plan(tmp_path, ("x.mrxs", "Lung_S1.mrxs"), ("y.mrxs", "lung_s1.mrxs"))
+    assert set(statuses(rename_plan).values()) == {DUPLICATE_TARGET}
+
+def test_data_folder_existing_in_another_case_collides(tmp_path):
+    make_slides(tmp_path, "a.mrxs", data_folder=["a", "B"])
+    assert statuses(plan(tmp_path, ("a.mrxs", "b.mrxs")))["a.mrxs"] == COLLISION
+
+def test_own_case_only_rename_is_allowed(tmp_path):
+    make_slides(tmp_path, "lung.mrxs", data_folder=["lung"])
+    rename_plan = plan(tmp_path, ("lung.mrxs", "Lung.mrxs"))
+    assert statuses(rename_plan)["lung.mrxs"] == READY
+    rename_plan.execute(str(tmp_path / "journal.jsonl"))
+    assert contents(tmp_path) == {"Lung.mrxs": "lung.mrxs", "journal.jsonl": contents(tmp_path)["journal.jsonl"]}
+    assert os.path.isdir(tmp_path / "Lung")
+
+def test_case_only_rename_blocks_renames_into_its_name(tmp_path):
+    make_slides(tmp_path, "lung.mrxs", "x.mrxs")
+    rename_plan = plan(tmp_path, ("lung.mrxs", "Lung.mrxs"), ("x.mrxs", "LUNG.mrxs"))
+    assert statuses(rename_plan)["x.mrxs"] in (COLLISION, DUPLICATE_TARGET)
+
+def test_chain_through_a_name_in_another_case(tmp_path):
+    # a → B while b → c: b is renamed away first, so a may take its name
+    make_slides(tmp_path, "a.mrxs", "b.mrxs")
+    rename_plan = plan(tmp_path, ("a.mrxs", "B.mrxs"), ("b.mrxs", "c.mrxs"))
+    assert set(statuses(rename_plan).values()) == {READY}
+    assert rename_plan.renames == [("b.mrxs", "c.mrxs"), ("a.mrxs", "B.mrxs")]
+    rename_plan.execute(str(tmp_path / "journal.jsonl"))
+    files = contents(tmp_path)
+    assert files["B.mrxs"] == "a.mrxs" and files["c.mrxs"] == "b.mrxs"
+
+def test_chain_into_a_blocked_name_collides(tmp_path):
+    # c exists and isn't renamed, so b stays, so a can't take b's name
+    make_slides(tmp_path, "a.mrxs", "b.mrxs", "C.mrxs")
+    rename_plan = plan(tmp_path, ("a.mrxs", "b.mrxs"), ("b.mrxs", "c.mrxs"))
+    assert set(statuses(rename_plan).values()) == {COLLISION}
+
+@pytest.mark.parametrize("pairs", [
+    (("a.mrxs", "b.mrxs"), ("b.mrxs", "a.mrxs")),
+    (("a.mrxs", "B.mrxs"), ("b.mrxs", "A.mrxs")),
+    (("a.mrxs", "b.mrxs"), ("b.mrxs", "c.mrxs"), ("c.mrxs", "a.mrxs")),
+])
+def test_cycles_go_through_a_temporary_name(tmp_path, pairs):
+    make_slides(tmp_path, *[original for original, _ in pairs], data_folder=[original[0] for original, _ in pairs])
+    rename_plan = plan(tmp_path, *pairs)
+    assert set(statuses(rename_plan).values()) == {CYCLE}
+    rename_plan.execute(str(tmp_path / "journal.jsonl"))
+    files = contents(tmp_path)
+    for original, new in pairs:
+        assert files[new] == original
+        assert (tmp_path / new[0] / "Data0000.dat").read_text() == original[0]
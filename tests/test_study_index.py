@@ -0,0 +1,44 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from study_index import NEAR_DUPLICATE, StudyIndex, one_edit_apart
+
+# Near-duplicate flags are only useful if they point at misreads: IDs of a
+# lab's studies run in sequence, one substitution apart, and must not flag
+# each other.
+
+def index_with(tmp_path, counts):
+    index = StudyIndex(str(tmp_path / "index.sqlite3"))
+    index.update([(f"{study_id}-{n}", "run", f"{study_id}_{n}.mrxs", study_id, f"{study_id}_{n}")
+                  for study_id, count in counts.items() for n in range(count)])
+    return index
+
+def near_duplicates(index, study_ids):
+    return {study_id: details for _, study_id, flag, details in index.flags([(s, s) for s in study_ids])
+            if flag == NEAR_DUPLICATE}
+
+def test_sequential_ids_are_not_near_duplicates(tmp_path):
+    counts = {f"21-{n:03d}": 10 + 2 * n for n in range(1, 11)}
+    counts["20-000"], counts["20-008"] = 1, 1
+    with index_with(tmp_path, counts) as index:
+        assert near_duplicates(index, counts) == {}
+
+def test_rare_id_next_to_a_much_larger_one_is_flagged(tmp_path):
+    with index_with(tmp_path, {"24-134": 20, "24-184": 1, "24-314": 1, "24-130": 1}) as index:
+        flagged = near_duplicates(index, ["24-184", "24-314", "24-130", "24-134"])
+    # 3/8 look alike, 13/31 is an adjacent swap; 4/0 is just another study
+    assert set(flagged) == {"24-184", "24-314"}
+    assert "24-134 (20 slide(s))" in flagged["24-184"]
+
+def test_id_with_several_slides_is_not_flagged(tmp_path):
+    with index_with(tmp_path, {"24-134": 20, "24-184": 5}) as index:
+        assert near_duplicates(index, ["24-184"]) == {}
+
+def test_ocr_plausible_edits():
+    assert one_edit_apart("24-184", "24-134")
+    assert one_edit_apart("24-13", "24-134")
+    assert one_edit_apart("24-143", "24-134")
+    assert not one_edit_apart("21-002", "21-003")
+    assert not one_edit_apart("24-130", "24-134")
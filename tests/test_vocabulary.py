@@ -0,0 +1,39 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from name_extraction import DEFAULT_RULES_PATH, NameExtractor
+from vocabulary import load_vocabulary
+
+# Corrections rename slides, so a valid word turned into a term is as bad as
+# a misread left in place: words are only corrected with evidence of a
+# misread, and valid neighbours of terms are left alone.
+
+LAB_VOCABULARY = os.path.join(os.path.dirname(DEFAULT_RULES_PATH), "lab_vocabulary.toml")
+
+def extractor():
+    return NameExtractor(vocabulary=load_vocabulary(LAB_VOCABULARY))
+
+def test_ocr_like_misreads_are_corrected():
+    _, name, corrections = extractor().extract_corrected(["21-001 H(20)", "Lnug Kidnye Carcin0ma"])
+    assert name == "21-001_Lung_Kidney_Carcinoma"
+    assert [(word, term) for word, term, *_ in corrections] == [("Lnug", "Lung"), ("Kidnye", "Kidney"),
+                                                                ("Carcin0ma", "Carcinoma")]
+
+def test_valid_neighbours_are_not_corrected():
+    lines = ["21-001 H(20)", "Ilium Testes Colony Hearts"]
+    for confidences in (None, [1.0, 0.3]):
+        _, name, corrections = extractor().extract_corrected(lines, confidences)
+        assert name == "21-001_Ilium_Testes_Colony_Hearts"
+        assert corrections == []
+
+def test_other_edits_need_a_doubtful_line():
+    lines = ["21-001 H(20)", "Kidny"]
+    assert extractor().extract(lines, [1.0, 0.9])[1] == "21-001_Kidny"
+    assert extractor().extract(lines, [1.0, 0.3])[1] == "21-001_Kidney"
+
+def test_marker_names_are_not_corrected():
+    _, name, corrections = extractor().extract_corrected(["21-001", "CD34 Ki67 CD3l"], [1.0, 0.3])
+    assert name == "21-001_CD34_Ki67_CD31"
+    assert [(word, term) for word, term, *_ in corrections] == [("CD3l", "CD31")]
@@ -0,0 +1,188 @@
+import time
+import queue
+import threading
+from collections import deque
+from name_extraction import load_extractor
+from ocr_backends import OCRBackend, OCRError, VisionSubprocessBackend
+from ocr_cache import CachedBackend
+
+# Two-pass OCR: every label is read by a fast engine (Vision's fast
+# recognition level), and only labels whose results don't look right are
+# read again by the accurate engine. A label is re-read when any line is under
+# `min_confidence` or no study ID can be extracted from it. Both engines
+# work at the same time; results still come out in input order.
+#
+# Time saved is measured in engine time: how long each engine had at least
+# one label in flight. The accurate engine's time per label, times the number
+# of labels, estimates what an accurate-only run would have cost.
+
+MIN_LINE_CONFIDENCE = 0.6
+_DONE = object()
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+class _Busy:
+    # seconds during which at least one request was in flight
+    def __init__(self):
+        self.seconds = 0.0
+        self._inflight = 0
+        self._since = 0.0
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._inflight == 0:
+                self._since = time.perf_counter()
+            self._inflight += 1
+
+    def finish(self):
+        with self._lock:
+            self._inflight -= 1
+            if self._inflight == 0:
+                self.seconds += time.perf_counter() - self._since
+
+class TwoPassBackend(OCRBackend):
+    def __init__(self, fast, accurate, extractor=None, min_confidence=MIN_LINE_CONFIDENCE):
+        self.fast = fast
+        self.accurate = accurate
+        self.extractor = extractor or load_extractor()
+        self.min_confidence = min_confidence
+        self.engine_version = f"two-pass:{fast.engine_version}+{accurate.engine_version}:{min_confidence}"
+        # the OCR cache both engines share, if any (its stats are logged)
+        self.cache = getattr(fast, "cache", None)
+        self._reset()
+
+    def _reset(self):
+        self.labels = 0
+        self.reread = 0
+        self._fast_busy = _Busy()
+        self._accurate_busy = _Busy()
+
+    def needs_accurate(self, results):
+        if isinstance(results, OCRError):
+            return True
+        if any(conf is not None and conf < self.min_confidence for _, conf in results):
+            return True
+        study_id, _ = self.extractor.extract([text for text, _ in results])
+        return not study_id
+
+    def _timed(self, busy, call, *args):
+        busy.start()
+        try:
+            return call(*args)
+        finally:
+            busy.finish()
+
+    def recognize(self, image_bytes, name):
+        self.labels += 1
+        try:
+            results = self._timed(self._fast_busy, self.fast.recognize, image_bytes, name)
+        except OCRError as e:
+            results = e
+        if not self.needs_accurate(results):
+            return results
+        self.reread += 1
+        return self._timed(self._accurate_busy, self.accurate.recognize, image_bytes, name)
+
+    def recognize_batch(self, items):
+        # statistics cover one batch (one folder run of the pipeline)
+        self._reset()
+        # images handed to the fast engine, waiting for their results
+        sent = deque()
+        # labels for the accurate engine, and its results, both in order
+        reread_q = queue.Queue()
+        results_q = queue.Queue()
+
+        def fast_items():
+            for name, image_bytes in items:
+                sent.append(image_bytes)
+                self._fast_busy.start()
+                yield name, image_bytes
+
+        def reread_items():
+            while True:
+                item = reread_q.get()
+                if item is _DONE:
+                    return
+                self._accurate_busy.start()
+                yield item
+
+        def run_accurate():
+            try:
+                for name, results in self.accurate.recognize_batch(reread_items()):
+                    self._accurate_busy.finish()
+                    results_q.put(results)
+            except Exception as e:
+                results_q.put(_Failure(e))
+
+        def next_accurate(block):
+            results = results_q.get(block=block)
+            if isinstance(results, _Failure):
+                raise results.error
+            return results
+
+        accurate_thread = threading.Thread(target=run_accurate, daemon=True)
+        accurate_thread.start()
+        # [name, results] in input order; results is None until the accurate
+        # engine has re-read the label
+        order = deque()
+        waiting = deque()
+        try:
+            for name, results in self.fast.recognize_batch(fast_items()):
+                self._fast_busy.finish()
+                image_bytes = sent.popleft()
+                self.labels += 1
+                entry = [name, results]
+                if self.needs_accurate(results):
+                    self.reread += 1
+                    entry[1] = None
+                    waiting.append(entry)
+                    reread_q.put((name, image_bytes))
+                order.append(entry)
+                while waiting:
+                    try:
+                        results = next_accurate(block=False)
+                    except queue.Empty:
+                        break
+                    waiting.popleft()[1] = results
+                while order and order[0][1] is not None:
+                    yield tuple(order.popleft())
+            reread_q.put(_DONE)
+            while waiting:
+                waiting.popleft()[1] = next_accurate(block=True)
+            while order:
+                yield tuple(order.popleft())
+        finally:
+            reread_q.put(_DONE)
+            accurate_thread.join(timeout=1)
+
+    def stats(self):
+        fast_seconds, accurate_seconds = self._fast_busy.seconds, self._accurate_busy.seconds
+        stats = {"labels": self.labels, "reread": self.reread, "fast_seconds": fast_seconds,
+                 "accurate_seconds": accurate_seconds, "saved_seconds": None}
+        if self.reread:
+            stats["saved_seconds"] = accurate_seconds / self.reread * self.labels - fast_seconds - accurate_seconds
+        return stats
+
+    def summary(self):
+        stats = self.stats()
+        line = (f"{stats['reread']}/{stats['labels']} label(s) re-read by the accurate pass "
+                f"(engine time {stats['fast_seconds']:.2f} s fast + {stats['accurate_seconds']:.2f} s accurate)")
+        if stats["saved_seconds"] is not None:
+            line += f", about {stats['saved_seconds']:.1f} s less than reading every label accurately"
+        return line
+
+    def close(self):
+        self.fast.close()
+        self.accurate.close()
+
+def vision_two_pass(binary, cache=None, max_inflight=8, extractor=None, min_confidence=MIN_LINE_CONFIDENCE):
+    # a fast and an accurate VisionOCRDemo process, each behind the OCR cache
+    # (their engine versions differ, so their results are cached apart)
+    fast = VisionSubprocessBackend(binary, max_inflight=max_inflight, fast=True)
+    accurate = VisionSubprocessBackend(binary, max_inflight=max_inflight)
+    if cache:
+        fast, accurate = CachedBackend(fast, cache), CachedBackend(accurate, cache)
+    return TwoPassBackend(fast, accurate, extractor, min_confidence)
@@ -0,0 +1,223 @@
+import os
+import time
+import argparse
+import tomllib
+
+# Lab vocabulary (stains, organs, project codes, known study IDs) used to
+# correct OCR misreads in label words, e.g. "Carcin0ma" -> "Carcinoma" or
+# "Kidnye" -> "Kidney". Lookups use a SymSpell-style index: every term is stored
+# under each string reachable by deleting up to its allowed number of
+# characters, so a word's candidates are found by looking up its own
+# deletions, whatever the size of the vocabulary. Candidates are then checked
+# with the optimal string alignment distance (an adjacent swap is one edit).
+# Where digits are involved (marker names like CD34, IDs) any edit could be
+# a different valid name, so only OCR look-alike swaps are accepted there.
+# A word close to a term may also be a different valid word (Ilium, Testes,
+# Hearts), so a match only replaces the word with evidence of a misread: the
+# edit looks like OCR's (look-alike characters, swapped neighbours) or the
+# line it is on was read with low confidence. Plurals of terms and the
+# vocabulary's protected words are never corrected.
+
+# words shorter than this are never corrected
+MIN_LENGTH = 4
+# words shorter than this need an OCR-like edit even on a doubtful line: one
+# edit in four letters is as likely another word as a misread
+SHORT_WORD = 5
+# terms at least this long tolerate two edits, shorter ones one
+LONG_TERM = 7
+MAX_DISTANCE = 2
+MIN_CONFIDENCE = 0.7
+# OCR line confidence under which a line's words count as doubtful
+DOUBTFUL_CONFIDENCE = 0.6
+_CACHE_SIZE = 100_000
+# digit/letter pairs OCR confuses
+CONFUSABLE = {("0", "o"), ("1", "l"), ("1", "i"), ("5", "s"), ("8", "b"), ("2", "z")}
+# and all character pairs it confuses
+LOOK_ALIKE = CONFUSABLE | {("c", "e"), ("c", "o"), ("i", "l"), ("l", "t"), ("f", "t"), ("u", "v"), ("n", "h"), ("m", "n")}
+
+class VocabularyError(ValueError):
+    pass
+
+def allowed_distance(term):
+    if len(term) < MIN_LENGTH:
+        return 0
+    return 1 if len(term) < LONG_TERM else MAX_DISTANCE
+
+def _deletes(word, depth):
+    # word and every string reachable by deleting up to depth characters
+    found = {word}
+    frontier = {word}
+    for _ in range(depth):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        found |= frontier
+    return found
+
+def osa_distance(a, b, limit=MAX_DISTANCE):
+    # optimal string alignment distance, or limit + 1 once it exceeds limit
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    # only cells within limit of the diagonal can stay within limit; the
+    # rest are left at limit + 1
+    over = limit + 1
+    width = len(b)
+    previous2, previous = None, [j if j <= limit else over for j in range(width + 1)]
+    for i in range(1, len(a) + 1):
+        current = [over] * (width + 1)
+        if i <= limit:
+            current[0] = i
+        char = a[i - 1]
+        for j in range(max(1, i - limit), min(width, i + limit) + 1):
+            value = previous[j - 1] + (char != b[j - 1])
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            if current[j - 1] + 1 < value:
+                value = current[j - 1] + 1
+            if i > 1 and j > 1 and char == b[j - 2] and a[i - 2] == b[j - 1] and previous2[j - 2] + 1 < value:
+                value = previous2[j - 2] + 1
+            current[j] = value if value < over else over
+        if min(current) > limit:
+            return over
+        previous2, previous = previous, current
+    return previous[-1]
+
+def _digit_safe(word, term):
+    # words and terms holding digits may only differ by look-alike swaps in
+    # place, e.g. "carcin0ma" -> "carcinoma" but not "cd34" -> "cd31"
+    if not any(c.isdigit() for c in word + term):
+        return True
+    return len(word) == len(term) and all(a == b or (a, b) in CONFUSABLE or (b, a) in CONFUSABLE
+                                          for a, b in zip(word, term))
+
+def _misread_like(word, term):
+    # the word differs from the term only by look-alike characters and
+    # swapped neighbours, the edits OCR makes rather than spelling
+    if len(word) != len(term):
+        return False
+    i = 0
+    while i < len(word):
+        if word[i] == term[i] or (word[i], term[i]) in LOOK_ALIKE or (term[i], word[i]) in LOOK_ALIKE:
+            i += 1
+        elif i + 1 < len(word) and word[i] == term[i + 1] and word[i + 1] == term[i]:
+            i += 2
+        else:
+            return False
+    return True
+
+class Vocabulary:
+    def __init__(self, terms=None, min_confidence=MIN_CONFIDENCE, protected=()):
+        # terms: {category: [term, ...]}; protected: valid words close to a
+        # term that are never corrected
+        self.min_confidence = min_confidence
+        self.protected = frozenset(word.lower() for word in protected)
+        self.terms = []
+        self.categories = []
+        self._exact = {}
+        self._index = {}
+        self._cache = {}
+        for category, words in (terms or {}).items():
+            self.add(words, category)
+
+    def add(self, words, category):
+        for word in words:
+            lowered = word.lower()
+            if lowered in self._exact:
+                continue
+            term = len(self.terms)
+            self.terms.append(word)
+            self.categories.append(category)
+            self._exact[lowered] = term
+            for variant in _deletes(lowered, allowed_distance(lowered)):
+                self._index.setdefault(variant, []).append(term)
+        self._cache.clear()
+
+    def __len__(self):
+        return len(self.terms)
+
+    def valid(self, lowered):
+        # a term, a protected word or a term's plural
+        exact = self._exact
+        return (lowered in exact or lowered in self.protected or (lowered.endswith("s") and lowered[:-1] in exact)
+                or (lowered.endswith("es") and lowered[:-2] in exact))
+
+    def lookup(self, word):
+        # (term, category, distance, confidence) of the closest term, or None
+        # if the word is valid already, too short, or has no single closest
+        # term within the allowed distance
+        lowered = word.lower()
+        if lowered in self._cache:
+            return self._cache[lowered]
+        match = None
+        if len(lowered) >= MIN_LENGTH and not self.valid(lowered):
+            best, best_terms, seen = MAX_DISTANCE + 1, set(), set()
+            for variant in _deletes(lowered, MAX_DISTANCE):
+                for term in self._index.get(variant, ()):
+                    if term in seen:
+                        continue
+                    seen.add(term)
+                    candidate = self.terms[term].lower()
+                    distance = osa_distance(lowered, candidate, allowed_distance(candidate))
+                    if distance > allowed_distance(candidate) or distance > best or not _digit_safe(lowered, candidate):
+                        continue
+                    if distance < best:
+                        best, best_terms = distance, set()
+                    best_terms.add(term)
+            # two equally close terms: no way to tell which was meant
+            if len(best_terms) == 1:
+                term = best_terms.pop()
+                confidence = round(1 - best / max(len(lowered), len(self.terms[term])), 3)
+                match = (self.terms[term], self.categories[term], best, confidence)
+        if len(self._cache) >= _CACHE_SIZE:
+            self._cache.clear()
+        self._cache[lowered] = match
+        return match
+
+    def correct(self, word, doubtful=False):
+        # lookup() when confident enough to replace the word and the edit
+        # looks like a misread, otherwise None. doubtful: the word's line
+        # was read with low confidence, so any edit may be a misread
+        match = self.lookup(word)
+        if not match or match[3] < self.min_confidence:
+            return None
+        if _misread_like(word.lower(), match[0].lower()) or (doubtful and len(word) >= SHORT_WORD):
+            return match
+        return None
+
+def load_vocabulary(path, min_confidence=MIN_CONFIDENCE):
+    # TOML file of category = [terms] lists, plus an optional protected list
+    # of words that are never corrected
+    try:
+        with open(path, "rb") as f:
+            data = tomllib.load(f)
+    except (OSError, tomllib.TOMLDecodeError) as e:
+        raise VocabularyError(f"{path}: {e}")
+    for category, words in data.items():
+        if not isinstance(words, list) or not all(isinstance(word, str) and word for word in words):
+            raise VocabularyError(f"{path}: {category} must be a list of non-empty strings")
+    protected = data.pop("protected", [])
+    return Vocabulary(data, min_confidence, protected)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Look words up in a lab vocabulary the way label names are corrected.")
+    parser.add_argument("vocabulary", help="Vocabulary file (e.g. lab_vocabulary.toml)")
+    parser.add_argument("words", nargs="+", help="Words to look up")
+    parser.add_argument("--min-confidence", type=float, default=MIN_CONFIDENCE, help=f"Confidence needed to correct a word (default: {MIN_CONFIDENCE})")
+    parser.add_argument("--doubtful", action="store_true", help="Look words up as if their line was read with low confidence")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    vocabulary = load_vocabulary(args.vocabulary, args.min_confidence)
+    print(f"📖 {len(vocabulary)} term(s) indexed in {time.perf_counter() - start:.3f}s from {os.path.basename(args.vocabulary)}")
+    for word in args.words:
+        match = vocabulary.lookup(word)
+        if match is None:
+            print(f" - {word}: no correction")
+        else:
+            term, category, distance, confidence = match
+            if vocabulary.correct(word, args.doubtful):
+                action = "→"
+            elif confidence < vocabulary.min_confidence:
+                action = "(too uncertain)"
+            else:
+                action = "(no sign of a misread)"
+            print(f" - {word} {action} {term} [{category}, distance {distance}, confidence {confidence}]")
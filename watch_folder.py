@@ -0,0 +1,277 @@
+import io
+import os
+import time
+import signal
+import argparse
+import threading
+import postprocess_with_confidence_final as postprocess
+from instrumentation import DISABLED, Instrumentation
+from label_preprocess import TEXT_HEIGHT, label_preprocessor, to_png
+from mirax_label import MiraxError, slide_files
+from name_extraction import DEFAULT_RULES_PATH, load_extractor
+from ocr_backends import OCRError, ReplayBackend, VisionSubprocessBackend
+from ocr_cache import DEFAULT_CACHE_PATH, CachedBackend, OCRCache
+from ocr_results import format_block
+from ocr_structured import record_from_results, write_jsonl_record
+from open_label_images import label_filename, load_label
+from pipeline import default_output_folder, name_slide
+from run_log import RunLog
+from study_index import DEFAULT_INDEX_PATH, StudyIndex
+from two_pass_ocr import MIN_LINE_CONFIDENCE, TwoPassBackend, vision_two_pass
+
+# Long-running watcher for a scanner's output folder. The folder is polled
+# (one directory listing per interval; the scanners write to SMB shares and
+# macOS, where inotify isn't available). A new slide is picked up once its
+# data folder holds every file its Slidedat.ini lists and none of them has
+# changed for `settle` seconds; it is then read, OCR'd and named on its own,
+# and appended to the session's logs straight away. The session's slides go
+# into numbered workbooks of sheet_slides slides each; the current one is
+# rewritten after each batch of slides that became ready together, so a save
+# costs the same on the first day of a session as after months of it.
+
+POLL_SECONDS = 1.0
+SETTLE_SECONDS = 5.0
+SHEET_SLIDES = 100
+SHEET_NAME = "file_renaming_excel_{:03d}.xlsx"
+
+def slide_signature(mrxs_path):
+    # (path, size, mtime) of the .mrxs and every file of its data folder, or
+    # None while the scan is still incomplete
+    try:
+        paths = [mrxs_path] + slide_files(mrxs_path)
+        return tuple((path, stat.st_size, stat.st_mtime_ns) for path in paths for stat in [os.stat(path)])
+    except (MiraxError, OSError):
+        return None
+
+class SlideWatcher:
+    def __init__(self, folder, settle=SETTLE_SECONDS, ignore=()):
+        self.folder = folder
+        self.settle = settle
+        # slides already handed out (or present at startup and ignored)
+        self.seen = set(ignore)
+        # filename -> (signature, time it was first seen unchanged)
+        self.pending = {}
+
+    def poll(self, now=None):
+        # [(filename, time its scan finished)] for slides that became ready
+        now = time.monotonic() if now is None else now
+        names = sorted(f for f in os.listdir(self.folder) if f.lower().endswith(".mrxs") and f not in self.seen)
+        ready = []
+        for name in names:
+            signature = slide_signature(os.path.join(self.folder, name))
+            previous = self.pending.get(name)
+            if signature is None or previous is None or previous[0] != signature:
+                self.pending[name] = (signature, now)
+            elif now - previous[1] >= self.settle:
+                del self.pending[name]
+                self.seen.add(name)
+                ready.append((name, previous[1]))
+        # forget slides that were deleted or renamed away while pending
+        for name in set(self.pending).difference(names):
+            del self.pending[name]
+        return ready
+
+class WatchSession:
+    # one output folder for the whole time the watcher runs
+    def __init__(self, folder, output_folder, ocr_backend, run_log, extractor=None, thumb_format="png",
+                 instrumentation=DISABLED, study_index=None, preprocess=None, sheet_slides=SHEET_SLIDES):
+        os.makedirs(output_folder, exist_ok=True)
+        self.folder = folder
+        self.output_folder = output_folder
+        self.ocr_backend = ocr_backend
+        self.run_log = run_log
+        self.extractor = extractor or load_extractor()
+        self.thumb_format = thumb_format
+        self.instrumentation = instrumentation
+        self.study_index = study_index
+        self.preprocess = preprocess
+        self.sheet_slides = sheet_slides
+        # the workbook being filled, and its rows so far; each row keeps only
+        # its thumbnail, not the full label
+        self.sheet = 1
+        self.records = []
+        # (slide key, slide, study ID, new name) per row for the study ID index
+        self.slides = []
+        self.logged_flags = set()
+        self.unsaved = False
+        # label hashes of every slide named this session, and their count
+        self.keys = set()
+        self.named = 0
+        self.started = time.perf_counter()
+        self._ocr_txt = open(os.path.join(output_folder, "ocr_results.txt"), "a", encoding="utf-8")
+        self._ocr_jsonl = open(os.path.join(output_folder, "ocr_results.jsonl"), "a", encoding="utf-8")
+
+    def name(self, filename, finished=None):
+        # reads, OCRs and names one slide; returns its record, or None if it
+        # was skipped. finished: time.monotonic() when its scan completed
+        instrumentation = self.instrumentation
+        start = time.perf_counter()
+        with instrumentation.stage("label_read", filename) as stage:
+            try:
+                label_img = load_label(os.path.join(self.folder, filename))
+            except Exception as e:
+                self.run_log.event("skipped", message=f"Failed to process {filename}: {e}")
+                return None
+            if label_img is None:
+                self.run_log.event("skipped", message=f"No label image found in {filename}")
+                return None
+            png = io.BytesIO()
+            label_img.save(png, "PNG")
+            png = png.getvalue()
+            stage.bytes = len(png)
+        key = postprocess.slide_key(self.folder, filename, png)
+        if key in self.keys:
+            # the same physical slide under a new name, e.g. after renaming
+            # from this session's sheet
+            return None
+        read = time.perf_counter()
+        ocr_png = png
+        if self.preprocess:
+            with instrumentation.stage("preprocess", filename) as stage:
+                try:
+                    ocr_png = to_png(self.preprocess(label_img))
+                except Exception as e:
+                    # the daemon keeps going; OCR reads the label as scanned
+                    self.run_log.event("preprocess_error", message=f"Failed to preprocess the label of {filename}, using the original: {e}")
+                stage.bytes = len(ocr_png)
+        sent = time.perf_counter()
+        with instrumentation.stage("ocr", filename, nbytes=len(ocr_png)):
+            try:
+                results = self.ocr_backend.recognize(ocr_png, label_filename(filename))
+            except OCRError as e:
+                self.run_log.event("skipped", message=f"Failed to read label of {filename}: {e}")
+                return None
+        received = time.perf_counter()
+        with instrumentation.stage("name", filename):
+            record = name_slide(filename, png, results, self.extractor)
+        with instrumentation.stage("write_results", filename):
+            self._ocr_txt.write(format_block(record["Label Image"], results))
+            write_jsonl_record(self._ocr_jsonl, record_from_results(record["Label Image"], results, self.ocr_backend.engine_version))
+            self._ocr_txt.flush()
+            self._ocr_jsonl.flush()
+            timings = {
+                "label_ms": round((read - start) * 1000, 2),
+                "ocr_ms": round((received - sent) * 1000, 2),
+                "name_ms": round((time.perf_counter() - received) * 1000, 2),
+            }
+            if self.preprocess:
+                timings["preprocess_ms"] = round((sent - read) * 1000, 2)
+            if finished is not None:
+                # from the scan finishing to the name being logged
+                timings["latency_ms"] = round((time.monotonic() - finished) * 1000, 2)
+            postprocess.log_slide(self.run_log, record, [conf for _, conf in results], timings)
+            self.run_log.flush()
+        self.keys.add(key)
+        self.named += 1
+        if len(self.records) >= self.sheet_slides:
+            # the workbook is full: write it a last time and start the next
+            self.save()
+            self.sheet += 1
+            self.records, self.slides, self.logged_flags = [], [], set()
+        self.slides.append((key, filename, record["Study ID"], record["New File Name"]))
+        record["Label Data"] = postprocess.make_thumbnail(png, self.thumb_format)
+        self.records.append(record)
+        self.unsaved = True
+        return record
+
+    def save(self):
+        # a write-only workbook can't be appended to, so the current one is
+        # written again from its rows (thumbnails are already small)
+        if not self.unsaved:
+            return
+        flags = None
+        if self.study_index:
+            flags = postprocess.study_id_flags(self.study_index, self.folder, self.slides, self.run_log, self.logged_flags)
+        postprocess.export_excel_with_images(self.records, None, self.output_folder, SHEET_NAME.format(self.sheet),
+                                             thumb_format=self.thumb_format, run_log=self.run_log,
+                                             instrumentation=self.instrumentation, flags=flags,
+                                             corrections=self.extractor.vocabulary is not None)
+        self.unsaved = False
+        self.run_log.flush()
+
+    def close(self):
+        if isinstance(self.ocr_backend, TwoPassBackend):
+            self.run_log.event("two_pass", summary=self.ocr_backend.summary(), **self.ocr_backend.stats())
+        if getattr(self.ocr_backend, "cache", None):
+            self.run_log.event("ocr_cache", hits=self.ocr_backend.cache.hits, misses=self.ocr_backend.cache.misses)
+        # with --profile the summary logs the session's throughput itself
+        if not self.instrumentation.write_summary(self.output_folder, self.run_log, slides=self.named):
+            seconds = time.perf_counter() - self.started
+            self.run_log.event("throughput", slides=self.named, seconds=seconds,
+                               slides_per_sec=self.named / seconds if seconds else 0.0)
+        self._ocr_txt.close()
+        self._ocr_jsonl.close()
+
+def watch(watcher, session, poll=POLL_SECONDS, stop=None):
+    # runs until stop is set
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        ready = watcher.poll()
+        named = [session.name(filename, finished) for filename, finished in ready]
+        if any(named):
+            session.save()
+        stop.wait(poll)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Watch a scanner's output folder and name each slide as soon as its scan is complete.")
+    parser.add_argument("folder", help="Folder the scanner writes .mrxs slides to")
+    ocr_source = parser.add_mutually_exclusive_group(required=True)
+    ocr_source.add_argument("--ocr-binary", help="Path to the compiled VisionOCRDemo binary")
+    ocr_source.add_argument("--replay", help="Path to recorded OCR results (ocr_results.txt, .jsonl or .ocrb) to replay instead of running OCR")
+    parser.add_argument("-o", help="Path to store output files (default: timestamped outputs_ subfolder)")
+    parser.add_argument("--poll", type=float, default=POLL_SECONDS, help=f"Seconds between folder listings (default: {POLL_SECONDS})")
+    parser.add_argument("--settle", type=float, default=SETTLE_SECONDS, help=f"Seconds a slide's files must stay unchanged before it is named (default: {SETTLE_SECONDS})")
+    parser.add_argument("--include-existing", action="store_true", help="Also name the slides already in the folder at startup")
+    parser.add_argument("--ocr-cache", default=DEFAULT_CACHE_PATH, help=f"Persistent OCR result cache (default: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--no-ocr-cache", action="store_true", help="Run OCR on every label without consulting the cache")
+    parser.add_argument("--rules", default=DEFAULT_RULES_PATH, help=f"Name extraction rules file (default: {DEFAULT_RULES_PATH})")
+    parser.add_argument("--thumb-format", choices=postprocess.THUMB_FORMATS, default="png", help="Encoding of the Excel label thumbnails (default: png)")
+    parser.add_argument("--sheet-slides", type=int, default=SHEET_SLIDES, help=f"Slides per Excel workbook; a new numbered one is started when the current one is full (default: {SHEET_SLIDES})")
+    parser.add_argument("--profile", action="store_true", help="Record per-stage, per-slide timings and write run_summary.json on exit")
+    parser.add_argument("--study-index", default=DEFAULT_INDEX_PATH, help=f"Persistent study ID index for outlier and near-duplicate flags (default: {DEFAULT_INDEX_PATH})")
+    parser.add_argument("--no-study-index", action="store_true", help="Don't index study IDs or flag outliers")
+    parser.add_argument("--two-pass", action="store_true", help="Read every label with Vision's fast level and re-read only doubtful ones accurately (needs --ocr-binary)")
+    parser.add_argument("--two-pass-confidence", type=float, default=MIN_LINE_CONFIDENCE, help=f"Line confidence under which --two-pass re-reads a label (default: {MIN_LINE_CONFIDENCE})")
+    parser.add_argument("--preprocess", action="store_true", help="Deskew, crop, downscale and binarize each label before OCR")
+    parser.add_argument("--text-height", type=int, default=TEXT_HEIGHT, help=f"Text line height labels are downscaled to with --preprocess (default: {TEXT_HEIGHT})")
+    args = parser.parse_args()
+
+    folder = os.path.abspath(args.folder)
+    output_folder = args.o or default_output_folder(folder)
+    if args.two_pass and not args.ocr_binary:
+        parser.error("--two-pass needs --ocr-binary")
+    if args.sheet_slides < 1:
+        parser.error("--sheet-slides must be at least 1")
+    extractor = load_extractor(args.rules)
+    if args.replay:
+        ocr_backend = ReplayBackend(args.replay)
+    elif args.two_pass:
+        ocr_backend = vision_two_pass(args.ocr_binary, None if args.no_ocr_cache else OCRCache(args.ocr_cache),
+                                      extractor=extractor, min_confidence=args.two_pass_confidence)
+    else:
+        ocr_backend = VisionSubprocessBackend(args.ocr_binary)
+        if not args.no_ocr_cache:
+            ocr_backend = CachedBackend(ocr_backend, OCRCache(args.ocr_cache))
+    existing = () if args.include_existing else [f for f in os.listdir(folder) if f.lower().endswith(".mrxs")]
+    watcher = SlideWatcher(folder, settle=args.settle, ignore=existing)
+
+    # launchd and kill stop the watcher with SIGTERM; finish the current
+    # slide and save before exiting
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    study_index = None if args.no_study_index else StudyIndex(args.study_index)
+    with ocr_backend, RunLog(output_folder) as run_log:
+        run_log.event("watch_start", folder=folder, backend=ocr_backend.engine_version, output_folder=output_folder,
+                      ignored=len(existing))
+        session = WatchSession(folder, output_folder, ocr_backend, run_log, extractor=extractor,
+                               thumb_format=args.thumb_format, instrumentation=Instrumentation(enabled=args.profile),
+                               study_index=study_index, sheet_slides=args.sheet_slides,
+                               preprocess=label_preprocessor(args.text_height) if args.preprocess else None)
+        try:
+            watch(watcher, session, poll=args.poll, stop=stop)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            session.close()
+            if study_index:
+                study_index.close()